@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Backfill offline de fixtures por liga y temporada hacia fixture_store.
+
+Recorre /fixtures?league=&season= (con paginado) para cada liga y temporada
+pedida y guarda todo en bloque (FixtureStore.registrar_backfill): los
+terminados quedan en disco, así el modelo de goles de cada liga y el backtest
+se sirven localmente sin tráfico a la API.
+
+Reanudable: el progreso por (liga, temporada) queda en la tabla 'backfill'.
+Una temporada sin partidos pendientes se marca completa y no se vuelve a
+pedir (salvo --refresh); una en curso se vuelve a traer en cada corrida.
+Si se agota el cupo diario se corta y la próxima corrida sigue desde ahí.
+
+Uso:
+    python backfill.py --seasons 2022-2025
+    python backfill.py --leagues 39,140 --seasons 2024,2025 --refresh
+
+Cobertura: cada página registra también qué equipos jugaron esa liga
+(league_teams). run_once y el bot sirven el historial de esos equipos desde
+disco y se saltan su sincronización por equipo mientras todas las
+competiciones del día estén cargadas (league_history.cubrir_ligas). Un equipo
+que juega una copa o internacional fuera de las ligas del backfill sigue
+pidiendo su temporada completa por equipo, como antes.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from fixture_store import FixtureStore
+from fixture_stream import decode_fixtures
+from league_history import cargar_liga
+from rate_limit import QuotaLimiter
+
+API_FOOTBALL_KEY = os.getenv("API_FOOTBALL_KEY", "")
+BASE_URL = os.getenv("API_FOOTBALL_BASE_URL", "https://v3.football.api-sports.io")
+
+# Mismas ligas que run_once.ALLOWED_LEAGUE_IDS
+DEFAULT_LEAGUES = [239, 241, 39, 140, 71, 135, 2, 3, 78, 61, 34, 32]
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+
+
+class CupoAgotado(Exception):
+    pass
+
+
+def parse_seasons(spec: str) -> List[int]:
+    """'2022-2025' o '2023,2025' -> lista de años."""
+    out: List[int] = []
+    for parte in spec.split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        if "-" in parte:
+            a, b = (int(x) for x in parte.split("-", 1))
+            out.extend(range(min(a, b), max(a, b) + 1))
+        else:
+            out.append(int(parte))
+    return sorted(set(out))
+
+
+async def _get_fixtures(client: httpx.AsyncClient, limiter: QuotaLimiter,
+                        params: Dict[str, Any], max_retries: int = 5) -> Optional[Dict[str, Any]]:
+    """Una página de /fixtures (decodificación proyectada) respetando el cupo."""
+    for attempt in range(1, max_retries + 1):
+        if not await limiter.acquire():
+            raise CupoAgotado()
+        try:
+            r = await client.get("/fixtures", params=params)
+        except httpx.RequestError:
+            limiter.release()
+            await asyncio.sleep(1.0 * attempt)
+            continue
+        limiter.observe(r.status_code, r.headers)
+        if r.status_code == 429:
+            continue  # el limitador ya quedó bloqueado hasta el reset
+        if r.status_code >= 500:
+            await asyncio.sleep(1.5 * attempt + random.random())
+            continue
+        if r.status_code != 200:
+            return None
+        body = decode_fixtures(r.text)
+        if body.get("errors"):
+            print(f"⚠️ API: {body['errors']} en {params}")
+            return None
+        return body
+    return None
+
+
+async def backfill_liga(client, limiter, store: FixtureStore, league_id: int, season: int,
+                        refresh: bool = False) -> Tuple[int, bool]:
+    """Ingiere una liga/temporada (league_history.cargar_liga). Devuelve (terminados guardados, completa)."""
+    async def _pagina(params):
+        return await _get_fixtures(client, limiter, params)
+
+    guardados, completa, _ = await cargar_liga(_pagina, store, league_id, season, refresh)
+    return guardados, completa
+
+
+async def backfill(leagues: List[int], seasons: List[int], store: FixtureStore,
+                   refresh: bool = False, concurrency: int = BACKFILL_CONCURRENCY):
+    sem = asyncio.Semaphore(concurrency)
+    limiter = QuotaLimiter()
+    t0 = time.perf_counter()
+
+    async with httpx.AsyncClient(
+        base_url=BASE_URL,
+        headers={"x-apisports-key": API_FOOTBALL_KEY, "Accept": "application/json"},
+        timeout=30.0,
+    ) as client:
+        async def _una(league_id: int, season: int):
+            async with sem:
+                n, completa = await backfill_liga(client, limiter, store, league_id, season, refresh)
+                estado = "completa" if completa else "en curso / incompleta"
+                print(f"  liga {league_id} temporada {season}: {n} terminados ({estado})")
+
+        tareas = [asyncio.create_task(_una(l, s)) for s in seasons for l in leagues]
+        try:
+            await asyncio.gather(*tareas)
+        except CupoAgotado:
+            for t in tareas:
+                t.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            print("⛔ Cupo diario agotado: vuelve a correr el backfill mañana para continuar.")
+    print(f"Listo en {time.perf_counter() - t0:.1f}s (esperas por cupo: {limiter.waited_s:.1f}s).")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--leagues", default=",".join(str(l) for l in DEFAULT_LEAGUES),
+                    help="IDs de liga separados por coma (por defecto, las permitidas)")
+    ap.add_argument("--seasons", default=os.getenv("SEASON_HIST", "2025"),
+                    help="años: '2022-2025' o '2023,2025'")
+    ap.add_argument("--refresh", action="store_true", help="volver a pedir temporadas ya completas")
+    ap.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    args = ap.parse_args()
+    if not API_FOOTBALL_KEY:
+        raise SystemExit("❌ Falta la variable de entorno API_FOOTBALL_KEY.")
+
+    store = FixtureStore()
+    try:
+        asyncio.run(backfill(
+            [int(x) for x in args.leagues.split(",") if x.strip()],
+            parse_seasons(args.seasons), store, args.refresh, args.concurrency,
+        ))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
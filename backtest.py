@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+"""
+Backtest de las recomendaciones O/U y 1X2 sobre los partidos de fixture_store
+y las cuotas del archivo (tabla odds_archive, la última cuota pre-partido que
+vieron run_once / el bot).
+
+Reglas reproducidas, siempre en el punto en el tiempo (para cada partido solo
+cuenta lo jugado ANTES de su kickoff; el modelo, lo jugado hasta el día anterior):
+  - reporte:  run_once.bloque_partido. Suma de los promedios de GF (últimos
+              LAST_N, todas las competiciones): Over 2.5 si es >= 2.5, si no Under.
+  - homeaway: pronosticos.recomendar_over_under. GF en casa del local + GF de
+              visita del visitante (ponderados por recencia con HALF_LIFE),
+              línea 2.5 (o la más cercana al total) y margen; dentro del margen,
+              el lado con mejor cuota. Sin cuotas archivadas solo cuenta fuera
+              del margen (en vivo no habría recomendación).
+  - modelo:   goal_model por liga. O/U por probabilidad en la línea, 1X2 el
+              resultado más probable y, donde hay cuotas, el mejor pick de valor
+              (value_bets) de cada partido.
+
+Reporta acierto, ROI (1 unidad por pick, solo los que tienen cuota archivada)
+por liga y por cubeta de confianza, y la calibración del modelo (también por
+liga y por cubeta de confianza).
+
+--sweep recorre LAST_N × HALF_LIFE × margen: cada (LAST_N, HALF_LIFE) va a un
+proceso del pool, que calcula las features de todos los partidos a la vez
+(ventanas NumPy sobre las apariciones de cada equipo) y evalúa ahí todos los márgenes.
+
+Uso:
+    python backtest.py --seasons 2023-2025
+    python backtest.py --seasons 2022-2025 --sweep --last-n 5-15 --half-life 0,3,5,8
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from backfill import DEFAULT_LEAGUES, parse_seasons
+from fixture_store import FixtureStore
+from goal_model import fit_league, probs_1x2, score_matrices, total_goals
+from odds_parser import LineBook
+from team_history import RecencyWeights
+from value_bets import etiqueta_valor, evaluar
+
+# Parámetros en uso (los de run_once / pronosticos)
+DEFAULT_LAST_N = 10
+DEFAULT_HALF_LIFE = 5
+DEFAULT_MARGIN = 0.25
+RECENCY_KERNEL = os.getenv("RECENCY_KERNEL", "exponential")
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 2)))
+
+_LADOS_1X2 = ("home", "draw", "away")
+_NOMBRES_1X2 = ("Local", "Empate", "Visitante")
+
+
+# =======================
+# Datos
+# =======================
+class Datos:
+    """
+    Partidos de las temporadas en arreglos paralelos, más:
+      - apariciones (equipo, temporada) ordenadas por ts, para las ventanas de últimos N,
+      - cuotas archivadas alineadas por partido: O/U (F, L) con líneas ascendentes y 1X2 (F, 3).
+    """
+
+    def __init__(self, filas, odds_rows, leagues: Optional[List[int]]):
+        a = np.array([(f[0], f[1] or 0, f[2], f[3], f[5], f[6], f[7], f[8]) for f in filas],
+                     dtype=np.int64).reshape(-1, 8)
+        (self.fixture_id, self.league_id, self.season, self.ts,
+         self.home, self.away, self.gh, self.ga) = (a[:, i].copy() for i in range(8))
+        n = len(a)
+        self.objetivo = np.isin(self.league_id, leagues) if leagues else np.ones(n, dtype=bool)
+
+        # apariciones: una por equipo y partido, agrupadas por (temporada, equipo) y en orden de ts
+        equipo = np.concatenate([self.home, self.away])
+        temporada = np.concatenate([self.season, self.season])
+        orden = np.lexsort((np.concatenate([self.ts, self.ts]), equipo, temporada))
+        self.ap_gf = np.concatenate([self.gh, self.ga])[orden]
+        self.ap_local = np.concatenate([np.ones(n, dtype=bool), np.zeros(n, dtype=bool)])[orden]
+        inv = np.empty(2 * n, dtype=np.int64)
+        inv[orden] = np.arange(2 * n)
+        self.pos_local, self.pos_visita = inv[:n], inv[n:]
+        e, t = equipo[orden], temporada[orden]
+        nuevo = np.r_[True, (e[1:] != e[:-1]) | (t[1:] != t[:-1])] if n else np.zeros(0, dtype=bool)
+        self.ap_inicio = np.maximum.accumulate(np.where(nuevo, np.arange(2 * n), 0)) if n else np.zeros(0, np.int64)
+
+        # cuotas archivadas
+        fila = {int(fid): i for i, fid in enumerate(self.fixture_id)}
+        ou: Dict[int, Dict[float, List[Any]]] = {}
+        self.x12 = np.full((n, 3), np.nan)
+        self.x12_casas: Dict[int, Dict[str, Any]] = {}
+        for fid, market, line, side, odd, book in odds_rows:
+            i = fila.get(fid)
+            if i is None:
+                continue
+            if market == "ou":
+                reg = ou.setdefault(i, {}).setdefault(line, [np.nan, np.nan, None, None])
+                k = 0 if side == "over" else 1
+                reg[k], reg[k + 2] = odd, book
+            elif side in _LADOS_1X2:
+                self.x12[i, _LADOS_1X2.index(side)] = odd
+                self.x12_casas.setdefault(i, {})[side + "_book"] = book
+        ancho = max((len(v) for v in ou.values()), default=0)
+        self.ou_linea = np.full((n, ancho), np.nan)
+        self.ou_over = np.full((n, ancho), np.nan)
+        self.ou_under = np.full((n, ancho), np.nan)
+        self.ou_casas: Dict[int, Dict[float, List[Any]]] = ou
+        for i, lineas in ou.items():
+            for j, line in enumerate(sorted(lineas)):
+                self.ou_linea[i, j] = line
+                self.ou_over[i, j], self.ou_under[i, j] = lineas[line][0], lineas[line][1]
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def resultado_1x2(self) -> np.ndarray:
+        """0 local, 1 empate, 2 visita."""
+        return np.where(self.gh > self.ga, 0, np.where(self.gh == self.ga, 1, 2))
+
+    def libro(self, i: int) -> Optional[LineBook]:
+        lineas = self.ou_casas.get(i)
+        if not lineas:
+            return None
+        lb = LineBook()
+        for line, (over, under, over_book, under_book) in lineas.items():
+            if not np.isnan(over):
+                lb.add(line, "over", over, over_book)
+            if not np.isnan(under):
+                lb.add(line, "under", under, under_book)
+        return lb.finalize()
+
+    def cuotas_1x2(self, i: int) -> Optional[Dict[str, Any]]:
+        if np.isnan(self.x12[i]).all():
+            return None
+        o = {k: (None if np.isnan(v) else float(v)) for k, v in zip(_LADOS_1X2, self.x12[i])}
+        o.update(self.x12_casas.get(i, {}))
+        return o
+
+
+def cargar(store: FixtureStore, seasons: List[int], leagues: Optional[List[int]]) -> Datos:
+    return Datos(store.partidos_temporadas(seasons), store.odds_archivadas(), leagues)
+
+
+# =======================
+# Features punto en el tiempo (vectorizadas)
+# =======================
+def features(d: Datos, last_n: int, half_life, kernel: str = RECENCY_KERNEL):
+    """
+    (total_reporte, total_homeaway) por partido con lo jugado antes del kickoff;
+    NaN si alguno de los equipos no tiene partidos previos en la temporada.
+    Mismos pesos y redondeos que en vivo (np.round puede diferir en una centésima en los empates).
+    """
+    half_life = half_life or None
+    k = np.arange(last_n)
+    # pesos[m, r]: los de pronosticos para un subconjunto de m partidos (r = 0 el más reciente)
+    tabla = RecencyWeights(last_n, (half_life,), kernel)
+    pesos = np.zeros((last_n + 1, last_n))
+    for m in range(1, last_n + 1):
+        pesos[m, :m] = tabla(m, half_life)
+
+    def ventana(pos):
+        idx = pos[:, None] - 1 - k
+        valido = idx >= d.ap_inicio[pos][:, None]
+        idx = np.maximum(idx, 0)
+        return d.ap_gf[idx], d.ap_local[idx], valido
+
+    def ponderado(gf, mascara):
+        rango = np.clip(np.cumsum(mascara, axis=1) - 1, 0, None)
+        m = mascara.sum(axis=1)
+        w = np.where(mascara, pesos[m[:, None], rango], 0.0)
+        return np.where(m > 0, np.round((w * gf).sum(axis=1), 3), 0.0)
+
+    gfL, localL, vL = ventana(d.pos_local)
+    gfV, localV, vV = ventana(d.pos_visita)
+    nL, nV = vL.sum(axis=1), vV.sum(axis=1)
+    ok = (nL > 0) & (nV > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mL = np.round((gfL * vL).sum(axis=1) / nL, 2)
+        mV = np.round((gfV * vV).sum(axis=1) / nV, 2)
+    total_reporte = np.where(ok, np.round(mL + mV, 2), np.nan)
+    total_homeaway = np.where(ok, np.round(ponderado(gfL, vL & localL) + ponderado(gfV, vV & ~localV), 2), np.nan)
+    return total_reporte, total_homeaway
+
+
+# =======================
+# Liquidación y métricas
+# =======================
+def resultado_ou(goles: np.ndarray, linea: np.ndarray, over: np.ndarray):
+    """(fracción ganada, fracción perdida) por pick; las líneas de cuarto van mitad y mitad."""
+    d = np.where(np.isclose(np.mod(linea * 4, 2), 1), 0.25, 0.0)
+    gan = np.zeros(len(goles))
+    per = np.zeros(len(goles))
+    for l in (linea - d, linea + d):
+        gana = np.where(over, goles > l, goles < l)
+        pierde = np.where(over, goles < l, goles > l)
+        gan += gana / 2
+        per += pierde / 2
+    return gan, per
+
+
+def _cubeta_distancia(diff: np.ndarray) -> np.ndarray:
+    """Las mismas distancias total–línea que etiqueta_confianza."""
+    a = np.abs(diff)
+    return np.where(a <= 0.2, "gris (<=0.2)", np.where(a < 0.3, "baja", np.where(a < 0.5, "media", "alta (>=0.5)")))
+
+
+def _cubeta_prob(p: np.ndarray) -> np.ndarray:
+    cortes = np.array([0.45, 0.55, 0.6, 0.65, 0.7])
+    nombres = np.array(["<45%", "45-55%", "55-60%", "60-65%", "65-70%", ">=70%"])
+    return nombres[np.searchsorted(cortes, p, side="right")]
+
+
+def metricas(gan, per, cuota) -> Dict[str, Any]:
+    decididas = gan + per
+    con_cuota = ~np.isnan(cuota)
+    ganancia = np.where(con_cuota, gan * (cuota - 1.0) - per, 0.0)
+    n_cuota = int(con_cuota.sum())
+    return {
+        "picks": int(len(gan)),
+        "acierto": round(float(gan.sum() / decididas.sum()), 4) if decididas.sum() else None,
+        "con_cuota": n_cuota,
+        "roi": round(float(ganancia.sum() / n_cuota), 4) if n_cuota else None,
+        "ganancia": round(float(ganancia.sum()), 2),
+    }
+
+
+def _por_grupo(claves, gan, per, cuota) -> Dict[str, Dict[str, Any]]:
+    out = {}
+    for c in np.unique(claves):
+        m = claves == c
+        out[str(c)] = metricas(gan[m], per[m], cuota[m])
+    return out
+
+
+def informe(picks: Dict[str, np.ndarray], d: Datos) -> Dict[str, Any]:
+    """Global, por liga y por cubeta de confianza de un conjunto de picks."""
+    i, gan, per, cuota = picks["i"], picks["gan"], picks["per"], picks["cuota"]
+    return {
+        "global": metricas(gan, per, cuota),
+        "por_liga": _por_grupo(d.league_id[i].astype(str), gan, per, cuota),
+        "por_confianza": _por_grupo(picks["cubeta"], gan, per, cuota),
+    }
+
+
+# =======================
+# Reglas
+# =======================
+def _linea_elegida(d: Datos, i: np.ndarray, total: np.ndarray):
+    """Columna de la línea 2.5 o, si no está, la más cercana al total (empate -> la más baja); -1 sin cuotas."""
+    if d.ou_linea.shape[1] == 0:
+        return np.full(len(i), -1)
+    lineas = d.ou_linea[i]
+    es25 = np.isclose(lineas, 2.5)
+    dist = np.where(np.isnan(lineas), np.inf, np.abs(lineas - total[:, None]))
+    col = np.where(es25.any(axis=1), es25.argmax(axis=1), dist.argmin(axis=1))
+    return np.where(np.isnan(lineas).all(axis=1), -1, col)
+
+
+def _tomar(m: np.ndarray, i: np.ndarray, col: np.ndarray) -> np.ndarray:
+    if m.shape[1] == 0:
+        return np.full(len(i), np.nan)
+    return np.where(col >= 0, m[i, np.maximum(col, 0)], np.nan)
+
+
+def picks_reporte(d: Datos, total: np.ndarray) -> Dict[str, np.ndarray]:
+    """run_once: Over 2.5 si total >= 2.5, si no Under (cuota de la línea 2.5 si está archivada)."""
+    i = np.flatnonzero(d.objetivo & ~np.isnan(total))
+    t = total[i]
+    over = t >= 2.5
+    linea = np.full(len(i), 2.5)
+    if d.ou_linea.shape[1]:
+        es25 = np.isclose(d.ou_linea[i], 2.5)
+        col = np.where(es25.any(axis=1), es25.argmax(axis=1), -1)
+    else:
+        col = np.full(len(i), -1)
+    cuota = np.where(over, _tomar(d.ou_over, i, col), _tomar(d.ou_under, i, col))
+    gan, per = resultado_ou(d.gh[i] + d.ga[i], linea, over)
+    return {"i": i, "gan": gan, "per": per, "cuota": cuota, "cubeta": _cubeta_distancia(t - 2.5)}
+
+
+def picks_homeaway(d: Datos, total: np.ndarray, margen: float) -> Dict[str, np.ndarray]:
+    """pronosticos.recomendar_over_under con el margen dado."""
+    i = np.flatnonzero(d.objetivo & ~np.isnan(total))
+    t = total[i]
+    col = _linea_elegida(d, i, t)
+    con_cuotas = col >= 0
+    linea = np.where(con_cuotas, _tomar(d.ou_linea, i, col), 2.5)
+    q_over, q_under = _tomar(d.ou_over, i, col), _tomar(d.ou_under, i, col)
+    hay_over, hay_under = ~np.isnan(q_over), ~np.isnan(q_under)
+    por_over = t >= linea + margen
+    por_under = t <= linea - margen
+    # con cuotas: lado por margen (si ese lado tiene cuota), si no el de mejor cuota
+    mejor_over = np.nan_to_num(q_over) >= np.nan_to_num(q_under)
+    over = np.where(por_over & hay_over, True, np.where(por_under & hay_under, False, mejor_over))
+    # sin cuotas: solo fuera del margen
+    over = np.where(con_cuotas, over, por_over)
+    toma = con_cuotas | por_over | por_under
+    i, t, linea, over = i[toma], t[toma], linea[toma], over[toma]
+    cuota = np.where(over, q_over[toma], q_under[toma])
+    gan, per = resultado_ou(d.gh[i] + d.ga[i], linea, over)
+    return {"i": i, "gan": gan, "per": per, "cuota": cuota, "cubeta": _cubeta_distancia(t - linea)}
+
+
+# =======================
+# Modelo punto en el tiempo
+# =======================
+def _modelo_grupo(args):
+    """Una liga/temporada: reajusta con lo jugado hasta el día anterior a cada fecha."""
+    idx, home, away, gh, ga, ts = args
+    dia = ts // 86400
+    lam_h = np.full(len(idx), np.nan)
+    lam_a = np.full(len(idx), np.nan)
+    rho = np.full(len(idx), np.nan)
+    for d in np.unique(dia):
+        antes = dia < d
+        modelo = fit_league(home[antes], away[antes], gh[antes], ga[antes], ts[antes])
+        if modelo is None:
+            continue
+        hoy = np.flatnonzero(dia == d)
+        conocidos = np.array([modelo.conoce(h) and modelo.conoce(a) for h, a in zip(home[hoy], away[hoy])])
+        hoy = hoy[conocidos]
+        if len(hoy):
+            lam_h[hoy], lam_a[hoy] = modelo.lambdas(home[hoy], away[hoy])
+            rho[hoy] = modelo.rho
+    return idx, lam_h, lam_a, rho
+
+
+def lambdas_modelo(d: Datos, pool: Optional[ProcessPoolExecutor] = None):
+    """Goles esperados (y rho) por partido objetivo, un grupo liga/temporada por tarea."""
+    lam_h = np.full(len(d), np.nan)
+    lam_a = np.full(len(d), np.nan)
+    rho = np.full(len(d), np.nan)
+    grupos = []
+    for liga, temporada in {(int(l), int(s)) for l, s in zip(d.league_id[d.objetivo], d.season[d.objetivo])}:
+        idx = np.flatnonzero((d.league_id == liga) & (d.season == temporada))
+        grupos.append((idx, d.home[idx], d.away[idx], d.gh[idx], d.ga[idx], d.ts[idx]))
+    for idx, lh, la, r in (pool.map(_modelo_grupo, grupos) if pool else map(_modelo_grupo, grupos)):
+        lam_h[idx], lam_a[idx], rho[idx] = lh, la, r
+    return lam_h, lam_a, rho
+
+
+def _calibracion(prob: np.ndarray, real: np.ndarray, bins: int = 10) -> List[Dict[str, Any]]:
+    cubeta = np.minimum((prob * bins).astype(int), bins - 1)
+    n = np.bincount(cubeta, minlength=bins)
+    pred = np.bincount(cubeta, prob, bins)
+    obs = np.bincount(cubeta, real.astype(float), bins)
+    return [{"desde": b / bins, "hasta": (b + 1) / bins, "n": int(n[b]),
+             "prob_media": round(pred[b] / n[b], 3), "frecuencia": round(obs[b] / n[b], 3)}
+            for b in range(bins) if n[b]]
+
+
+def _calibrar(prob: np.ndarray, real: np.ndarray) -> Dict[str, Any]:
+    """Cubetas de calibración más su error medio |prob - frecuencia| ponderado por n (ECE)."""
+    cubetas = _calibracion(prob, real)
+    n = sum(c["n"] for c in cubetas)
+    ece = sum(c["n"] * abs(c["prob_media"] - c["frecuencia"]) for c in cubetas) / n if n else None
+    return {"n": n, "ece": None if ece is None else round(ece, 4), "cubetas": cubetas}
+
+
+def calibracion(prob: np.ndarray, real: np.ndarray, liga: np.ndarray, cubeta: np.ndarray) -> Dict[str, Any]:
+    """Como informe(): global, por liga y por cubeta de confianza (una fila por probabilidad)."""
+    return {
+        "global": _calibrar(prob, real),
+        "por_liga": {str(c): _calibrar(prob[liga == c], real[liga == c]) for c in np.unique(liga)},
+        "por_confianza": {str(c): _calibrar(prob[cubeta == c], real[cubeta == c]) for c in np.unique(cubeta)},
+    }
+
+
+def evaluar_modelo(d: Datos, pool: Optional[ProcessPoolExecutor] = None) -> Dict[str, Any]:
+    lam_h, lam_a, rho = lambdas_modelo(d, pool)
+    i = np.flatnonzero(d.objetivo & ~np.isnan(lam_h))
+    if not len(i):
+        return {}
+    mats = score_matrices(lam_h[i], lam_a[i], rho[i])
+    tot = total_goals(mats)
+    x12 = probs_1x2(mats)
+    goles = d.gh[i] + d.ga[i]
+    k = np.arange(tot.shape[1])
+    res = d.resultado_1x2()[i]
+
+    # O/U: línea 2.5 (o la más cercana al total esperado) y el lado más probable
+    col = _linea_elegida(d, i, lam_h[i] + lam_a[i])
+    linea = np.where(col >= 0, _tomar(d.ou_linea, i, col), 2.5)
+    p_over = (tot * (k > linea[:, None])).sum(axis=1)
+    p_under = (tot * (k < linea[:, None])).sum(axis=1)
+    q_over, q_under = _tomar(d.ou_over, i, col), _tomar(d.ou_under, i, col)
+    sin_cuotas = col < 0
+    over = ((p_over >= p_under) & (~np.isnan(q_over) | sin_cuotas)) | (np.isnan(q_under) & ~sin_cuotas)
+    gan, per = resultado_ou(goles, linea, over)
+    ou = {"i": i, "gan": gan, "per": per, "cuota": np.where(over, q_over, q_under),
+          "cubeta": _cubeta_prob(np.where(over, p_over, p_under))}
+
+    # 1X2: el resultado más probable
+    lado = x12.argmax(axis=1)
+    gan_x = (lado == res).astype(float)
+    unox2 = {"i": i, "gan": gan_x, "per": 1.0 - gan_x, "cuota": d.x12[i, lado],
+             "cubeta": _cubeta_prob(x12[np.arange(len(i)), lado])}
+
+    # valor: el mejor pick (EV) de cada partido con cuotas archivadas
+    j = np.flatnonzero((col >= 0) | ~np.isnan(d.x12[i]).all(axis=1))
+    valor = None
+    if len(j):
+        v = evaluar(tot[j], x12[j], [d.libro(int(x)) for x in i[j]], [d.cuotas_1x2(int(x)) for x in i[j]])
+        picks = v.ranking(por_partido=1)
+        if picks:
+            fi = np.array([i[j[p["fixture"]]] for p in picks])
+            es_ou = np.array([p["mercado"] == "O/U" for p in picks])
+            g = np.zeros(len(picks))
+            pe = np.zeros(len(picks))
+            if es_ou.any():
+                lin = np.array([p["linea"] if p["linea"] is not None else np.nan for p in picks])
+                ov = np.array([p["seleccion"].startswith("Over") for p in picks])
+                g_ou, p_ou = resultado_ou(d.gh[fi] + d.ga[fi], np.nan_to_num(lin), ov)
+                g, pe = np.where(es_ou, g_ou, g), np.where(es_ou, p_ou, pe)
+            if (~es_ou).any():
+                lado_v = np.array([_NOMBRES_1X2.index(p["seleccion"]) if not o else -1 for p, o in zip(picks, es_ou)])
+                gx = (lado_v == d.resultado_1x2()[fi]).astype(float)
+                g, pe = np.where(es_ou, g, gx), np.where(es_ou, pe, 1.0 - gx)
+            valor = {"i": fi, "gan": g, "per": pe, "cuota": np.array([p["cuota"] for p in picks]),
+                     "cubeta": np.array([etiqueta_valor(p["ev"]) for p in picks])}
+
+    p25 = (tot * (k > 2.5)).sum(axis=1)
+    uno_hot = np.eye(3)[res]
+    liga = d.league_id[i].astype(str)
+    out = {
+        "ou": informe(ou, d),
+        "1x2": informe(unox2, d),
+        # cubeta de confianza: la probabilidad del lado más probable, como en los picks
+        "calibracion": {
+            "over_2.5": calibracion(p25, goles > 2.5, liga, _cubeta_prob(np.maximum(p25, 1.0 - p25))),
+            "1x2": calibracion(x12.ravel(), uno_hot.ravel().astype(bool), np.repeat(liga, 3),
+                               np.repeat(_cubeta_prob(x12.max(axis=1)), 3)),
+        },
+        "brier": {
+            "over_2.5": round(float(np.mean((p25 - (goles > 2.5)) ** 2)), 4),
+            "1x2": round(float(np.mean(((x12 - uno_hot) ** 2).sum(axis=1))), 4),
+        },
+    }
+    if valor is not None:
+        out["valor"] = informe(valor, d)
+    return out
+
+
+# =======================
+# Barrido de parámetros (pool de procesos)
+# =======================
+_DATOS: Optional[Datos] = None
+
+
+def _init_worker(datos: Datos):
+    global _DATOS
+    _DATOS = datos
+
+
+def _evaluar_config(args):
+    """Un (LAST_N, HALF_LIFE): features una vez, todos los márgenes sobre ellas."""
+    last_n, half_life, margenes = args
+    d = _DATOS
+    total_rep, total_ha = features(d, last_n, half_life)
+    p = picks_reporte(d, total_rep)
+    filas = [{"estrategia": "reporte", "last_n": last_n, "half_life": half_life, "margen": None,
+              **metricas(p["gan"], p["per"], p["cuota"])}]
+    for m in margenes:
+        p = picks_homeaway(d, total_ha, m)
+        filas.append({"estrategia": "homeaway", "last_n": last_n, "half_life": half_life, "margen": m,
+                      **metricas(p["gan"], p["per"], p["cuota"])})
+    return filas
+
+
+def barrer(d: Datos, last_ns: List[int], half_lives: List[int], margenes: List[float],
+           workers: int = BACKTEST_WORKERS) -> List[Dict[str, Any]]:
+    configs = [(n, h, margenes) for n in last_ns for h in half_lives]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(d,)) as pool:
+        return [fila for filas in pool.map(_evaluar_config, configs) for fila in filas]
+
+
+# =======================
+# Salida
+# =======================
+def _fmt(m: Dict[str, Any]) -> str:
+    acierto = "-" if m["acierto"] is None else f"{100 * m['acierto']:.1f}%"
+    roi = "-" if m["roi"] is None else f"{100 * m['roi']:+.1f}%"
+    return f"{m['picks']:>6} picks  acierto {acierto:>6}  con cuota {m['con_cuota']:>5}  ROI {roi:>7}"
+
+
+def imprimir_informe(nombre: str, inf: Dict[str, Any]):
+    print(f"\n== {nombre}: {_fmt(inf['global'])}")
+    print("  por liga:")
+    for k, m in sorted(inf["por_liga"].items(), key=lambda kv: -kv[1]["picks"]):
+        print(f"    {k:>8}  {_fmt(m)}")
+    print("  por confianza:")
+    for k, m in sorted(inf["por_confianza"].items()):
+        print(f"    {k:>26}  {_fmt(m)}")
+
+
+def imprimir_calibracion(nombre: str, cal: Dict[str, Any]):
+    def _ece(c):
+        return "-" if c["ece"] is None else f"{c['ece']:.3f}"
+
+    print(f"\n  Calibración {nombre}: ECE {_ece(cal['global'])} (n={cal['global']['n']}) — prob. media -> frecuencia:")
+    for c in cal["global"]["cubetas"]:
+        print(f"    {c['desde']:.1f}-{c['hasta']:.1f}: {c['prob_media']:.3f} -> {c['frecuencia']:.3f}  (n={c['n']})")
+    print("    ECE por liga: " + ", ".join(
+        f"{k} {_ece(c)} (n={c['n']})" for k, c in sorted(cal["por_liga"].items(), key=lambda kv: -kv[1]["n"])))
+    print("    ECE por confianza: " + ", ".join(f"{k} {_ece(c)} (n={c['n']})" for k, c in sorted(cal["por_confianza"].items())))
+
+
+def _ints(spec: str) -> List[int]:
+    return parse_seasons(spec)
+
+
+def _floats(spec: str) -> List[float]:
+    return sorted({float(x) for x in spec.split(",") if x.strip()})
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seasons", default=os.getenv("SEASON_HIST", "2025"), help="años: '2022-2025' o '2023,2025'")
+    ap.add_argument("--leagues", default=",".join(str(l) for l in DEFAULT_LEAGUES),
+                    help="ligas a evaluar (las features usan todas las competiciones del store)")
+    ap.add_argument("--last-n", default=str(DEFAULT_LAST_N), help="LAST_N o rango para --sweep ('5-15')")
+    ap.add_argument("--half-life", default=str(DEFAULT_HALF_LIFE), help="HALF_LIFE (0 = sin recencia) o lista")
+    ap.add_argument("--margin", default=str(DEFAULT_MARGIN), help="margen de homeaway o lista ('0,0.1,0.25')")
+    ap.add_argument("--sweep", action="store_true", help="barrer LAST_N × HALF_LIFE × margen")
+    ap.add_argument("--no-model", action="store_true", help="no evaluar el modelo de goles")
+    ap.add_argument("--workers", type=int, default=BACKTEST_WORKERS)
+    ap.add_argument("--top", type=int, default=15, help="filas del ranking del barrido")
+    ap.add_argument("--json", help="guardar el informe completo en este archivo")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    store = FixtureStore()
+    try:
+        d = cargar(store, parse_seasons(args.seasons), [int(x) for x in args.leagues.split(",") if x.strip()])
+    finally:
+        store.close()
+    con_cuotas = int(((~np.isnan(d.ou_linea)).any(axis=1) | ~np.isnan(d.x12).all(axis=1))[d.objetivo].sum()) \
+        if len(d) else 0
+    print(f"{int(d.objetivo.sum())} partidos a evaluar ({len(d)} en el store, {con_cuotas} con cuotas "
+          f"archivadas), cargados en {time.perf_counter() - t0:.2f}s")
+    salida: Dict[str, Any] = {}
+
+    if args.sweep:
+        t = time.perf_counter()
+        filas = barrer(d, _ints(args.last_n), _ints(args.half_life), _floats(args.margin), args.workers)
+        clave = "roi" if any(f["roi"] is not None for f in filas) else "acierto"
+        filas.sort(key=lambda f: -(f[clave] if f[clave] is not None else -1e9))
+        print(f"\nBarrido: {len(filas)} configuraciones en {time.perf_counter() - t:.2f}s (orden por {clave})")
+        for f in filas[: args.top]:
+            margen = "-" if f["margen"] is None else f"{f['margen']:.2f}"
+            print(f"  {f['estrategia']:>9} N={f['last_n']:>2} HL={f['half_life']:>2} margen={margen:>5}  {_fmt(f)}")
+        salida["barrido"] = filas
+    else:
+        n, h, m = _ints(args.last_n)[0], _ints(args.half_life)[0], _floats(args.margin)[0]
+        total_rep, total_ha = features(d, n, h)
+        salida["reporte"] = informe(picks_reporte(d, total_rep), d)
+        salida["homeaway"] = informe(picks_homeaway(d, total_ha, m), d)
+        imprimir_informe(f"reporte (Over 2.5 si total >= 2.5, N={n})", salida["reporte"])
+        imprimir_informe(f"homeaway (N={n}, HL={h}, margen={m})", salida["homeaway"])
+        if not args.no_model:
+            t = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                salida["modelo"] = evaluar_modelo(d, pool)
+            if salida["modelo"]:
+                imprimir_informe("modelo O/U", salida["modelo"]["ou"])
+                imprimir_informe("modelo 1X2", salida["modelo"]["1x2"])
+                if "valor" in salida["modelo"]:
+                    imprimir_informe("modelo valor (mejor EV por partido)", salida["modelo"]["valor"])
+                print(f"\n  Brier: {salida['modelo']['brier']}  (modelo en {time.perf_counter() - t:.2f}s)")
+                imprimir_calibracion("Over 2.5", salida["modelo"]["calibracion"]["over_2.5"])
+                imprimir_calibracion("1X2", salida["modelo"]["calibracion"]["1x2"])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False)
+    print(f"\nListo en {time.perf_counter() - t0:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor HTTP local que reemplaza a API-Football (y al Bot API de Telegram)
+para medir el pipeline sin tocar la red.
+
+Sirve /fixtures, /odds, /fixtures/statistics y /predictions a partir de un
+dataset:
+  - grabado: JSON (o .json.gz) con las entidades que devolvió la API real
+    (ver --record); al cargarlo se corren los horarios para que el momento
+    de la grabación coincida con "ahora".
+  - sintético: N ligas de 20 equipos con 30 fechas jugadas y partidos hoy/mañana.
+
+Simula el cupo por minuto (headers x-ratelimit-*, 429 con Retry-After al
+pasarse), latencia configurable y 429 aleatorios. POST /bot<token>/sendMessage
+responde como Telegram. GET /__stats devuelve los contadores; POST /__reset los borra.
+
+Uso:
+    python bench/replay_server.py --leagues 12 --latency-ms 80 --p429 0.02
+    python bench/replay_server.py --dataset grabacion.json.gz
+    python bench/replay_server.py --record grabacion.json.gz \\
+        --upstream https://v3.football.api-sports.io --api-key $API_FOOTBALL_KEY
+y luego API_FOOTBALL_BASE_URL=http://127.0.0.1:8765 TELEGRAM_API_BASE=http://127.0.0.1:8765 python run_once.py
+"""
+import argparse
+import copy
+import gzip
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import pytz
+
+# Ligas reales primero (las de ALLOWED_LEAGUE_IDS), luego IDs inventados
+REAL_LEAGUES = [239, 241, 39, 140, 71, 135, 2, 3, 78, 61, 34, 32]
+ODDS_PAGE_SIZE = 10  # igual que la API
+
+
+# =======================
+# Datasets
+# =======================
+class Dataset:
+    """Entidades por fixture: fixture crudo, estadísticas, predicción y odds."""
+
+    def __init__(self, fixtures: Dict[int, Dict[str, Any]], statistics=None, predictions=None, odds=None):
+        self.fixtures = fixtures
+        self.statistics: Dict[int, List[Dict[str, Any]]] = statistics or {}
+        self.predictions: Dict[int, List[Dict[str, Any]]] = predictions or {}
+        self.odds: Dict[int, Dict[str, Any]] = odds or {}
+
+    def leagues(self) -> Dict[int, str]:
+        out = {}
+        for fx in self.fixtures.values():
+            lg = fx.get("league") or {}
+            out.setdefault(lg.get("id"), lg.get("name") or f"Liga {lg.get('id')}")
+        return out
+
+    def restrict(self, league_ids) -> "Dataset":
+        out = copy.copy(self)  # conserva los generadores del sintético
+        out.fixtures = {i: fx for i, fx in self.fixtures.items() if (fx.get("league") or {}).get("id") in league_ids}
+        return out
+
+    # lo que no esté grabado se contesta vacío; el sintético lo genera
+    def stats_for(self, fixture_id: int) -> List[Dict[str, Any]]:
+        return self.statistics.get(fixture_id, [])
+
+    def prediction_for(self, fixture_id: int) -> List[Dict[str, Any]]:
+        return self.predictions.get(fixture_id, [])
+
+    def odds_for(self, fixture_id: int) -> Optional[Dict[str, Any]]:
+        return self.odds.get(fixture_id)
+
+    # ---- persistencia ----
+    def save(self, path: str):
+        data = {
+            "recorded_at": time.time(),
+            "fixtures": list(self.fixtures.values()),
+            "statistics": {str(k): v for k, v in self.statistics.items()},
+            "predictions": {str(k): v for k, v in self.predictions.items()},
+            "odds": {str(k): v for k, v in self.odds.items()},
+        }
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str, shift_to_now: bool = True) -> "Dataset":
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        shift = int(time.time() - data.get("recorded_at", time.time())) if shift_to_now else 0
+        fixtures = {}
+        for fx in data.get("fixtures", []):
+            fixture = fx["fixture"]
+            if shift and fixture.get("timestamp"):
+                fixture["timestamp"] += shift
+                fixture["date"] = datetime.fromtimestamp(fixture["timestamp"], tz=timezone.utc).isoformat()
+            fixtures[fixture["id"]] = fx
+        return cls(
+            fixtures,
+            {int(k): v for k, v in data.get("statistics", {}).items()},
+            {int(k): v for k, v in data.get("predictions", {}).items()},
+            {int(k): v for k, v in data.get("odds", {}).items()},
+        )
+
+    def merge(self, path: str, params: Dict[str, str], response: List[Dict[str, Any]]):
+        """Incorpora una respuesta real (modo --record)."""
+        if path == "/fixtures":
+            for fx in response:
+                self.fixtures[fx["fixture"]["id"]] = fx
+        elif path == "/fixtures/statistics" and "fixture" in params:
+            self.statistics[int(params["fixture"])] = response
+        elif path == "/predictions" and "fixture" in params:
+            self.predictions[int(params["fixture"])] = response
+        elif path == "/odds":
+            for entry in response:
+                self.odds[entry["fixture"]["id"]] = entry
+
+
+def _fixture(fid: int, ts: int, league_id: int, season: int, home: int, away: int,
+             status: str, gh: Optional[int], ga: Optional[int]) -> Dict[str, Any]:
+    return {
+        "fixture": {
+            "id": fid, "referee": None, "timezone": "UTC",
+            "date": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(), "timestamp": ts,
+            "periods": {"first": None, "second": None},
+            "venue": {"id": home, "name": f"Estadio {home}", "city": "Ciudad"},
+            "status": {"long": "Match Finished" if status == "FT" else "Not Started",
+                       "short": status, "elapsed": 90 if status == "FT" else None},
+        },
+        "league": {"id": league_id, "name": f"Liga {league_id}", "country": "Bench",
+                   "logo": f"https://media.api-sports.io/football/leagues/{league_id}.png",
+                   "flag": None, "season": season, "round": "Regular Season"},
+        "teams": {
+            "home": {"id": home, "name": f"Equipo {home}", "logo": f"https://media.api-sports.io/football/teams/{home}.png",
+                     "winner": None if gh is None else gh > ga},
+            "away": {"id": away, "name": f"Equipo {away}", "logo": f"https://media.api-sports.io/football/teams/{away}.png",
+                     "winner": None if gh is None else ga > gh},
+        },
+        "goals": {"home": gh, "away": ga},
+        "score": {"halftime": {"home": None, "away": None}, "fulltime": {"home": gh, "away": ga},
+                  "extratime": {"home": None, "away": None}, "penalty": {"home": None, "away": None}},
+    }
+
+
+BOGOTA_TZ = pytz.timezone("America/Bogota")
+
+
+def _inicio_hoy_bogota(now: int, per_day: int) -> int:
+    """
+    Kickoff del primer partido de "hoy": desde el mediodía de Bogotá (o una hora
+    después de now si ya pasó), sin que el último se salga del día local.
+    Con el offset fijo en UTC, corriendo de noche caían todos en el día siguiente.
+    """
+    hoy = datetime.fromtimestamp(now, tz=timezone.utc).astimezone(BOGOTA_TZ).date()
+    mediodia = int(BOGOTA_TZ.localize(datetime(hoy.year, hoy.month, hoy.day, 12)).timestamp())
+    fin = mediodia + 12 * 3600 - 60 - max(per_day - 1, 0) * 1800
+    return min(max(mediodia, now + 3600), fin)
+
+
+class SyntheticDataset(Dataset):
+    """
+    Ligas de 'teams' equipos con 'rounds' fechas ya jugadas (una por semana) y
+    'per_day' partidos hoy y mañana; estadísticas, predicciones y odds se
+    generan al vuelo (deterministas por fixture_id).
+    """
+
+    def __init__(self, n_leagues: int, season: int, teams: int = 20, rounds: int = 30,
+                 per_day: int = 5, seed: int = 7):
+        rnd = random.Random(seed)
+        now = int(time.time())
+        inicio = _inicio_hoy_bogota(now, per_day)
+        fixtures: Dict[int, Dict[str, Any]] = {}
+        fid = 1_000_000
+        ligas = REAL_LEAGUES[:n_leagues] + list(range(5000, 5000 + max(0, n_leagues - len(REAL_LEAGUES))))
+        for n, league_id in enumerate(ligas):
+            equipos = list(range(10_000 + n * 100, 10_000 + n * 100 + teams))
+            for r in range(rounds):
+                ts = now - (rounds - r) * 7 * 86400 + n * 60
+                # round-robin: rota todos menos el primero
+                rot = equipos[:1] + equipos[1:][r % (teams - 1):] + equipos[1:][: r % (teams - 1)]
+                for k in range(teams // 2):
+                    home, away = rot[k], rot[teams - 1 - k]
+                    if r % 2:
+                        home, away = away, home
+                    fid += 1
+                    fixtures[fid] = _fixture(fid, ts + k * 900, league_id, season, home, away,
+                                             "FT", rnd.randint(0, 4), rnd.randint(0, 3))
+            for dia in (0, 1):
+                for k in range(per_day):
+                    home, away = equipos[2 * k], equipos[2 * k + 1]
+                    fid += 1
+                    ts = inicio + dia * 86400 + k * 1800
+                    fixtures[fid] = _fixture(fid, ts, league_id, season, home, away, "NS", None, None)
+        super().__init__(fixtures)
+
+    def stats_for(self, fixture_id):
+        fx = self.fixtures.get(fixture_id)
+        if fx is None or fx["fixture"]["status"]["short"] != "FT":
+            return []
+        rnd = random.Random(fixture_id)
+        out = []
+        for lado in ("home", "away"):
+            pos = rnd.randint(35, 65)
+            out.append({"team": {"id": fx["teams"][lado]["id"], "name": fx["teams"][lado]["name"]}, "statistics": [
+                {"type": "Shots on Goal", "value": rnd.randint(0, 9)},
+                {"type": "Total Shots", "value": rnd.randint(4, 22)},
+                {"type": "Fouls", "value": rnd.randint(6, 18)},
+                {"type": "Corner Kicks", "value": rnd.randint(0, 11)},
+                {"type": "Ball Possession", "value": f"{pos}%"},
+                {"type": "Yellow Cards", "value": rnd.randint(0, 5) or None},
+                {"type": "Red Cards", "value": 1 if rnd.random() < 0.05 else None},
+            ]})
+        return out
+
+    def prediction_for(self, fixture_id):
+        fx = self.fixtures.get(fixture_id)
+        if fx is None:
+            return []
+        rnd = random.Random(fixture_id)
+        h = rnd.randint(25, 60)
+        d = rnd.randint(15, 100 - h - 10)
+        return [{"predictions": {
+            "winner": {"id": fx["teams"]["home"]["id"], "name": fx["teams"]["home"]["name"], "comment": None},
+            "advice": "Double chance : home or draw", "under_over": "-2.5",
+            "percent": {"home": f"{h}%", "draw": f"{d}%", "away": f"{100 - h - d}%"},
+        }}]
+
+    def odds_for(self, fixture_id):
+        fx = self.fixtures.get(fixture_id)
+        if fx is None or fx["fixture"]["status"]["short"] != "NS":
+            return None
+        rnd = random.Random(fixture_id)
+        books = []
+        for b in range(8):
+            ou = []
+            for linea in (0.5, 1.5, 2.5, 3.5, 4.5):
+                p_over = 1 / (1 + math.exp(linea - 2.6 + rnd.uniform(-0.4, 0.4)))
+                ou.append({"value": f"Over {linea}", "odd": f"{max(1.01, 0.94 / p_over):.2f}"})
+                ou.append({"value": f"Under {linea}", "odd": f"{max(1.01, 0.94 / (1 - p_over)):.2f}"})
+            books.append({"id": b + 1, "name": f"Casa {b + 1}", "bets": [
+                {"id": 1, "name": "Match Winner", "values": [
+                    {"value": "Home", "odd": f"{rnd.uniform(1.5, 3.5):.2f}"},
+                    {"value": "Draw", "odd": f"{rnd.uniform(2.8, 3.8):.2f}"},
+                    {"value": "Away", "odd": f"{rnd.uniform(1.8, 5.0):.2f}"},
+                ]},
+                {"id": 5, "name": "Goals Over/Under", "values": ou},
+            ]})
+        return {"league": fx["league"], "fixture": {"id": fixture_id, "timestamp": fx["fixture"]["timestamp"],
+                                                      "date": fx["fixture"]["date"]},
+                "update": fx["fixture"]["date"], "bookmakers": books}
+
+
+# =======================
+# Consultas
+# =======================
+def _fecha_local(fx, tz) -> str:
+    return datetime.fromtimestamp(fx["fixture"]["timestamp"], tz=timezone.utc).astimezone(tz).strftime("%Y-%m-%d")
+
+
+def _en_rango(fx, q) -> bool:
+    d = datetime.fromtimestamp(fx["fixture"]["timestamp"], tz=timezone.utc).strftime("%Y-%m-%d")
+    return q.get("from", d) <= d <= q.get("to", d)
+
+
+def consultar(ds: Dataset, path: str, q: Dict[str, str]) -> Dict[str, Any]:
+    """Cuerpo estilo API-Football para path + params."""
+    paging = {"current": 1, "total": 1}
+    if path == "/fixtures":
+        if "id" in q:
+            resp = [ds.fixtures[int(q["id"])]] if int(q["id"]) in ds.fixtures else []
+        elif "date" in q:
+            tz = pytz.timezone(q.get("timezone", "UTC"))
+            resp = [fx for fx in ds.fixtures.values() if _fecha_local(fx, tz) == q["date"]]
+        else:
+            season = int(q["season"]) if "season" in q else None
+            team = int(q["team"]) if "team" in q else None
+            league = int(q["league"]) if "league" in q else None
+            resp = [
+                fx for fx in ds.fixtures.values()
+                if (season is None or fx["league"].get("season") == season)
+                and (team is None or team in (fx["teams"]["home"]["id"], fx["teams"]["away"]["id"]))
+                and (league is None or fx["league"]["id"] == league)
+                and _en_rango(fx, q)
+            ]
+        resp.sort(key=lambda fx: fx["fixture"]["timestamp"])
+    elif path == "/fixtures/statistics":
+        resp = ds.stats_for(int(q.get("fixture", 0)))
+    elif path == "/predictions":
+        resp = ds.prediction_for(int(q.get("fixture", 0)))
+    elif path == "/odds":
+        if "fixture" in q:
+            ids = [int(q["fixture"])]
+        else:
+            tz = pytz.timezone(q.get("timezone", "UTC"))
+            ids = [
+                i for i, fx in sorted(ds.fixtures.items())
+                if ("league" not in q or fx["league"]["id"] == int(q["league"]))
+                and ("season" not in q or fx["league"].get("season") == int(q["season"]))
+                and ("date" not in q or _fecha_local(fx, tz) == q["date"])
+            ]
+        todas = [o for o in (ds.odds_for(i) for i in ids) if o]
+        page = max(1, int(q.get("page", 1)))
+        total = max(1, math.ceil(len(todas) / ODDS_PAGE_SIZE))
+        resp = todas[(page - 1) * ODDS_PAGE_SIZE: page * ODDS_PAGE_SIZE]
+        paging = {"current": page, "total": total}
+    else:
+        return {"get": path, "parameters": q, "errors": {"endpoint": "Endpoint no simulado"},
+                "results": 0, "paging": paging, "response": []}
+    return {"get": path.lstrip("/"), "parameters": q, "errors": [], "results": len(resp),
+            "paging": paging, "response": resp}
+
+
+# =======================
+# Servidor
+# =======================
+class ReplayServer:
+    def __init__(self, dataset: Dataset, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, p429: float = 0.0,
+                 rate_per_min: int = 300, daily_limit: int = 75000,
+                 upstream: Optional[str] = None, api_key: Optional[str] = None, seed: int = 11):
+        self.dataset = dataset
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.p429 = p429
+        self.rate_per_min = rate_per_min
+        self.daily_limit = daily_limit
+        self.upstream = httpx.Client(base_url=upstream, headers={"x-apisports-key": api_key or ""},
+                                     timeout=30.0) if upstream else None
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ventana = deque()
+        self.counts = Counter()
+        self.telegram_messages = 0
+        self.injected_429 = 0
+        self.quota_429 = 0
+        self.daily_used = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ReplayServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.upstream is not None:
+            self.upstream.close()
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.telegram_messages = self.injected_429 = self.quota_429 = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"api_calls": sum(self.counts.values()), "by_path": dict(self.counts),
+                    "telegram_messages": self.telegram_messages,
+                    "injected_429": self.injected_429, "quota_429": self.quota_429}
+
+    def _cupo(self):
+        """(status 429 o None, headers de cupo, retry_after)."""
+        with self._lock:
+            now = time.monotonic()
+            while self._ventana and now - self._ventana[0] >= 60:
+                self._ventana.popleft()
+            headers = {"x-ratelimit-limit": str(self.rate_per_min),
+                       "x-ratelimit-requests-limit": str(self.daily_limit)}
+            if len(self._ventana) >= self.rate_per_min:
+                self.quota_429 += 1
+                retry = max(1, math.ceil(60 - (now - self._ventana[0])))
+            elif self._rnd.random() < self.p429:
+                self.injected_429 += 1
+                retry = 1
+            else:
+                self._ventana.append(now)
+                self.daily_used += 1
+                headers["x-ratelimit-remaining"] = str(self.rate_per_min - len(self._ventana))
+                headers["x-ratelimit-requests-remaining"] = str(max(0, self.daily_limit - self.daily_used))
+                return None, headers
+            headers["x-ratelimit-remaining"] = "0"
+            headers["Retry-After"] = str(retry)
+            return 429, headers
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+                raw = json.dumps(body, separators=(",", ":")).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if url.path == "/__reset":
+                    server.reset()
+                    return self._send(200, {"ok": True})
+                if url.path.endswith("/sendMessage"):
+                    with server._lock:
+                        server.telegram_messages += 1
+                        n = server.telegram_messages
+                    return self._send(200, {"ok": True, "result": {"message_id": n}})
+                self._send(404, {"ok": False})
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                if url.path == "/__stats":
+                    return self._send(200, server.stats())
+                if server.latency or server.jitter:
+                    time.sleep(max(0.0, server.latency + server._rnd.uniform(-server.jitter, server.jitter)))
+                status, headers = server._cupo()
+                if status == 429:
+                    return self._send(429, {"errors": {"rateLimit": "Too many requests"}, "response": []}, headers)
+                with server._lock:
+                    server.counts[url.path] += 1
+                if server.upstream is not None:
+                    r = server.upstream.get(url.path, params=q)
+                    body = r.json()
+                    if r.status_code == 200 and not body.get("errors"):
+                        with server._lock:
+                            server.dataset.merge(url.path, q, body.get("response") or [])
+                    return self._send(r.status_code, body, headers)
+                self._send(200, consultar(server.dataset, url.path, q), headers)
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--dataset", help="grabación JSON/.json.gz (por defecto: sintético)")
+    ap.add_argument("--leagues", type=int, default=12, help="ligas del dataset sintético")
+    ap.add_argument("--season", type=int, default=datetime.now(timezone.utc).year)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--p429", type=float, default=0.0, help="probabilidad de 429 inyectado por petición")
+    ap.add_argument("--rate-per-min", type=int, default=300)
+    ap.add_argument("--record", help="modo grabación: reenvía a --upstream y guarda lo visto en este archivo")
+    ap.add_argument("--upstream", default="https://v3.football.api-sports.io")
+    ap.add_argument("--api-key")
+    args = ap.parse_args()
+
+    if args.record:
+        ds = Dataset({})
+    elif args.dataset:
+        ds = Dataset.load(args.dataset)
+    else:
+        ds = SyntheticDataset(args.leagues, args.season)
+    srv = ReplayServer(ds, args.host, args.port, args.latency_ms, args.jitter_ms, args.p429,
+                       args.rate_per_min, upstream=args.upstream if args.record else None, api_key=args.api_key)
+    print(f"Sirviendo {len(ds.fixtures)} fixtures en {srv.url} (Ctrl+C para salir)")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.stop()
+        if args.record:
+            ds.save(args.record)
+            print(f"Grabados {len(ds.fixtures)} fixtures en {args.record}")
+
+
+if __name__ == "__main__":
+    main()
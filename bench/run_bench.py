@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de escenarios contra bench/replay_server.py (sin red).
+
+Por cada escenario (ligas x cache frío/caliente x objetivo) se levanta un
+proceso hijo limpio que apunta API_FOOTBALL_BASE_URL y TELEGRAM_API_BASE al
+servidor local y mide:
+  - wall time del objetivo
+  - llamadas a la API (contadas por el servidor)
+  - pico de memoria del proceso (ru_maxrss)
+
+Objetivos:
+  run_once    -> run_once.build_and_send() (reporte diario completo)
+  pronostico  -> pronosticos.pronostico() (comando /pronostico)
+
+Frío: caches en disco vacíos y proceso nuevo. Caliente: run_once corre una vez
+antes en el mismo directorio de cache (otro proceso); /pronostico se mide en
+su segunda llamada dentro del mismo proceso.
+
+Uso:
+    python bench/run_bench.py
+    python bench/run_bench.py --leagues 1,12 --latency-ms 60 --p429 0.02 --json bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(AQUI)
+sys.path.insert(0, AQUI)
+
+from replay_server import Dataset, ReplayServer, SyntheticDataset  # noqa: E402
+
+
+# =======================
+# Proceso hijo
+# =======================
+class _Mensaje:
+    def __init__(self):
+        self.enviados = []
+
+    async def reply_text(self, text, **kwargs):
+        self.enviados.append(text)
+
+
+class _Update:
+    """Lo mínimo de telegram.Update que usan los comandos."""
+
+    def __init__(self):
+        self.message = _Mensaje()
+
+
+class _Context:
+    def __init__(self, args=None):
+        self.args = args or []
+        self.bot_data = {}
+
+
+def _peak_rss_mb() -> float:
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kb / 1024.0, 1)  # Linux: KB
+
+
+async def _hijo_run_once(ligas):
+    import run_once
+    run_once.ALLOWED_LEAGUE_IDS.clear()
+    run_once.ALLOWED_LEAGUE_IDS.update(ligas)
+    t = time.perf_counter()
+    await run_once.main()
+    return time.perf_counter() - t, None, False
+
+
+async def _hijo_pronostico(ligas, warm: bool):
+    import pronosticos
+    pronosticos.ALLOWED_LEAGUE_IDS.clear()
+    pronosticos.ALLOWED_LEAGUE_IDS.update(ligas)
+    try:
+        if warm:
+            await pronosticos.pronostico(_Update(), _Context())
+            _post(os.environ["BENCH_SERVER"] + "/__reset")
+        upd = _Update()
+        t = time.perf_counter()
+        await pronosticos.pronostico(upd, _Context())
+        vacio = any(texto.startswith("📭") for texto in upd.message.enviados)
+        return time.perf_counter() - t, len(upd.message.enviados), vacio
+    finally:
+        await pronosticos.async_client.aclose()
+        pronosticos.fixture_store.close()
+
+
+def _post(url):
+    import httpx
+    httpx.post(url)
+
+
+def hijo(target: str, warm: bool):
+    sys.path.insert(0, RAIZ)
+    ligas = {int(k): v for k, v in json.loads(os.environ["BENCH_LEAGUES"]).items()}
+    if target == "run_once":
+        wall, mensajes, vacio = asyncio.run(_hijo_run_once(ligas))
+    else:
+        wall, mensajes, vacio = asyncio.run(_hijo_pronostico(ligas, warm))
+    print(json.dumps({"wall_s": round(wall, 3), "peak_rss_mb": _peak_rss_mb(), "replies": mensajes,
+                      "empty": vacio}))
+
+
+# =======================
+# Orquestador
+# =======================
+def _correr_hijo(target, warm, env):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", target] + (["--warm"] if warm else [])
+    out = subprocess.run(cmd, env=env, cwd=env["BENCH_WORKDIR"], capture_output=True, text=True, timeout=3600)
+    if out.returncode != 0:
+        raise RuntimeError(f"{target} falló:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def escenario(srv: ReplayServer, ligas, target: str, warm: bool, season: int):
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    env = dict(
+        os.environ,
+        PYTHONPATH=RAIZ,
+        BENCH_WORKDIR=workdir,
+        BENCH_SERVER=srv.url,
+        BENCH_LEAGUES=json.dumps({str(k): v for k, v in ligas.items()}),
+        API_FOOTBALL_BASE_URL=srv.url,
+        TELEGRAM_API_BASE=srv.url,
+        API_FOOTBALL_KEY="bench",
+        BOT_TOKEN="bench",
+        CHAT_ID="1",
+        SEASON_HIST=str(season),
+        RUN_MODE="full",
+        FIXTURE_STORE_PATH=os.path.join(workdir, "fixtures.sqlite3"),
+        BLOB_CACHE_PATH=os.path.join(workdir, "blobs.sqlite3"),
+        SUBSCRIPTIONS_PATH=os.path.join(workdir, "subscriptions.json"),
+        TELEGRAM_CHAT_INTERVAL="0",
+    )
+    if warm and target == "run_once":
+        _correr_hijo(target, False, env)
+    srv.reset()
+    res = _correr_hijo(target, warm and target != "run_once", env)
+    st = srv.stats()
+    res.update(api_calls=st["api_calls"], by_path=st["by_path"], telegram_messages=st["telegram_messages"],
+               throttled=st["injected_429"] + st["quota_429"])
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--child", choices=("run_once", "pronostico"), help=argparse.SUPPRESS)
+    ap.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--leagues", default="1,12,50", help="escenarios de cantidad de ligas")
+    ap.add_argument("--targets", default="run_once,pronostico")
+    ap.add_argument("--caches", default="cold,warm")
+    ap.add_argument("--dataset", help="grabación de replay_server.py (por defecto: sintético)")
+    ap.add_argument("--season", type=int, default=datetime.now(timezone.utc).year)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--p429", type=float, default=0.0)
+    ap.add_argument("--rate-per-min", type=int, default=100000,
+                    help="cupo por minuto simulado (por defecto sin tope efectivo)")
+    ap.add_argument("--json", help="guardar resultados en este archivo")
+    args = ap.parse_args()
+
+    if args.child:
+        return hijo(args.child, args.warm)
+
+    n_ligas = [int(x) for x in args.leagues.split(",") if x]
+    base = Dataset.load(args.dataset) if args.dataset else SyntheticDataset(max(n_ligas), args.season)
+    todas = base.leagues()
+    resultados = []
+    print(f"{'objetivo':<11} {'ligas':>5} {'cache':<5} {'wall s':>8} {'API':>6} {'429':>5} {'msgs':>5} {'RSS MB':>7}")
+    for n in n_ligas:
+        ligas = dict(list(todas.items())[:n])
+        ds = base.restrict(set(ligas))
+        srv = ReplayServer(ds, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           p429=args.p429, rate_per_min=args.rate_per_min).start()
+        try:
+            for target in args.targets.split(","):
+                for cache in args.caches.split(","):
+                    r = escenario(srv, ligas, target, cache == "warm", args.season)
+                    r.update(target=target, leagues=n, cache=cache)
+                    resultados.append(r)
+                    msgs = r["telegram_messages"] if target == "run_once" else r["replies"]
+                    print(f"{target:<11} {n:>5} {cache:<5} {r['wall_s']:>8.2f} {r['api_calls']:>6} "
+                          f"{r['throttled']:>5} {msgs:>5} {r['peak_rss_mb']:>7}")
+                    if r.get("empty"):
+                        print("  ⚠️ /pronostico respondió sin partidos para hoy: no se midió el análisis")
+        finally:
+            srv.stop()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
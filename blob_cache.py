@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Cache persistente (SQLite) de respuestas por fixture: (tipo, fixture_id) -> JSON
+comprimido con zlib.
+
+Las entradas sin TTL no vencen nunca (estadísticas de partidos terminados);
+las que tienen TTL (predicciones previas al partido) se ignoran al vencer.
+WAL + busy timeout para que dos corridas superpuestas no se pisen.
+"""
+import json
+import os
+import sqlite3
+import time
+import zlib
+from typing import Any, Optional
+
+BLOB_CACHE_PATH = os.getenv("BLOB_CACHE_PATH", os.path.join(".cache", "blobs.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    kind        TEXT NOT NULL,
+    key         INTEGER NOT NULL,
+    data        BLOB NOT NULL,
+    stored_at   REAL NOT NULL,
+    expires_at  REAL,            -- NULL = inmutable
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+"""
+
+
+class BlobCache:
+    def __init__(self, path: str = BLOB_CACHE_PATH):
+        carpeta = os.path.dirname(path)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=30.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self.hits = self.misses = 0
+        self.purged = 0
+
+    def close(self):
+        self._db.close()
+
+    def get(self, kind: str, key: int) -> Optional[Any]:
+        row = self._db.execute(
+            "SELECT data, expires_at FROM blobs WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, kind: str, key: int, value: Any, ttl: Optional[float] = None):
+        """ttl=None -> no vence nunca."""
+        now = time.time()
+        data = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 6)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO blobs (kind, key, data, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, data, now, None if ttl is None else now + ttl),
+            )
+
+    def purge_expired(self) -> int:
+        """Borra las entradas vencidas (predicciones, análisis, snapshots del reporte)."""
+        with self._db:
+            cur = self._db.execute(
+                "DELETE FROM blobs WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            )
+        self.purged += cur.rowcount
+        return cur.rowcount
@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén persistente (SQLite) de fixtures TERMINADOS por equipo y temporada.
+
+Un partido terminado no cambia nunca, así que lo guardamos en disco y en las
+siguientes corridas solo le pedimos a la API lo posterior al último partido
+terminado que ya tenemos (parámetros from/to de /fixtures). Además se recuerda
+el próximo partido pendiente de cada equipo: mientras no haya arrancado (y
+terminado) no hay nada nuevo que traer.
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from team_history import TeamHistory
+
+FIXTURE_STORE_PATH = os.getenv("FIXTURE_STORE_PATH", os.path.join(".cache", "fixtures.sqlite3"))
+# No volver a sincronizar un equipo/temporada antes de este tiempo (segundos)
+FIXTURE_SYNC_TTL = int(os.getenv("FIXTURE_SYNC_TTL", "3600"))
+# Pasado el TTL, se re-sincroniza si no se conoce su próximo partido, si este ya
+# debió terminar (kickoff + FIXTURE_RESULT_GRACE) o si la última sincronización es
+# más vieja que MAX_AGE
+FIXTURE_RESULT_GRACE = int(os.getenv("FIXTURE_RESULT_GRACE", "10800"))
+FIXTURE_SYNC_MAX_AGE = int(os.getenv("FIXTURE_SYNC_MAX_AGE", str(7 * 86400)))
+# Ventana hacia adelante de las sincronizaciones incrementales (para ver el próximo partido)
+FIXTURE_LOOKAHEAD_DAYS = int(os.getenv("FIXTURE_LOOKAHEAD_DAYS", "30"))
+
+FINISHED_STATES = {"FT", "AET", "PEN"}
+# Estados que no van a producir resultado (no cuentan como "próximo partido")
+_NO_RESULT_STATES = {"PST", "CANC", "ABD", "AWD", "WO"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fixtures (
+    fixture_id  INTEGER PRIMARY KEY,
+    league_id   INTEGER,
+    season      INTEGER NOT NULL,
+    ts          INTEGER NOT NULL,
+    status      TEXT NOT NULL,
+    home_id     INTEGER NOT NULL,
+    away_id     INTEGER NOT NULL,
+    goals_home  INTEGER NOT NULL,
+    goals_away  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_fixtures_home ON fixtures (season, home_id);
+CREATE INDEX IF NOT EXISTS ix_fixtures_away ON fixtures (season, away_id);
+CREATE INDEX IF NOT EXISTS ix_fixtures_league ON fixtures (league_id, season);
+CREATE TABLE IF NOT EXISTS team_sync (
+    team_id    INTEGER NOT NULL,
+    season     INTEGER NOT NULL,
+    last_ts    INTEGER,          -- último partido terminado visto (marca de agua)
+    synced_at  REAL NOT NULL,
+    next_ts    INTEGER,          -- kickoff del próximo partido pendiente conocido
+    PRIMARY KEY (team_id, season)
+);
+CREATE TABLE IF NOT EXISTS backfill (
+    league_id   INTEGER NOT NULL,
+    season      INTEGER NOT NULL,
+    page        INTEGER NOT NULL,  -- última página ingerida
+    done        INTEGER NOT NULL,  -- 1 = temporada cerrada (nada pendiente): no volver a pedirla
+    fixtures    INTEGER NOT NULL,  -- terminados guardados en la pasada actual (desde la página 1)
+    updated_at  REAL NOT NULL,
+    pending     INTEGER NOT NULL DEFAULT 0,  -- la pasada actual ya vio partidos por jugar
+    PRIMARY KEY (league_id, season)
+);
+CREATE TABLE IF NOT EXISTS league_sync (
+    league_id   INTEGER NOT NULL,
+    season      INTEGER NOT NULL,
+    last_ts     INTEGER,           -- último partido terminado de la liga visto
+    next_ts     INTEGER,           -- kickoff del próximo partido pendiente de la liga
+    synced_at   REAL NOT NULL,
+    PRIMARY KEY (league_id, season)
+);
+CREATE TABLE IF NOT EXISTS league_teams (
+    league_id   INTEGER NOT NULL,  -- equipos vistos en la carga de la liga/temporada
+    season      INTEGER NOT NULL,
+    team_id     INTEGER NOT NULL,
+    PRIMARY KEY (league_id, season, team_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS odds_archive (
+    fixture_id  INTEGER NOT NULL,
+    market      TEXT NOT NULL,     -- 'ou' | '1x2'
+    line        REAL NOT NULL,     -- 0 en 1X2
+    side        TEXT NOT NULL,     -- over/under | home/draw/away
+    odd         REAL NOT NULL,
+    book        TEXT,
+    captured_at REAL NOT NULL,     -- siempre antes del kickoff (ver archivar_odds)
+    PRIMARY KEY (fixture_id, market, line, side)
+);
+"""
+
+# (fixture_id, league_id, season, ts, status, home_id, away_id, goals_home, goals_away)
+FixtureRow = Tuple[int, Optional[int], int, int, str, int, int, int, int]
+
+
+def _goles(fx: Dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    goals = fx.get("goals") or {}
+    gh, ga = goals.get("home"), goals.get("away")
+    if isinstance(gh, int) and isinstance(ga, int):
+        return gh, ga
+    score = fx.get("score") or {}
+    for k in ("fulltime", "extratime", "penalty"):
+        par = score.get(k) or {}
+        gh, ga = par.get("home"), par.get("away")
+        if isinstance(gh, int) and isinstance(ga, int):
+            return gh, ga
+    return None, None
+
+
+def proyectar_fixture(fx: Dict[str, Any], season: int) -> Optional[FixtureRow]:
+    """
+    Reduce un fixture crudo de la API a una fila del almacén.
+    Devuelve None si el partido no está terminado o le faltan datos.
+    """
+    fixture = fx.get("fixture") or {}
+    status = (fixture.get("status") or {}).get("short")
+    if status not in FINISHED_STATES:
+        return None
+    fx_id = fixture.get("id")
+    ts = fixture.get("timestamp") or 0
+    teams = fx.get("teams") or {}
+    home_id = (teams.get("home") or {}).get("id")
+    away_id = (teams.get("away") or {}).get("id")
+    gh, ga = _goles(fx)
+    if not fx_id or not ts or home_id is None or away_id is None or gh is None or ga is None:
+        return None
+    league_id = (fx.get("league") or {}).get("id")
+    return (fx_id, league_id, season, ts, status, home_id, away_id, gh, ga)
+
+
+class FixtureStore:
+    """Fixtures terminados en SQLite, con marca de agua por (equipo, temporada)."""
+
+    def __init__(self, path: str = FIXTURE_STORE_PATH, sync_ttl: int = FIXTURE_SYNC_TTL):
+        carpeta = os.path.dirname(path)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self.path = path
+        self.sync_ttl = sync_ttl
+        self._db = sqlite3.connect(path, timeout=30.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        tablas = {row[0] for row in self._db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self._db.executescript(_SCHEMA)
+        if "league_sync" in tablas and "league_teams" not in tablas:
+            # cargas por liga previas a league_teams: sus equipos salen de los terminados guardados
+            for lado in ("home_id", "away_id"):
+                self._db.execute(
+                    f"INSERT OR IGNORE INTO league_teams (league_id, season, team_id) "
+                    f"SELECT DISTINCT f.league_id, f.season, f.{lado} FROM fixtures f "
+                    f"JOIN league_sync l ON l.league_id = f.league_id AND l.season = f.season"
+                )
+        if "backfill" in tablas and "league_sync" not in tablas:
+            # stores donde la carga por liga avanzaba team_sync: esas marcas de agua
+            # saltaban copas e internacionales, cada equipo vuelve a su temporada completa
+            self._db.execute("DELETE FROM team_sync")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # cuotas archivadas con el parser que mezclaba mercados (primer tiempo,
+            # tarjetas) en el libro de goles: no sirven para el backtest
+            self._db.execute("DELETE FROM odds_archive")
+            self._db.execute("PRAGMA user_version = 1")
+        cols = {row[1] for row in self._db.execute("PRAGMA table_info(team_sync)")}
+        if "next_ts" not in cols:  # stores creados antes de next_ts
+            self._db.execute("ALTER TABLE team_sync ADD COLUMN next_ts INTEGER")
+        cols = {row[1] for row in self._db.execute("PRAGMA table_info(backfill)")}
+        if "pending" not in cols:  # stores creados antes de pending
+            self._db.execute("ALTER TABLE backfill ADD COLUMN pending INTEGER NOT NULL DEFAULT 0")
+        self._db.commit()
+        # (team_id, season) -> TeamHistory decodificado una sola vez; se invalida al escribir
+        self._historiales: Dict[Tuple[int, int], TeamHistory] = {}
+        # (league_id, season) -> filas de la liga para el modelo de goles; ídem
+        self._ligas: Dict[Tuple[int, int], List[Tuple[int, int, int, int, int]]] = {}
+
+    def close(self):
+        self._db.close()
+
+    # ---- lectura ----
+    def historial(self, team_id: int, season: int) -> TeamHistory:
+        """Historial columnar del equipo (memo en proceso hasta la próxima escritura)."""
+        key = (team_id, season)
+        hist = self._historiales.get(key)
+        if hist is None:
+            cur = self._db.execute(
+                "SELECT fixture_id, ts, home_id, away_id, goals_home, goals_away "
+                "FROM fixtures WHERE season = ? AND (home_id = ? OR away_id = ?)",
+                (season, team_id, team_id),
+            )
+            hist = self._historiales[key] = TeamHistory.from_rows(team_id, season, cur.fetchall())
+        return hist
+
+    def partidos_liga(self, league_id: int, season: int) -> List[Tuple[int, int, int, int, int]]:
+        """
+        Terminados de la liga/temporada como (home_id, away_id, goals_home,
+        goals_away, ts). Es la misma lista (mismo objeto) hasta la próxima
+        escritura que la toque, así quien ajusta un modelo puede memoizar por identidad.
+        """
+        key = (league_id, season)
+        filas = self._ligas.get(key)
+        if filas is None:
+            cur = self._db.execute(
+                "SELECT home_id, away_id, goals_home, goals_away, ts "
+                "FROM fixtures WHERE league_id = ? AND season = ? ORDER BY ts",
+                (league_id, season),
+            )
+            filas = self._ligas[key] = cur.fetchall()
+        return filas
+
+    def _estado_sync(self, team_id: int, season: int) -> Tuple[Optional[int], Optional[float], Optional[int]]:
+        row = self._db.execute(
+            "SELECT last_ts, synced_at, next_ts FROM team_sync WHERE team_id = ? AND season = ?",
+            (team_id, season),
+        ).fetchone()
+        return (row[0], row[1], row[2]) if row else (None, None, None)
+
+    def necesita_sync(self, team_id: int, season: int) -> bool:
+        _, synced_at, next_ts = self._estado_sync(team_id, season)
+        if synced_at is None:
+            return True
+        now = time.time()
+        edad = now - synced_at
+        if edad <= self.sync_ttl:
+            return False
+        if edad > FIXTURE_SYNC_MAX_AGE:
+            return True
+        # solo hay algo nuevo si su próximo partido pendiente ya se jugó; sin
+        # próximo conocido (fuera de la ventana) no hay nada que esperar
+        return next_ts is None or now >= next_ts + FIXTURE_RESULT_GRACE
+
+    def params_sync(self, team_id: int, season: int) -> Dict[str, Any]:
+        """
+        Parámetros de /fixtures para traer solo lo nuevo: temporada completa la
+        primera vez y desde el día del último terminado conocido en adelante después.
+        """
+        params: Dict[str, Any] = {"team": team_id, "season": season}
+        last_ts, _, _ = self._estado_sync(team_id, season)
+        if last_ts:
+            desde = datetime.fromtimestamp(last_ts, tz=timezone.utc).date()
+            hasta = max(datetime.now(timezone.utc).date() + timedelta(days=FIXTURE_LOOKAHEAD_DAYS), desde)
+            params["from"] = desde.strftime("%Y-%m-%d")
+            params["to"] = hasta.strftime("%Y-%m-%d")
+        return params
+
+    # ---- escritura ----
+    def guardar(self, fixtures: List[Dict[str, Any]], season: int) -> List[FixtureRow]:
+        """Inserta/actualiza los terminados de una lista de fixtures crudos."""
+        filas = [f for f in (proyectar_fixture(fx, season) for fx in fixtures) if f]
+        if filas:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO fixtures "
+                    "(fixture_id, league_id, season, ts, status, home_id, away_id, goals_home, goals_away) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    filas,
+                )
+            for f in filas:
+                self._historiales.pop((f[5], f[2]), None)
+                self._historiales.pop((f[6], f[2]), None)
+                self._ligas.pop((f[1], f[2]), None)
+        return filas
+
+    # ---- backfill por liga/temporada (ver backfill.py) ----
+    def estado_backfill(self, league_id: int, season: int) -> Tuple[int, bool, bool, int]:
+        """(última página ingerida, temporada completa, pendientes vistos, terminados guardados)."""
+        row = self._db.execute(
+            "SELECT page, done, pending, fixtures FROM backfill WHERE league_id = ? AND season = ?",
+            (league_id, season),
+        ).fetchone()
+        return (row[0], bool(row[1]), bool(row[2]), row[3]) if row else (0, False, False, 0)
+
+    def necesita_sync_liga(self, league_id: int, season: int) -> bool:
+        """
+        La liga/temporada no está completa y, pasado sync_ttl, su próximo partido
+        pendiente ya debió terminar (misma regla que necesita_sync por equipo).
+        """
+        row = self._db.execute(
+            "SELECT done, updated_at FROM backfill WHERE league_id = ? AND season = ?", (league_id, season)
+        ).fetchone()
+        if row is None:
+            return True
+        if row[0]:
+            return False
+        now = time.time()
+        edad = now - row[1]
+        if edad <= self.sync_ttl:
+            return False
+        if edad > FIXTURE_SYNC_MAX_AGE:
+            return True
+        _, next_ts, _ = self.estado_liga(league_id, season)
+        return next_ts is None or now >= next_ts + FIXTURE_RESULT_GRACE
+
+    def marcar_backfill(self, league_id: int, season: int, page: int, done: bool, fixtures: int,
+                        pending: bool = False):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO backfill (league_id, season, page, done, fixtures, updated_at, pending) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (league_id, season, page, int(done), fixtures, time.time(), int(pending)),
+            )
+
+    def registrar_backfill(self, league_id: int, season: int, fixtures: List[Dict[str, Any]]) -> int:
+        """
+        Ingesta masiva de una página de /fixtures?league=&season=: guarda los
+        terminados y avanza la marca de agua de la LIGA (tabla league_sync).
+        No toca team_sync; registra los equipos de la página en league_teams:
+        quien solo juega competiciones cargadas se sirve de acá, sin
+        sincronización por equipo (ver league_history.cubrir_ligas).
+        """
+        filas = self.guardar(fixtures, season)
+        equipos = set()
+        for fx in fixtures:
+            for lado in ("home", "away"):
+                t = ((fx.get("teams") or {}).get(lado) or {}).get("id")
+                if t is not None:
+                    equipos.add((league_id, season, t))
+        last_ts = max((f[3] for f in filas), default=None)
+        pendientes = [
+            (fx.get("fixture") or {}).get("timestamp") or 0
+            for fx in fixtures
+            if ((fx.get("fixture") or {}).get("status") or {}).get("short") not in FINISHED_STATES | _NO_RESULT_STATES
+        ]
+        next_ts = min((ts for ts in pendientes if ts), default=None)
+        prev_last, prev_next, _ = self.estado_liga(league_id, season)
+        if prev_last:
+            last_ts = max(prev_last, last_ts or 0)
+        # varias páginas en la misma carga: se queda el pendiente más próximo que no haya pasado
+        if prev_next and prev_next > time.time() - FIXTURE_RESULT_GRACE:
+            next_ts = prev_next if next_ts is None else min(prev_next, next_ts)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO league_sync (league_id, season, last_ts, next_ts, synced_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (league_id, season, last_ts, next_ts, time.time()),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO league_teams (league_id, season, team_id) VALUES (?, ?, ?)", equipos
+            )
+        return len(filas)
+
+    def equipos_liga(self, league_ids, season: int) -> set:
+        """Equipos que aparecen en las cargas por liga de esas ligas/temporada."""
+        ligas = list(league_ids)
+        if not ligas:
+            return set()
+        marcas = ",".join("?" * len(ligas))
+        cur = self._db.execute(
+            f"SELECT DISTINCT team_id FROM league_teams WHERE season = ? AND league_id IN ({marcas})",
+            [season] + ligas,
+        )
+        return {row[0] for row in cur}
+
+    def estado_liga(self, league_id: int, season: int) -> Tuple[Optional[int], Optional[int], Optional[float]]:
+        """(last_ts, next_ts, synced_at) de la liga/temporada, o Nones si nunca se cargó."""
+        row = self._db.execute(
+            "SELECT last_ts, next_ts, synced_at FROM league_sync WHERE league_id = ? AND season = ?",
+            (league_id, season),
+        ).fetchone()
+        return (row[0], row[1], row[2]) if row else (None, None, None)
+
+    # ---- cuotas archivadas (para backtest.py) ----
+    def archivar_odds(self, items: List[Tuple[int, int, Any]]) -> int:
+        """
+        items: (fixture_id, kickoff_ts, FixtureOdds de odds_parser). Guarda la
+        mejor cuota de cada línea O/U y del 1X2; cada captura pisa la anterior,
+        pero solo antes del kickoff, así lo archivado es la última cuota pre-partido.
+        """
+        now = time.time()
+        filas = []
+        for fixture_id, kickoff_ts, odds in items:
+            if odds is None or not kickoff_ts or now >= kickoff_ts:
+                continue
+            for r in odds.totales:
+                for side in ("over", "under"):
+                    if r.get(side):
+                        filas.append((fixture_id, "ou", r["line"], side, r[side], r.get(side + "_book"), now))
+            for side in ("home", "draw", "away"):
+                if odds.x12.get(side):
+                    filas.append((fixture_id, "1x2", 0.0, side, odds.x12[side], odds.x12.get(side + "_book"), now))
+        if filas:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO odds_archive (fixture_id, market, line, side, odd, book, captured_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    filas,
+                )
+        return len(filas)
+
+    def odds_archivadas(self) -> List[Tuple[int, str, float, str, float, Optional[str]]]:
+        """(fixture_id, market, line, side, odd, book) de todo el archivo."""
+        return self._db.execute(
+            "SELECT fixture_id, market, line, side, odd, book FROM odds_archive ORDER BY fixture_id, market, line"
+        ).fetchall()
+
+    def partidos_temporadas(self, seasons: List[int]) -> List[FixtureRow]:
+        """Todos los terminados de esas temporadas (todas las competiciones), por ts."""
+        marcas = ",".join("?" * len(seasons))
+        return self._db.execute(
+            "SELECT fixture_id, league_id, season, ts, status, home_id, away_id, goals_home, goals_away "
+            f"FROM fixtures WHERE season IN ({marcas}) ORDER BY ts",
+            list(seasons),
+        ).fetchall()
+
+    def registrar_sync(self, team_id: int, season: int, fixtures: List[Dict[str, Any]]):
+        """Guarda la respuesta de una sincronización y avanza la marca de agua del equipo."""
+        filas = self.guardar(fixtures, season)
+        last_ts, _, _ = self._estado_sync(team_id, season)
+        propios = [f[3] for f in filas if team_id in (f[5], f[6])]
+        if propios:
+            last_ts = max([last_ts or 0] + propios)
+        pendientes = [
+            (fx.get("fixture") or {}).get("timestamp") or 0
+            for fx in fixtures
+            if ((fx.get("fixture") or {}).get("status") or {}).get("short") not in FINISHED_STATES | _NO_RESULT_STATES
+        ]
+        next_ts = min((ts for ts in pendientes if ts), default=None)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO team_sync (team_id, season, last_ts, synced_at, next_ts) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (team_id, season, last_ts, time.time(), next_ts),
+            )
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Decodificación selectiva de respuestas de /fixtures (team + season).
+
+En vez de r.json() (árbol completo: venue, árbitro, logos, periodos, ...) se
+recorre el texto con json.JSONDecoder.raw_decode: las claves de primer nivel
+se leen tal cual y el arreglo "response" se decodifica elemento por elemento,
+proyectando cada fixture a lo que usa fixture_store (id, timestamp, estado,
+liga, IDs de equipos y goles) y descartando el resto enseguida. En memoria
+queda solo el texto crudo + la lista proyectada.
+"""
+import json
+from typing import Any, Dict, Iterator, Tuple
+
+_DECODER = json.JSONDecoder()
+_WS = " \t\n\r"
+
+
+def _skip_ws(s: str, i: int) -> int:
+    while i < len(s) and s[i] in _WS:
+        i += 1
+    return i
+
+
+def _expect(s: str, i: int, ch: str) -> int:
+    i = _skip_ws(s, i)
+    if i >= len(s) or s[i] != ch:
+        raise ValueError(f"JSON inválido: se esperaba {ch!r} en la posición {i}")
+    return i + 1
+
+
+def proyectar(fx: Dict[str, Any]) -> Dict[str, Any]:
+    """Fixture crudo -> mismo formato pero solo con los campos que se guardan."""
+    fixture = fx.get("fixture") or {}
+    teams = fx.get("teams") or {}
+    goals = fx.get("goals") or {}
+    out = {
+        "fixture": {
+            "id": fixture.get("id"),
+            "timestamp": fixture.get("timestamp"),
+            "status": {"short": (fixture.get("status") or {}).get("short")},
+        },
+        "league": {"id": (fx.get("league") or {}).get("id")},
+        "teams": {
+            "home": {"id": (teams.get("home") or {}).get("id")},
+            "away": {"id": (teams.get("away") or {}).get("id")},
+        },
+        "goals": {"home": goals.get("home"), "away": goals.get("away")},
+    }
+    # el marcador desglosado solo hace falta si 'goals' viene incompleto
+    if not (isinstance(goals.get("home"), int) and isinstance(goals.get("away"), int)):
+        score = fx.get("score") or {}
+        out["score"] = {k: score.get(k) for k in ("fulltime", "extratime", "penalty")}
+    return out
+
+
+def _iter_array(s: str, i: int) -> Iterator[Tuple[Any, int]]:
+    """Elementos de un arreglo JSON que empieza en s[i] ('['); devuelve (elemento, fin)."""
+    i = _expect(s, i, "[")
+    i = _skip_ws(s, i)
+    if i < len(s) and s[i] == "]":
+        yield None, i + 1
+        return
+    while True:
+        obj, i = _DECODER.raw_decode(s, _skip_ws(s, i))
+        i = _skip_ws(s, i)
+        if i < len(s) and s[i] == ",":
+            yield obj, None
+            i += 1
+            continue
+        yield obj, _expect(s, i, "]")
+        return
+
+
+def decode_fixtures(text: str) -> Dict[str, Any]:
+    """
+    Cuerpo de /fixtures con 'response' proyectado (ver proyectar()); el resto de
+    claves de primer nivel (errors, results, paging, ...) se devuelve sin tocar.
+    """
+    body: Dict[str, Any] = {}
+    i = _expect(text, 0, "{")
+    i = _skip_ws(text, i)
+    if i < len(text) and text[i] == "}":
+        return body
+    while True:
+        key, i = _DECODER.raw_decode(text, _skip_ws(text, i))
+        i = _expect(text, i, ":")
+        i = _skip_ws(text, i)
+        if key == "response" and i < len(text) and text[i] == "[":
+            proyectados = []
+            for fx, fin in _iter_array(text, i):
+                if isinstance(fx, dict):
+                    proyectados.append(proyectar(fx))
+                if fin is not None:
+                    i = fin
+            body[key] = proyectados
+        else:
+            body[key], i = _DECODER.raw_decode(text, i)
+        i = _skip_ws(text, i)
+        if i < len(text) and text[i] == ",":
+            i += 1
+            continue
+        _expect(text, i, "}")
+        return body
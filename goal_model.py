@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Modelo de goles Poisson con corrección Dixon-Coles, ajustado por liga.
+
+Ajuste (fit_league): para cada equipo una fuerza de ataque a_i y una de
+defensa d_i (cuánto concede), más la ventaja de local g:
+    goles local  ~ Poisson(g · a_local · d_visita)
+    goles visita ~ Poisson(a_visita · d_local)
+Se estima por máxima verosimilitud ponderada con actualizaciones alternadas
+en forma cerrada (cada una es un np.bincount sobre todos los partidos), con
+peso por antigüedad exp(-xi · días) y un prior que encoge hacia el promedio
+de la liga a los equipos con pocos partidos. rho (Dixon-Coles, marcadores bajos) se elige por
+búsqueda en grilla, también vectorizada.
+
+Scoring (score_matrices): matrices de marcador (F, G+1, G+1) para F partidos
+de una vez; de ahí salen 1X2, Over/Under en cualquier línea y ambos marcan.
+"""
+import math
+import os
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+# Goles máximos por lado en la matriz (lo que queda afuera se renormaliza)
+MODEL_MAX_GOALS = int(os.getenv("MODEL_MAX_GOALS", "10"))
+# Decaimiento por antigüedad: peso 1/2 cada MODEL_HALF_LIFE_DAYS días
+MODEL_HALF_LIFE_DAYS = float(os.getenv("MODEL_HALF_LIFE_DAYS", "180"))
+# Partidos "virtuales" en el promedio de la liga que se suman a cada equipo
+MODEL_PRIOR_MATCHES = float(os.getenv("MODEL_PRIOR_MATCHES", "3"))
+# Mínimo de partidos de un equipo en la liga para usar el modelo con él
+MODEL_MIN_MATCHES = int(os.getenv("MODEL_MIN_MATCHES", "4"))
+
+_RHO_GRID = np.linspace(-0.25, 0.15, 81)
+_LOG_FACT = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, 2 * MODEL_MAX_GOALS + 2)))))
+
+
+class LeagueModel:
+    """Parámetros ajustados de una liga; los equipos se ubican por índice."""
+
+    def __init__(self, team_ids: np.ndarray, attack: np.ndarray, defence: np.ndarray,
+                 matches: np.ndarray, home_adv: float, rho: float):
+        self.team_ids = team_ids
+        self._pos: Dict[int, int] = {int(t): i for i, t in enumerate(team_ids.tolist())}
+        self.attack = attack
+        self.defence = defence
+        self.matches = matches
+        self.home_adv = home_adv
+        self.rho = rho
+
+    def conoce(self, team_id: int) -> bool:
+        i = self._pos.get(int(team_id))
+        return i is not None and self.matches[i] >= MODEL_MIN_MATCHES
+
+    def lambdas(self, home_ids: Sequence[int], away_ids: Sequence[int]):
+        """Goles esperados (local, visita) para pares de equipos; desconocidos = equipo promedio."""
+        ih = np.array([self._pos.get(int(t), -1) for t in home_ids])
+        ia = np.array([self._pos.get(int(t), -1) for t in away_ids])
+        att = np.append(self.attack, 1.0)   # índice -1 -> equipo promedio
+        dfc = np.append(self.defence, self.defence.mean())
+        lam_h = self.home_adv * att[ih] * dfc[ia]
+        lam_a = att[ia] * dfc[ih]
+        return lam_h, lam_a
+
+
+def _pesos_tiempo(ts: np.ndarray, ref_ts: Optional[float]) -> np.ndarray:
+    if not MODEL_HALF_LIFE_DAYS or len(ts) == 0:
+        return np.ones(len(ts))
+    ref = ts.max() if ref_ts is None else ref_ts
+    dias = np.clip((ref - ts) / 86400.0, 0.0, None)
+    return np.exp(-math.log(2) * dias / MODEL_HALF_LIFE_DAYS)
+
+
+def _log_tau(gh, ga, lam_h, lam_a, rho):
+    """log de la corrección Dixon-Coles; rho puede venir como columna (R, 1) para la grilla."""
+    tau = np.ones(np.broadcast(gh, rho).shape)
+    m00 = (gh == 0) & (ga == 0)
+    m01 = (gh == 0) & (ga == 1)
+    m10 = (gh == 1) & (ga == 0)
+    m11 = (gh == 1) & (ga == 1)
+    tau = np.where(m00, 1 - lam_h * lam_a * rho, tau)
+    tau = np.where(m01, 1 + lam_h * rho, tau)
+    tau = np.where(m10, 1 + lam_a * rho, tau)
+    tau = np.where(m11, 1 - rho, tau)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(tau > 0, np.log(np.clip(tau, 1e-12, None)), -np.inf)
+
+
+def fit_league(home_ids: Iterable[int], away_ids: Iterable[int], goals_home: Iterable[int],
+               goals_away: Iterable[int], ts: Optional[Iterable[int]] = None,
+               ref_ts: Optional[float] = None, iters: int = 60) -> Optional[LeagueModel]:
+    """Ajusta la liga con los partidos terminados dados; None si no alcanza (menos de 10)."""
+    home = np.asarray(list(home_ids), dtype=np.int64)
+    away = np.asarray(list(away_ids), dtype=np.int64)
+    gh = np.asarray(list(goals_home), dtype=np.float64)
+    ga = np.asarray(list(goals_away), dtype=np.float64)
+    if len(home) < 10:
+        return None
+    w = _pesos_tiempo(np.asarray(list(ts), dtype=np.float64), ref_ts) if ts is not None else np.ones(len(home))
+
+    team_ids, idx = np.unique(np.concatenate([home, away]), return_inverse=True)
+    ih, ia = idx[: len(home)], idx[len(home):]
+    n = len(team_ids)
+
+    matches = np.bincount(ih, minlength=n) + np.bincount(ia, minlength=n)
+    media = (np.dot(w, gh) + np.dot(w, ga)) / (2 * w.sum())  # goles por equipo y partido
+    p = MODEL_PRIOR_MATCHES
+
+    # goles a favor / en contra ponderados por equipo (no cambian entre iteraciones)
+    gf = np.bincount(ih, w * gh, n) + np.bincount(ia, w * ga, n)
+    gc = np.bincount(ih, w * ga, n) + np.bincount(ia, w * gh, n)
+
+    att = np.ones(n)
+    dfc = np.full(n, media)
+    g = max(np.dot(w, gh) / max(np.dot(w, ga), 1e-9), 1e-3)
+    for _ in range(iters):
+        # ataque: goles hechos / goles esperados con ataque 1; el prior suma p partidos "promedio"
+        exp_f = np.bincount(ih, w * g * dfc[ia], n) + np.bincount(ia, w * dfc[ih], n)
+        e = p * dfc.mean()
+        att = (gf + e) / (exp_f + e)
+        att /= att.mean()
+        # defensa: goles concedidos / exposición (ataque rival), encogida hacia la media de la liga
+        exp_c = np.bincount(ih, w * att[ia], n) + np.bincount(ia, w * g * att[ih], n)
+        dfc = (gc + p * media) / (exp_c + p)
+        g = np.dot(w, gh) / max(np.dot(w, att[ih] * dfc[ia]), 1e-9)
+
+    lam_h = g * att[ih] * dfc[ia]
+    lam_a = att[ia] * dfc[ih]
+    # rho: maximiza sum(w · log tau) sobre la grilla (el resto de la verosimilitud no depende de rho)
+    ll = (_log_tau(gh, ga, lam_h, lam_a, _RHO_GRID[:, None]) * w).sum(axis=1)
+    rho = float(_RHO_GRID[int(np.argmax(ll))])
+    return LeagueModel(team_ids, att, dfc, matches, float(g), rho)
+
+
+# =======================
+# Scoring vectorizado
+# =======================
+def _poisson_pmf(lam: np.ndarray, g: int) -> np.ndarray:
+    """(F,) -> (F, g+1)."""
+    k = np.arange(g + 1)
+    lam = np.clip(lam, 1e-9, None)[:, None]
+    return np.exp(k * np.log(lam) - lam - _LOG_FACT[: g + 1])
+
+
+def score_matrices(lam_h, lam_a, rho, max_goals: int = MODEL_MAX_GOALS) -> np.ndarray:
+    """
+    Matrices de marcador (F, G+1, G+1): M[f, i, j] = P(local i, visita j).
+    rho escalar o por partido (F,). Cada matriz suma 1.
+    """
+    lam_h = np.atleast_1d(np.asarray(lam_h, dtype=np.float64))
+    lam_a = np.atleast_1d(np.asarray(lam_a, dtype=np.float64))
+    rho = np.broadcast_to(np.asarray(rho, dtype=np.float64), lam_h.shape)
+    m = _poisson_pmf(lam_h, max_goals)[:, :, None] * _poisson_pmf(lam_a, max_goals)[:, None, :]
+    m[:, 0, 0] *= 1 - lam_h * lam_a * rho
+    m[:, 0, 1] *= 1 + lam_h * rho
+    m[:, 1, 0] *= 1 + lam_a * rho
+    m[:, 1, 1] *= 1 - rho
+    np.clip(m, 0.0, None, out=m)
+    m /= m.sum(axis=(1, 2), keepdims=True)
+    return m
+
+
+def total_goals(m: np.ndarray) -> np.ndarray:
+    """(F, G+1, G+1) -> (F, 2G+1): P(total = k)."""
+    g = m.shape[1]
+    k = np.add.outer(np.arange(g), np.arange(g)).ravel()
+    out = np.zeros((m.shape[0], 2 * g - 1))
+    np.add.at(out.T, k, m.reshape(m.shape[0], -1).T)
+    return out
+
+
+def probs_1x2(m: np.ndarray) -> np.ndarray:
+    """(F, 3): local, empate, visita."""
+    home = np.tril(m, -1).sum(axis=(1, 2))
+    draw = np.trace(m, axis1=1, axis2=2)
+    return np.stack([home, draw, 1.0 - home - draw], axis=1)
+
+
+def probs_over_under(totales: np.ndarray, lines: Sequence[float]) -> Dict[float, np.ndarray]:
+    """
+    {línea: (F, 3) con P(over), P(under), P(push)} desde la distribución del total.
+    Líneas enteras pueden empatar (push); las .5 no. Las de cuarto (2.25, 2.75)
+    se liquidan mitad en cada línea vecina, como value_bets.evaluar: se promedian
+    las dos mitades (el push es la parte devuelta).
+    """
+    k = np.arange(totales.shape[1])
+
+    def _simple(linea: float) -> np.ndarray:
+        over = totales[:, k > linea].sum(axis=1)
+        under = totales[:, k < linea].sum(axis=1)
+        return np.stack([over, under, 1.0 - over - under], axis=1)
+
+    out = {}
+    for linea in lines:
+        linea = float(linea)
+        if (linea * 4) % 2 == 1:  # .25 / .75
+            out[linea] = (_simple(linea - 0.25) + _simple(linea + 0.25)) / 2
+        else:
+            out[linea] = _simple(linea)
+    return out
+
+
+def prob_btts(m: np.ndarray) -> np.ndarray:
+    """P(ambos marcan) = 1 - P(local 0) - P(visita 0) + P(0-0)."""
+    return 1.0 - m[:, 0, :].sum(axis=1) - m[:, :, 0].sum(axis=1) + m[:, 0, 0]
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación liviana de una corrida (o del bot en marcha).
+
+  - http(): cada intento contra la API, agrupado por endpoint (path + claves de
+    params que lo distinguen): status, reintentos, 429, bytes y latencia.
+  - timed(): decorador para funciones async de análisis (latencia por función).
+  - cache(): aciertos/fallos por cache con nombre.
+  - add_source(): fuentes extra (limitador, single-flight, caches...) que se
+    vuelcan tal cual en el perfil.
+
+Las latencias van a histogramas de cubetas fijas (ms), así el costo por
+evento es O(1) y la memoria no crece con la cantidad de llamadas.
+"""
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+# límites superiores de las cubetas en ms (la última es +inf)
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# params que no cambian el tipo de consulta
+_PARAMS_NEUTROS = {"page", "timezone", "from", "to"}
+
+
+class Histogram:
+    __slots__ = ("counts", "n", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        ms = seconds * 1000.0
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.n += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Cota superior (ms) de la cubeta donde cae el cuantil q."""
+        if not self.n:
+            return None
+        objetivo = q * self.n
+        acum = 0
+        for i, c in enumerate(self.counts):
+            acum += c
+            if acum >= objetivo:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else round(self.max, 1)
+        return round(self.max, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "n": self.n,
+            "mean_ms": round(self.total / self.n, 2) if self.n else None,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max, 2),
+            "buckets_ms": {(f"<={b}" if i < len(BUCKETS_MS) else f">{BUCKETS_MS[-1]}"): c
+                           for i, (b, c) in enumerate(zip(BUCKETS_MS + (None,), self.counts)) if c},
+        }
+
+
+class _Endpoint:
+    __slots__ = ("latency", "status", "retries", "throttled", "errors", "bytes")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.status = Counter()
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self.bytes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"requests": self.latency.n, "status": {str(k): v for k, v in sorted(self.status.items())},
+                "retries": self.retries, "throttled_429": self.throttled, "network_errors": self.errors,
+                "bytes": self.bytes, "latency": self.latency.to_dict()}
+
+
+def endpoint_key(path: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """'/fixtures' + claves relevantes: /fixtures?date, /fixtures?season+team, /odds?fixture..."""
+    claves = sorted(k for k in (params or {}) if k not in _PARAMS_NEUTROS)
+    return path + ("?" + "+".join(claves) if claves else "")
+
+
+class Profiler:
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.endpoints: Dict[str, _Endpoint] = {}
+        self.functions: Dict[str, Histogram] = {}
+        self.caches: Dict[str, Counter] = {}
+        self._sources: Dict[str, Callable[[], Any]] = {}
+
+    # ---- registro ----
+    def http(self, path: str, params, status: Optional[int], seconds: float,
+             nbytes: int = 0, attempt: int = 1):
+        """Un intento HTTP; status=None = error de red."""
+        key = endpoint_key(path, params)
+        ep = self.endpoints.get(key)
+        if ep is None:
+            ep = self.endpoints[key] = _Endpoint()
+        ep.latency.add(seconds)
+        if attempt > 1:
+            ep.retries += 1
+        if status is None:
+            ep.errors += 1
+        else:
+            ep.status[status] += 1
+            if status == 429:
+                ep.throttled += 1
+        ep.bytes += nbytes
+
+    def cache(self, name: str, hit: bool):
+        c = self.caches.get(name)
+        if c is None:
+            c = self.caches[name] = Counter()
+        c["hits" if hit else "misses"] += 1
+
+    def timed(self, name: Optional[str] = None):
+        """Decorador para corutinas: latencia por llamada (también si falla)."""
+        def deco(fn):
+            etiqueta = name or fn.__name__
+            hist = self.functions.setdefault(etiqueta, Histogram())
+
+            @wraps(fn)
+            async def wrapper(*args, **kwargs):
+                t = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    hist.add(time.perf_counter() - t)
+            return wrapper
+        return deco
+
+    def add_source(self, name: str, fn: Callable[[], Any]):
+        self._sources[name] = fn
+
+    # ---- salida ----
+    def snapshot(self) -> Dict[str, Any]:
+        caches = {}
+        for name, c in sorted(self.caches.items()):
+            total = c["hits"] + c["misses"]
+            caches[name] = {"hits": c["hits"], "misses": c["misses"],
+                            "hit_ratio": round(c["hits"] / total, 3) if total else None}
+        totales = Counter()
+        for ep in self.endpoints.values():
+            totales["requests"] += ep.latency.n
+            totales["retries"] += ep.retries
+            totales["throttled_429"] += ep.throttled
+            totales["bytes"] += ep.bytes
+        out = {
+            "started_at": self.started,
+            "elapsed_s": round(time.perf_counter() - self._t0, 3),
+            "http": {"totals": dict(totales),
+                     "endpoints": {k: ep.to_dict() for k, ep in sorted(self.endpoints.items())}},
+            "functions": {k: h.to_dict() for k, h in sorted(self.functions.items()) if h.n},
+            "caches": caches,
+        }
+        for name, fn in self._sources.items():
+            try:
+                out[name] = fn()
+            except Exception as e:  # una fuente rota no debe tumbar el perfil
+                out[name] = {"error": str(e)}
+        return out
+
+    def write_json(self, path: str) -> Dict[str, Any]:
+        snap = self.snapshot()
+        carpeta = os.path.dirname(path)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snap, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+        return snap
+
+    def resumen(self, top: int = 8) -> str:
+        """Texto corto para /stats."""
+        snap = self.snapshot()
+        t = snap["http"]["totals"]
+        lines = [
+            f"⏱️ Activo hace {snap['elapsed_s']:.0f}s",
+            f"🌐 API: {t.get('requests', 0)} peticiones, {t.get('retries', 0)} reintentos, "
+            f"{t.get('throttled_429', 0)} × 429, {t.get('bytes', 0) / 1024:.0f} KB",
+        ]
+        eps = sorted(snap["http"]["endpoints"].items(), key=lambda kv: -kv[1]["requests"])[:top]
+        for k, ep in eps:
+            lat = ep["latency"]
+            lines.append(f"  - {k}: {ep['requests']} req, p50 {lat['p50_ms']} ms, p90 {lat['p90_ms']} ms")
+        if snap["functions"]:
+            lines.append("🧮 Funciones (p50 / p90 ms):")
+            for k, h in sorted(snap["functions"].items(), key=lambda kv: -kv[1]["n"] * (kv[1]["mean_ms"] or 0))[:top]:
+                lines.append(f"  - {k}: {h['n']}× {h['p50_ms']} / {h['p90_ms']}")
+        if snap["caches"]:
+            lines.append("🗃️ Caches (aciertos):")
+            for k, c in snap["caches"].items():
+                ratio = "-" if c["hit_ratio"] is None else f"{100 * c['hit_ratio']:.0f}%"
+                lines.append(f"  - {k}: {ratio} ({c['hits']}/{c['hits'] + c['misses']})")
+        return "\n".join(lines)
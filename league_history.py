@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Historial por liga: una sola /fixtures?league=&season= trae los partidos de
+todos los equipos de esa competición y se ingiere en fixture_store, con marca
+de agua propia por liga (league_sync) y la lista de equipos vistos (league_teams).
+
+La carga por liga es la cobertura del historial: un equipo que aparece en
+alguna competición cargada y cuyos partidos del reporte son todos de
+competiciones cargadas se sirve del store sin su /fixtures?team=&season=.
+Solo los equipos que juegan una competición no cargada (o cuya liga no se pudo
+cargar) siguen con la sincronización por equipo.
+
+Límite: para los equipos cubiertos, "todas las competiciones" son las de
+LEAGUE_HISTORY_IDS; un partido de una copa que no está ahí (p. ej. copa
+nacional fuera de las ligas permitidas) no entra en sus últimos N.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fixture_store import FINISHED_STATES, FixtureStore
+from fixture_stream import decode_fixtures
+
+# Competiciones cuyo historial se carga de una vez (por defecto, las permitidas del reporte:
+# ligas, copas e internacionales)
+LEAGUE_HISTORY_IDS = {
+    int(x) for x in os.getenv("LEAGUE_HISTORY_IDS", "239,241,39,140,71,135,2,3,78,61,34,32").split(",")
+    if x.strip()
+}
+
+# Estados que ya no van a cambiar: si toda la temporada está así, está completa
+_CERRADOS = FINISHED_STATES | {"PST", "CANC", "ABD", "AWD", "WO"}
+
+GetJson = Callable[..., Awaitable[Optional[Dict[str, Any]]]]
+GetPage = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+async def cargar_liga(get_page: GetPage, store: FixtureStore, league_id: int, season: int,
+                      refresh: bool = False) -> Tuple[int, bool, bool]:
+    """
+    Recorre /fixtures?league=&season= (paginado) hacia el store; lo usan
+    sincronizar_liga y backfill.py. Una pasada cortada se reanuda en la página
+    siguiente: el conteo y si ya se vieron partidos por jugar quedan en la fila
+    de 'backfill', así la temporada solo se marca completa si ninguna página de
+    la pasada (desde la 1) tenía pendientes.
+    Devuelve (terminados guardados en la pasada, completa, sin fallos de la API).
+    """
+    pagina, completa, pendientes, guardados = store.estado_backfill(league_id, season)
+    if completa and not refresh:
+        return guardados, True, True
+    if refresh or completa or pagina == 0:
+        # temporada en curso (o --refresh): de nuevo desde la primera página
+        page, pendientes, guardados = 1, False, 0
+    else:
+        page = pagina + 1
+    total, vistos = page, page > 1
+    while page <= total:
+        params: Dict[str, Any] = {"league": league_id, "season": season}
+        if page > 1:
+            params["page"] = page
+        body = await get_page(params)
+        if body is None:
+            return guardados, False, False
+        fixtures = body.get("response") or []
+        vistos = vistos or bool(fixtures)
+        guardados += store.registrar_backfill(league_id, season, fixtures)
+        pendientes = pendientes or any(
+            ((fx.get("fixture") or {}).get("status") or {}).get("short") not in _CERRADOS for fx in fixtures
+        )
+        total = int((body.get("paging") or {}).get("total") or 1)
+        store.marcar_backfill(league_id, season, page, False, guardados, pendientes)
+        page += 1
+    # sin fixtures todavía (temporada sin calendario) tampoco cuenta como completa;
+    # página 0 = la próxima pasada empieza de nuevo (temporada en curso)
+    completa = vistos and not pendientes
+    store.marcar_backfill(league_id, season, total if completa else 0, completa, guardados)
+    return guardados, completa, True
+
+
+async def sincronizar_liga(get_json: GetJson, store: FixtureStore, league_id: int, season: int) -> bool:
+    """
+    Carga la liga/temporada completa si no está fresca en el store.
+    Devuelve False si la API falló.
+    """
+    if not store.necesita_sync_liga(league_id, season):
+        return True
+
+    async def _pagina(params):
+        return await get_json("/fixtures", params=params, decode=decode_fixtures)
+
+    _, _, ok = await cargar_liga(_pagina, store, league_id, season)
+    return ok
+
+
+def ligas_a_cargar(league_ids: Iterable[int]) -> set:
+    return {l for l in league_ids if l in LEAGUE_HISTORY_IDS}
+
+
+async def cubrir_ligas(get_json: GetJson, store: FixtureStore, partidos: Iterable[Tuple[int, int, int]],
+                       season: int, concurrencia: int = 4) -> set:
+    """
+    partidos: (league_id, home_id, away_id) del reporte / del día. Carga sus
+    ligas (las que no estén frescas) y devuelve los equipos cubiertos: vistos en
+    una liga cargada y sin partidos en competiciones no cargadas.
+    """
+    partidos = list(partidos)
+    ligas = sorted(ligas_a_cargar({l for l, _, _ in partidos}))
+    sem = asyncio.Semaphore(concurrencia)
+
+    async def _una(league_id):
+        async with sem:
+            return await sincronizar_liga(get_json, store, league_id, season)
+
+    ok = await asyncio.gather(*[_una(l) for l in ligas])
+    cargadas = {l for l, bien in zip(ligas, ok) if bien}
+    fuera = {t for l, h, a in partidos if l not in cargadas for t in (h, a)}
+    return store.equipos_liga(cargadas, season) - fuera
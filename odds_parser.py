@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Parser de respuestas de /odds en una sola pasada.
+
+Por fixture arma:
+  - LineBook: líneas Over/Under indexadas por valor cuantizado (centésimas),
+    con la mejor cuota de cada lado y la casa que la ofrece. Búsqueda O(1) de
+    una línea exacta y O(log n) de la más cercana (bisect sobre claves ordenadas).
+  - 1X2: mejor cuota de local/empate/visitante y su casa.
+"""
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+_SCALE = 100  # líneas cuantizadas a centésimas: 2.25 -> 225
+
+
+def _q(line: float) -> int:
+    return int(round(line * _SCALE))
+
+
+def _odd(raw) -> Optional[float]:
+    try:
+        return float((raw or "0").replace(",", ".")) if isinstance(raw, str) else float(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+class LineBook:
+    """Líneas O/U de un fixture: {"line", "over", "under", "over_book", "under_book"} por línea."""
+    __slots__ = ("_lines", "_keys")
+
+    def __init__(self):
+        self._lines: Dict[int, Dict[str, Any]] = {}
+        self._keys: List[int] = []
+
+    def add(self, line: float, side: str, odd: float, bookmaker: Optional[str] = None):
+        key = _q(line)
+        reg = self._lines.get(key)
+        if reg is None:
+            reg = self._lines[key] = {"line": key / _SCALE, "over": None, "under": None,
+                                      "over_book": None, "under_book": None}
+        if odd > (reg[side] or 0.0):
+            reg[side] = odd
+            reg[side + "_book"] = bookmaker
+
+    def finalize(self) -> "LineBook":
+        """Descarta líneas sin cuotas y ordena las claves para nearest()."""
+        self._lines = {k: v for k, v in self._lines.items() if v["over"] or v["under"]}
+        self._keys = sorted(self._lines)
+        return self
+
+    def get(self, line: float) -> Optional[Dict[str, Any]]:
+        return self._lines.get(_q(line))
+
+    def nearest(self, x: float) -> Optional[Dict[str, Any]]:
+        if not self._keys:
+            return None
+        i = bisect_left(self._keys, _q(x))
+        cands = self._keys[max(0, i - 1): i + 1]
+        # empate -> la línea más baja, igual que min() sobre la lista ordenada
+        return self._lines[min(cands, key=lambda k: (abs(k - x * _SCALE), k))]
+
+    def as_list(self) -> List[Dict[str, Any]]:
+        return [self._lines[k] for k in self._keys]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self.as_list())
+
+
+def _nuevo_1x2() -> Dict[str, Any]:
+    return {"home": None, "draw": None, "away": None,
+            "home_book": None, "draw_book": None, "away_book": None}
+
+
+_LADO_1X2 = {"home": "home", "1": "home", "local": "home",
+             "draw": "draw", "x": "draw", "empate": "draw",
+             "away": "away", "2": "away", "visitante": "away"}
+
+
+# Ids de apuesta de API-Football. Sin filtro bet= /odds trae todos los mercados
+# ("Goals Over/Under First Half", "Cards Over/Under"...): solo cuentan estos dos.
+_BET_1X2 = 1
+_BET_GOLES = 5
+
+
+class FixtureOdds:
+    __slots__ = ("fixture_id", "totales", "x12")
+
+    def __init__(self, fixture_id: int):
+        self.fixture_id = fixture_id
+        self.totales = LineBook()
+        self.x12 = _nuevo_1x2()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Forma JSON (para guardarla en blob_cache entre corridas)."""
+        return {"fixture_id": self.fixture_id, "totales": self.totales.as_list(), "x12": dict(self.x12)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FixtureOdds":
+        reg = cls(data["fixture_id"])
+        for r in data.get("totales") or []:
+            for side in ("over", "under"):
+                if r.get(side):
+                    reg.totales.add(r["line"], side, r[side], r.get(side + "_book"))
+        reg.totales.finalize()
+        reg.x12.update(data.get("x12") or {})
+        return reg
+
+
+def parse_odds(body: Dict[str, Any], index: Optional[Dict[int, FixtureOdds]] = None) -> Dict[int, FixtureOdds]:
+    """
+    Acumula una página de /odds en index (todas las casas, O/U y 1X2 en la misma
+    pasada). Llamar finalize_index() cuando ya no vengan más páginas.
+    """
+    index = {} if index is None else index
+    for entry in (body.get("response") or []):
+        fx_id = (entry.get("fixture") or {}).get("id")
+        if fx_id is None:
+            continue
+        reg = index.get(fx_id)
+        if reg is None:
+            reg = index[fx_id] = FixtureOdds(fx_id)
+        for book in (entry.get("bookmakers") or []):
+            casa = book.get("name")
+            for bet in (book.get("bets") or []):
+                name = (bet.get("name", "") or "").strip().lower()
+                if bet.get("id") == _BET_GOLES or name == "goals over/under":
+                    for v in (bet.get("values") or []):
+                        val = v.get("value", "") or ""
+                        odd = _odd(v.get("odd", "0"))
+                        try:
+                            linea = float(val.split()[-1])
+                        except (ValueError, IndexError):
+                            continue
+                        if odd is None:
+                            continue
+                        low = val.lower()
+                        if "over" in low:
+                            reg.totales.add(linea, "over", odd, casa)
+                        elif "under" in low:
+                            reg.totales.add(linea, "under", odd, casa)
+                elif bet.get("id") == _BET_1X2 or name in ("match winner", "1x2"):
+                    for v in (bet.get("values") or []):
+                        lado = _LADO_1X2.get((v.get("value", "") or "").lower())
+                        odd = _odd(v.get("odd", "0"))
+                        if lado is None or odd is None:
+                            continue
+                        if odd > (reg.x12[lado] or 0.0):
+                            reg.x12[lado] = odd
+                            reg.x12[lado + "_book"] = casa
+    return index
+
+
+def finalize_index(index: Dict[int, FixtureOdds]) -> Dict[int, FixtureOdds]:
+    for reg in index.values():
+        reg.totales.finalize()
+    return index
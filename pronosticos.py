@@ -4,9 +4,21 @@ import time
 import random
 import asyncio
 import httpx
-from datetime import datetime, timezone
+from datetime import datetime, time as dtime, timedelta, timezone
 import pytz
-
+import numpy as np
+
+from fixture_store import FixtureStore
+from fixture_stream import decode_fixtures
+from team_history import RecencyWeights
+from odds_parser import LineBook, finalize_index, parse_odds
+from rate_limit import QuotaLimiter
+from ttl_cache import NamespacedCache
+from singleflight import SingleFlight, request_key
+from instrumentation import Profiler
+from goal_model import fit_league, prob_btts, probs_1x2, probs_over_under, score_matrices, total_goals
+from value_bets import OU, etiqueta_valor, evaluar, texto_pick
+from league_history import cubrir_ligas
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
 
@@ -18,7 +30,7 @@ API_FOOTBALL_KEY = os.getenv("API_FOOTBALL_KEY", "510811e125a60b7e0caba0690fdd68
 if not BOT_TOKEN or not API_FOOTBALL_KEY:
     raise SystemExit("❌ Faltan variables de entorno BOT_TOKEN y/o API_FOOTBALL_KEY.")
 
-BASE_URL = "https://v3.football.api-sports.io"
+BASE_URL = os.getenv("API_FOOTBALL_BASE_URL", "https://v3.football.api-sports.io")
 BOGOTA_TZ = pytz.timezone("America/Bogota")
 
 # Temporada historial (por defecto 2023)
@@ -27,6 +39,7 @@ SEASON_HIST = int(os.getenv("SEASON_HIST", "2023"))
 # Config de históricos
 LAST_N = 10           # últimos N terminados
 HALF_LIFE = 5         # media-vida para recencia (None para desactivar)
+RECENCY_KERNEL = os.getenv("RECENCY_KERNEL", "exponential")  # exponential | linear | step
 
 # =======================
 # Ligas permitidas (solo estas se muestran en /hoy, /pronostico, etc.)
@@ -44,9 +57,16 @@ ALLOWED_LEAGUE_IDS = {
 def es_liga_permitida(league_id: int) -> bool:
     return league_id in ALLOWED_LEAGUE_IDS
 
-# Concurrencia / rate-limit simple
-RATE_CONCURRENCY = int(os.getenv("RATE_CONCURRENCY", "2"))
+# Concurrencia máxima en vuelo; el ritmo lo marca el limitador según los headers de cupo
+RATE_CONCURRENCY = int(os.getenv("RATE_CONCURRENCY", "4"))
 RATE_SEM = asyncio.Semaphore(RATE_CONCURRENCY)
+RATE_LIMITER = QuotaLimiter()
+
+# Perfil del bot en marcha (ver instrumentation.py): /stats lo resume y lo escribe en BOT_PROFILE_PATH
+BOT_PROFILE_PATH = os.getenv("BOT_PROFILE_PATH", os.path.join(".cache", "bot_profile.json"))
+# Único chat que puede pedir /stats (por defecto el CHAT_ID de run_once); sin ninguno, /stats no responde
+ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID") or os.getenv("CHAT_ID")
+PROFILE = Profiler()
 
 # =======================
 # Cliente HTTP asíncrono
@@ -63,30 +83,27 @@ async_client = httpx.AsyncClient(
 
 async def safe_get_async(path: str, params=None, max_retries=5):
     """
-    GET con control de concurrencia, manejo de 429 y backoff con jitter.
+    GET con control de concurrencia, ritmo por cupo (RATE_LIMITER) y backoff con jitter en 5xx.
     Devuelve httpx.Response o un Response 599 "sintético" con flag ._rate_info['limited']=True.
     """
     params = params or {}
     async with RATE_SEM:
         last_exc = None
         for attempt in range(1, max_retries + 1):
+            if not await RATE_LIMITER.acquire():
+                last_exc = "daily_quota_exhausted"
+                break
+            t = time.perf_counter()
             try:
                 r = await async_client.get(path, params=params)
+                PROFILE.http(path, params, r.status_code, time.perf_counter() - t, len(r.content), attempt)
+                RATE_LIMITER.observe(r.status_code, r.headers)
                 if 200 <= r.status_code < 300:
                     r._rate_info = {"limited": False}
                     return r
 
                 if r.status_code == 429:
-                    reset = r.headers.get("x-ratelimit-reset")
-                    if reset:
-                        try:
-                            wait_s = max(0.0, float(reset) - time.time()) + 0.25
-                        except Exception:
-                            wait_s = 2.0 * attempt
-                    else:
-                        wait_s = 2.0 * attempt
-                    await asyncio.sleep(wait_s)
-                    continue
+                    continue  # el limitador ya quedó bloqueado hasta x-ratelimit-reset
 
                 if 500 <= r.status_code < 600:
                     await asyncio.sleep(1.2 * attempt + random.random() * 0.3)
@@ -96,6 +113,8 @@ async def safe_get_async(path: str, params=None, max_retries=5):
                 return r
 
             except httpx.RequestError as e:
+                PROFILE.http(path, params, None, time.perf_counter() - t, 0, attempt)
+                RATE_LIMITER.release()
                 last_exc = e
                 await asyncio.sleep(0.8 * attempt + random.random() * 0.3)
 
@@ -103,22 +122,63 @@ async def safe_get_async(path: str, params=None, max_retries=5):
         dummy._rate_info = {"limited": True, "error": str(last_exc) if last_exc else "retry_exhausted"}
         return dummy
 
+# GETs idénticos en vuelo comparten llamada y cuerpo JSON (ver singleflight.py)
+API_MEMO_TTL = float(os.getenv("API_MEMO_TTL", "30"))
+_API_FLIGHT = SingleFlight(ttl=API_MEMO_TTL)
+
+async def get_json(path: str, params=None, decode=None):
+    """
+    GET coalescido sobre safe_get_async.
+    Devuelve el cuerpo JSON decodificado (compartido entre llamadores, no mutar)
+    o None si hubo límite/red, status no-2xx o la API reportó errores.
+    decode(texto) reemplaza a r.json() (p. ej. fixture_stream.decode_fixtures).
+    """
+    async def _load():
+        r = await safe_get_async(path, params=params)
+        if getattr(r, "_rate_info", {}).get("limited", False) or not (200 <= r.status_code < 300):
+            return None
+        try:
+            body = (decode(r.text) if decode else r.json()) or {}
+        except Exception:
+            return None
+        if body.get("errors"):
+            return None
+        return body
+    key = request_key(path, params)
+    if decode is not None:  # cuerpo con otra forma: no compartirlo con r.json()
+        key = key + (decode.__name__,)
+    return await _API_FLIGHT.do(key, _load)
+
+# Fixtures terminados persistidos en disco (ver fixture_store.py)
+fixture_store = FixtureStore()
+
 # =======================
-# Cache simple
+# Cache acotado (LRU + TTL por namespace, ver ttl_cache.py)
 # =======================
-_cache = {}  # key -> (value, ts)
-def cache_get(key, ttl=60):
-    data = _cache.get(key)
-    if not data:
-        return None
-    value, ts = data
-    if time.time() - ts <= ttl:
-        return value
-    _cache.pop(key, None)
-    return None
-
-def cache_set(key, value):
-    _cache[key] = (value, time.time())
+CACHE_SWEEP_SECONDS = int(os.getenv("CACHE_SWEEP_SECONDS", "120"))
+_cache = NamespacedCache({
+    # namespace: (ttl segundos, máximo de entradas)
+    # la lista del día casi no cambia y el precalentamiento la refresca con cada pasada de odds
+    "fixtures": (int(os.getenv("CACHE_TTL_FIXTURES", "900")), int(os.getenv("CACHE_MAX_FIXTURES", "64"))),
+    # odds: pasado el TTL se sirven viejas (y se refrescan de fondo) hasta CACHE_STALE_ODDS extra
+    "odds":     (int(os.getenv("CACHE_TTL_ODDS", "60")), int(os.getenv("CACHE_MAX_ODDS", "2000")),
+                 int(os.getenv("CACHE_STALE_ODDS", "1800"))),
+    "history":  (int(os.getenv("CACHE_TTL_HISTORY", "300")), int(os.getenv("CACHE_MAX_HISTORY", "5000"))),
+    # fixture_id -> (league_id, season, fecha) para ubicar su índice de odds
+    "meta":     (int(os.getenv("CACHE_TTL_META", "172800")), int(os.getenv("CACHE_MAX_META", "5000"))),
+    # fixture_id -> registro de analisis_fixture (se revalida contra sus entradas en cada uso)
+    "analysis": (int(os.getenv("CACHE_TTL_ANALYSIS", "1800")), int(os.getenv("CACHE_MAX_ANALYSIS", "2000"))),
+})
+
+def cache_get(ns, key, ttl=None):
+    return _cache.get(ns, key, ttl)
+
+def cache_set(ns, key, value):
+    _cache.set(ns, key, value)
+
+def cache_stats():
+    """Hits/misses/evictions/tamaño por namespace."""
+    return _cache.stats()
 
 # =======================
 # Utilidades
@@ -140,6 +200,9 @@ async def send_blocks(update: Update, bloques: list[str], sep: str = "\n\n", pre
     if current and current != prefix:
         await update.message.reply_text(current + suffix)
 
+def kickoff_ts(p):
+    return int(datetime.fromisoformat(p["fecha_iso"].replace('Z', '+00:00')).timestamp())
+
 def iso_to_bogota_str(iso_str):
     dt = datetime.fromisoformat(iso_str.replace('Z', '+00:00'))
     local_dt = dt.astimezone(BOGOTA_TZ)
@@ -154,19 +217,19 @@ async def fixtures_por_fecha(fecha_iso_yyyy_mm_dd: str):
     Solo ligas en ALLOWED_LEAGUE_IDS.
     """
     cache_key = ("fixtures", fecha_iso_yyyy_mm_dd, tuple(sorted(ALLOWED_LEAGUE_IDS.keys())))
-    cached = cache_get(cache_key)
+    cached = cache_get("fixtures", cache_key)
     if cached is not None:
         return cached
 
-    r = await safe_get_async("/fixtures", params={"date": fecha_iso_yyyy_mm_dd, "timezone": "America/Bogota"})
+    body = await get_json("/fixtures", params={"date": fecha_iso_yyyy_mm_dd, "timezone": "America/Bogota"})
     salida = []
-    if r:
-        body = r.json() or {}
+    if body:
         for fx in body.get("response", []):
             league = fx.get("league", {})
             league_id = league.get("id")
             if league_id is None or not es_liga_permitida(league_id):
                 continue  # filtra por ligas permitidas
+            cache_set("meta", fx["fixture"]["id"], (league_id, league.get("season"), fecha_iso_yyyy_mm_dd))
             salida.append({
                 "fixture_id": fx["fixture"]["id"],
                 "fecha_iso": fx["fixture"]["date"],
@@ -177,91 +240,53 @@ async def fixtures_por_fecha(fecha_iso_yyyy_mm_dd: str):
                 "local_id": fx["teams"]["home"]["id"],
                 "visitante_id": fx["teams"]["away"]["id"],
             })
-    cache_set(cache_key, salida)
+    cache_set("fixtures", cache_key, salida)
     return salida
 
 # =======================
 # Historial temporada 2023 (últimos 10 desde 31/12 hacia atrás)
 # =======================
-_FINISHED_STATES = {"FT", "AET", "PEN"}
+# Equipos cuyo historial sale de las cargas por liga de precalentar (league_history.cubrir_ligas)
+_CUBIERTOS: set = set()
 
-async def _fetch_team_fixtures_season(team_id: int, season: int):
+async def _sync_team_season(team_id: int, season: int) -> bool:
     """
-    Devuelve (rows, limited):
-      - rows: fixtures de la temporada (todas las competiciones)
-      - limited: True si sospechamos límite/red.
-    NO mandamos 'status' ni 'page' (filtramos localmente).
+    Trae a fixture_store solo lo posterior al último terminado guardado
+    (NO mandamos 'status' ni 'page'; solo from/to). Devuelve limited:
+    True si sospechamos límite/red al sincronizar.
     """
-    r = await safe_get_async("/fixtures", params={"team": team_id, "season": season})
-    if not r:
-        return [], True
-    limited = getattr(r, "_rate_info", {}).get("limited", False)
-    try:
-        data = r.json() or {}
-        return (data.get("response", []) or []), limited
-    except Exception:
-        return [], True
-
-def _extract_goals_from_fixture(fx):
-    goals = fx.get("goals") or {}
-    gh, ga = goals.get("home"), goals.get("away")
-    if isinstance(gh, int) and isinstance(ga, int):
-        return gh, ga
-    score = fx.get("score") or {}
-    ft = score.get("fulltime") or {}
-    gh, ga = ft.get("home"), ft.get("away")
-    if isinstance(gh, int) and isinstance(ga, int):
-        return gh, ga
-    et = score.get("extratime") or {}
-    gh, ga = et.get("home"), et.get("away")
-    if isinstance(gh, int) and isinstance(ga, int):
-        return gh, ga
-    pen = score.get("penalty") or {}
-    gh, ga = pen.get("home"), pen.get("away")
-    if isinstance(gh, int) and isinstance(ga, int):
-        return gh, ga
-    return None, None
+    if team_id in _CUBIERTOS or not fixture_store.necesita_sync(team_id, season):
+        return False
+    data = await get_json("/fixtures", params=fixture_store.params_sync(team_id, season),
+                          decode=decode_fixtures)
+    if data is None:
+        return True
+    fixture_store.registrar_sync(team_id, season, data.get("response", []) or [])
+    return False
+
+@PROFILE.timed()
+async def historial_equipo(team_id: int, season: int):
+    """
+    Devuelve (hist, limited):
+      - hist: TeamHistory columnar con los TERMINADOS de la temporada (todas las competiciones)
+      - limited: True si sospechamos límite/red al sincronizar.
+    """
+    limited = await _sync_team_season(team_id, season)
+    return fixture_store.historial(team_id, season), limited
+
+# Pesos por recencia precalculados para todo n <= LAST_N (ver team_history.RecencyWeights)
+_RECENCY_TABLE = RecencyWeights(LAST_N, half_lives=(HALF_LIFE,), kernel=RECENCY_KERNEL)
 
 def _recency_weights(n, half_life=HALF_LIFE):
-    if not half_life:
-        return [1.0]*n
-    import math
-    lam = math.log(2)/half_life
-    w = [math.exp(-lam*i) for i in range(n)]  # i=0: más reciente
-    s = sum(w)
-    return [x/s for x in w]
+    return _RECENCY_TABLE(n, half_life)
 
 def _prom_ponderado(vec):
-    if not vec:
+    if len(vec) == 0:
         return None
     w = _recency_weights(len(vec))
-    return round(sum(v*wi for v, wi in zip(vec, w)), 3)
-
-def _last10_overall_from_year_end(rows, team_id: int, season_year: int, max_j=LAST_N):
-    """
-    Selecciona los ÚLTIMOS 'max_j' partidos TERMINADOS de la temporada,
-    empezando desde el 31/12/<season_year> hacia atrás.
-    Devuelve lista: [(ts, is_home, gf_equipo), ...]
-    """
-    end_ts = int(datetime(season_year, 12, 31, 23, 59, 59, tzinfo=timezone.utc).timestamp())
-    eligibles = []
-    for f in rows:
-        status = ((f.get("fixture") or {}).get("status") or {}).get("short")
-        if status not in _FINISHED_STATES:
-            continue
-        ts = ((f.get("fixture") or {}).get("timestamp")) or 0
-        if not ts or ts > end_ts:
-            continue
-        gh, ga = _extract_goals_from_fixture(f)
-        if gh is None or ga is None:
-            continue
-        is_home = ((f.get("teams") or {}).get("home") or {}).get("id") == team_id
-        gf_equipo = gh if is_home else ga
-        eligibles.append((ts, is_home, gf_equipo))
-
-    eligibles.sort(key=lambda x: x[0], reverse=True)
-    return eligibles[:max_j]
+    return round(float(np.dot(vec, w)), 3)
 
+@PROFILE.timed()
 async def promedios_temporada_por_equipo(team_id: int, season: int):
     """
     Calcula promedios usando SOLO los últimos 10 partidos TERMINADOS
@@ -269,132 +294,76 @@ async def promedios_temporada_por_equipo(team_id: int, season: int):
     Devuelve (prom_gf_en_casa, prom_gf_de_visita, n_usados)
     """
     cache_key = ("hist_last10_from_year_end", team_id, season, LAST_N, HALF_LIFE)
-    cached = cache_get(cache_key, ttl=300)
+    cached = cache_get("history", cache_key)
     if cached is not None:
         return cached
 
-    rows, limited = await _fetch_team_fixtures_season(team_id, season)
-    if limited and not rows:
+    hist, limited = await historial_equipo(team_id, season)
+    if limited and not len(hist):
         result = (None, None, 0)
-        cache_set(cache_key, result)
+        cache_set("history", cache_key, result)
         return result
 
-    last10 = _last10_overall_from_year_end(rows, team_id, season, LAST_N)
-    if not last10:
+    last10 = hist.ultimos(LAST_N)
+    if not len(last10):
         result = (0.0, 0.0, 0)
-        cache_set(cache_key, result)
+        cache_set("history", cache_key, result)
         return result
 
-    gf_home_list = [gf for _, is_home, gf in last10 if is_home]
-    gf_away_list = [gf for _, is_home, gf in last10 if not is_home]
-
-    prom_home = _prom_ponderado(gf_home_list) or 0.0
-    prom_away = _prom_ponderado(gf_away_list) or 0.0
+    prom_home = _prom_ponderado(last10.gf[last10.is_home]) or 0.0
+    prom_away = _prom_ponderado(last10.gf[~last10.is_home]) or 0.0
     n_total = len(last10)
 
     result = (prom_home, prom_away, n_total)
-    cache_set(cache_key, result)
+    cache_set("history", cache_key, result)
     return result
 
-# ---- Promedio GLOBAL (sin separar) y total esperado por promedios ----
-async def promedio_global_gf(team_id: int, season: int, max_j=LAST_N):
-    """
-    Promedio de GF en los últimos 'max_j' partidos TERMINADOS de la temporada,
-    sin separar local/visita (si hay rate-limit devuelve (None,0)).
-    """
-    rows, limited = await _fetch_team_fixtures_season(team_id, season)
-    if limited and not rows:
-        return None, 0
-
-    last10 = _last10_overall_from_year_end(rows, team_id, season, max_j)
-    if not last10:
-        return 0.0, 0
-    goles = [gf for (_, _, gf) in last10]
-    prom = round(sum(goles) / len(goles), 2)
-    return prom, len(goles)
-
-async def total_esperado_por_promedios(local_id, visitante_id, season: int = SEASON_HIST):
-    """
-    Suma de los promedios GLOBALes (últimos N) de cada equipo.
-    """
-    promL, nL = await promedio_global_gf(local_id, season, LAST_N)
-    promV, nV = await promedio_global_gf(visitante_id, season, LAST_N)
-    if promL is None or promV is None:
-        return None
-    if nL == 0 or nV == 0:
-        return None
-    return round(promL + promV, 2)
-
 # =======================
 # Odds
 # =======================
-async def odds_totales_fixture(fixture_id):
-    cache_key = ("odds_totales", fixture_id)
-    cached = cache_get(cache_key, ttl=60)
-    if cached is not None:
-        return cached
-
-    r = await safe_get_async("/odds", params={"fixture": fixture_id, "bet": 5})
-    resultados = []
-    if r:
-        body = r.json() or {}
-        for entry in body.get("response", []):
-            for book in (entry.get("bookmakers") or []):
-                for bet in (book.get("bets") or []):
-                    name = (bet.get("name", "") or "").lower()
-                    if bet.get("id") == 5 or "over/under" in name:
-                        for v in (bet.get("values") or []):
-                            val = v.get("value", "")
-                            odd_str = (v.get("odd", "0") or "0").replace(",", ".")
-                            try:
-                                odd = float(odd_str)
-                                linea = float(val.split()[-1])
-                            except Exception:
-                                continue
-                            reg = next((x for x in resultados if abs(x["line"] - linea) < 1e-9), None)
-                            if not reg:
-                                reg = {"line": linea, "over": None, "under": None}
-                                resultados.append(reg)
-                            low = val.lower()
-                            if "over" in low:
-                                reg["over"] = max(reg["over"] or 0.0, odd)
-                            elif "under" in low:
-                                reg["under"] = max(reg["under"] or 0.0, odd)
-
-    resultados = [x for x in resultados if (x["over"] or x["under"])]
-    resultados.sort(key=lambda d: d["line"])
-    cache_set(cache_key, resultados)
-    return resultados
-
-async def odds_1x2_fixture(fixture_id):
-    cache_key = ("odds_1x2", fixture_id)
-    cached = cache_get(cache_key, ttl=60)
-    if cached is not None:
-        return cached
-
-    best = {"home": None, "draw": None, "away": None}
-    r = await safe_get_async("/odds", params={"fixture": fixture_id, "bet": 1})
-    if r:
-        body = r.json() or {}
-        for entry in (body.get("response") or []):
-            for book in (entry.get("bookmakers") or []):
-                for bet in (book.get("bets") or []):
-                    if bet.get("id") == 1 or (bet.get("name", "") or "").lower().startswith(("match winner","1x2")):
-                        for v in (bet.get("values") or []):
-                            name = (v.get("value","") or "").lower()
-                            odd = float((v.get("odd","0") or "0").replace(",", "."))
-                            if name in ("home","1","local"):
-                                best["home"] = max(best["home"] or 0.0, odd)
-                            elif name in ("draw","x","empate"):
-                                best["draw"] = max(best["draw"] or 0.0, odd)
-                            elif name in ("away","2","visitante"):
-                                best["away"] = max(best["away"] or 0.0, odd)
-    cache_set(cache_key, best)
-    return best
+# Una sola pasada de /odds?league=&season=&date= (paginado) por liga y fecha llena
+# un índice por fixture (ver odds_parser.py); _odds_de_fixture lee de ahí.
+async def _paginar_odds(params) -> dict | None:
+    indice: dict = {}
+    page, total = 1, 1
+    while page <= total:
+        body = await get_json("/odds", params={**params, "page": page} if page > 1 else params)
+        if body is None:
+            return None  # fallo: no pisar lo que haya en cache
+        parse_odds(body, indice)
+        total = int((body.get("paging") or {}).get("total") or 1)
+        page += 1
+    return finalize_index(indice)
+
+async def odds_indice_liga(league_id, season, fecha):
+    """Índice {fixture_id: odds} de una liga en una fecha (stale-while-revalidate)."""
+    cache_key = ("odds_liga", league_id, season, fecha)
+    params = {"league": league_id, "season": season, "date": fecha, "timezone": "America/Bogota"}
+    return await _cache.get_swr("odds", cache_key, lambda: _paginar_odds(params)) or {}
+
+async def refrescar_odds_liga(league_id, season, fecha):
+    """Vuelve a traer el índice ya mismo (sin esperar a que venza) y lo deja en cache."""
+    params = {"league": league_id, "season": season, "date": fecha, "timezone": "America/Bogota"}
+    indice = await _paginar_odds(params)
+    if indice is not None:
+        cache_set("odds", ("odds_liga", league_id, season, fecha), indice)
+
+async def _odds_de_fixture(fixture_id):
+    meta = cache_get("meta", fixture_id)
+    if meta is not None:
+        indice = await odds_indice_liga(*meta)
+    else:
+        # fixture que no pasó por fixtures_por_fecha: una llamada con todos los mercados
+        cache_key = ("odds_fixture", fixture_id)
+        indice = await _cache.get_swr("odds", cache_key, lambda: _paginar_odds({"fixture": fixture_id})) or {}
+    return indice.get(fixture_id)
 
 # =======================
 # Estimación O/U por home/away ponderado (para O/U con cuotas)
 # =======================
+def _en_casa(casa):
+    return f" en {casa}" if casa else ""
+
 def etiqueta_confianza(total, linea, cuota):
     diff = (total - linea) if (total is not None and linea is not None) else 0.0
     if total is None or linea is None or cuota is None:
@@ -407,24 +376,12 @@ def etiqueta_confianza(total, linea, cuota):
         return "🟡 Media"
     return "🟠 Baja"
 
-async def estimar_total_esperado_homeaway(local_id, visitante_id):
-    promL_home, _, nL = await promedios_temporada_por_equipo(local_id, SEASON_HIST)
-    _, promV_away, nV = await promedios_temporada_por_equipo(visitante_id, SEASON_HIST)
-    if promL_home is None or promV_away is None:
-        return None
-    if nL == 0 or nV == 0:
-        return None
-    return round((promL_home + promV_away), 2)
-
-async def elegir_over_under_recomendado(fixture_id, local_id, visitante_id):
-    odds = await odds_totales_fixture(fixture_id)
-    total_est = await estimar_total_esperado_homeaway(local_id, visitante_id)
+def recomendar_over_under(odds: LineBook, total_est):
+    """Línea 2.5 (o la más cercana al total estimado), lado y mejor cuota."""
     if total_est is None or not odds:
         return None
 
-    linea_obj = next((o for o in odds if abs(o["line"] - 2.5) < 1e-6), None)
-    if not linea_obj:
-        linea_obj = min(odds, key=lambda x: abs(x["line"] - total_est))
+    linea_obj = odds.get(2.5) or odds.nearest(total_est)
 
     linea = linea_obj["line"]
     over_q = linea_obj.get("over")
@@ -432,28 +389,274 @@ async def elegir_over_under_recomendado(fixture_id, local_id, visitante_id):
 
     margen = 0.25
     if total_est >= linea + margen and over_q:
-        lado, cuota = f"Over {linea}", over_q
+        lado, cuota, casa = f"Over {linea}", over_q, linea_obj.get("over_book")
     elif total_est <= linea - margen and under_q:
-        lado, cuota = f"Under {linea}", under_q
+        lado, cuota, casa = f"Under {linea}", under_q, linea_obj.get("under_book")
     else:
         if (over_q or 0) >= (under_q or 0):
-            lado, cuota = f"Over {linea}", over_q
+            lado, cuota, casa = f"Over {linea}", over_q, linea_obj.get("over_book")
         else:
-            lado, cuota = f"Under {linea}", under_q
+            lado, cuota, casa = f"Under {linea}", under_q, linea_obj.get("under_book")
 
     return {
         "linea": linea,
         "lado": lado,
         "cuota": cuota,
+        "casa": casa,
         "total_estimado": total_est,
         "confianza": etiqueta_confianza(total_est, linea, cuota),
     }
 
+# =======================
+# Modelo de goles por liga (Poisson / Dixon-Coles, ver goal_model.py)
+# =======================
+# (league_id, season) -> (filas del store con las que se ajustó, LeagueModel | None)
+_MODELOS = {}
+
+def modelo_liga(league_id, season=SEASON_HIST):
+    """Modelo ajustado con los terminados de la liga en fixture_store; se reajusta solo si cambian."""
+    filas = fixture_store.partidos_liga(league_id, season)
+    memo = _MODELOS.get((league_id, season))
+    if memo is not None and memo[0] is filas:
+        PROFILE.cache("model", True)
+        return memo[1]
+    PROFILE.cache("model", False)
+    modelo = fit_league(*zip(*filas)) if filas else None
+    _MODELOS[(league_id, season)] = (filas, modelo)
+    return modelo
+
+def probabilidades_modelo(partidos, libros):
+    """
+    Probabilidades del modelo para varios partidos con UNA pasada de
+    score_matrices: 1X2, ambos marcan, goles esperados y O/U en 2.5 y en cada
+    línea con cuotas (libros: LineBook por partido, o None). Lista paralela a
+    partidos; None donde la liga no tiene modelo o algún equipo tiene pocos partidos.
+    """
+    idx, lam_h, lam_a, rhos = [], [], [], []
+    for i, p in enumerate(partidos):
+        m = modelo_liga(p["liga_id"])
+        if m is None or not (m.conoce(p["local_id"]) and m.conoce(p["visitante_id"])):
+            continue
+        lh, la = m.lambdas([p["local_id"]], [p["visitante_id"]])
+        idx.append(i)
+        lam_h.append(lh[0])
+        lam_a.append(la[0])
+        rhos.append(m.rho)
+    out = [None] * len(partidos)
+    if not idx:
+        return out
+
+    mats = score_matrices(lam_h, lam_a, rhos)
+    x12 = probs_1x2(mats)
+    btts = prob_btts(mats)
+    lineas = sorted({2.5} | {r["line"] for libro in libros if libro for r in libro})
+    tot = total_goals(mats)
+    ou = probs_over_under(tot, lineas)
+    for k, i in enumerate(idx):
+        out[i] = {
+            "lam_h": round(float(lam_h[k]), 2),
+            "lam_a": round(float(lam_a[k]), 2),
+            "total": round(float(lam_h[k] + lam_a[k]), 2),
+            "x12": {"home": float(x12[k, 0]), "draw": float(x12[k, 1]), "away": float(x12[k, 2])},
+            "btts": float(btts[k]),
+            "ou": {l: (float(v[k, 0]), float(v[k, 1]), float(v[k, 2])) for l, v in ou.items()},
+            "totales": tot[k],  # P(total = k), para value_bets
+        }
+    return out
+
+def recomendar_over_under_modelo(odds: LineBook, modelo):
+    """
+    Como recomendar_over_under, pero el lado lo decide P(over) vs P(under) del
+    modelo; la confianza la pone después el EV de la selección (valor_partidos).
+    """
+    if modelo is None or not odds:
+        return None
+    linea_obj = odds.get(2.5) or odds.nearest(modelo["total"])
+    linea = linea_obj["line"]
+    p_over, p_under, _ = modelo["ou"][linea]
+    if (p_over >= p_under and linea_obj.get("over")) or not linea_obj.get("under"):
+        lado, cuota, casa, prob = f"Over {linea}", linea_obj.get("over"), linea_obj.get("over_book"), p_over
+    else:
+        lado, cuota, casa, prob = f"Under {linea}", linea_obj.get("under"), linea_obj.get("under_book"), p_under
+    return {
+        "linea": linea,
+        "lado": lado,
+        "cuota": cuota,
+        "casa": casa,
+        "total_estimado": modelo["total"],
+        "prob": round(prob, 3),
+        "fuente": "modelo",
+        "confianza": "",
+    }
+
+# Picks de valor por partido que se guardan en el registro de análisis
+VALUE_PICKS_POR_PARTIDO = int(os.getenv("VALUE_PICKS_POR_PARTIDO", "2"))
+
+@PROFILE.timed()
+async def valor_partidos(probs, regs, recos):
+    """
+    EV / Kelly de todas las cuotas de los partidos con modelo en una pasada
+    (ver value_bets.py). Devuelve los mejores picks de cada partido y deja en
+    cada recomendación O/U del modelo su EV y la confianza que sale de él.
+    """
+    picks = [[] for _ in probs]
+    con_modelo = [k for k, m in enumerate(probs) if m]
+    if not con_modelo:
+        return picks
+    valor = evaluar(
+        np.stack([probs[k]["totales"] for k in con_modelo]),
+        np.array([[probs[k]["x12"][c] for c in ("home", "draw", "away")] for k in con_modelo]),
+        [regs[k].totales if regs[k] else None for k in con_modelo],
+        [regs[k].x12 if regs[k] else None for k in con_modelo],
+    )
+    for pick in valor.ranking(por_partido=VALUE_PICKS_POR_PARTIDO):
+        picks[con_modelo[pick["fixture"]]].append(pick)
+    for j, k in enumerate(con_modelo):
+        reco = recos[k]
+        if reco and reco.get("fuente") == "modelo":
+            sel = valor.buscar(j, OU, 0 if reco["lado"].startswith("Over") else 1, reco["linea"])
+            reco["ev"] = sel["ev"] if sel else None
+            reco["confianza"] = etiqueta_valor(reco["ev"])
+    return picks
+
+# =======================
+# Análisis materializado por fixture (compartido por /pronostico, /overunder y /1x2)
+# =======================
+def _tendencia(promL_home, promV_away, nL, nV):
+    if not (nL and nV):
+        return "insuficiente"
+    if promL_home > promV_away:
+        return "local"
+    if promL_home < promV_away:
+        return "visitante"
+    return "parejo"
+
+async def _entradas_analisis(p):
+    (hL, _), (hV, _), reg = await asyncio.gather(
+        historial_equipo(p["local_id"], SEASON_HIST),
+        historial_equipo(p["visitante_id"], SEASON_HIST),
+        _odds_de_fixture(p["fixture_id"]),
+    )
+    return (hL.firma(), hV.firma(), SEASON_HIST, LAST_N, HALF_LIFE), reg
+
+@PROFILE.timed()
+async def analisis_partidos(partidos):
+    """
+    Registros con todo lo que muestran los comandos para cada partido:
+    promedios home/away, tendencia, probabilidades del modelo de goles,
+    recomendación O/U, picks de valor y cuotas 1X2. Cada registro se calcula una vez y se
+    reutiliza mientras no cambien sus entradas: el historial de ambos equipos
+    (firma), el índice de odds de su liga y el modelo de la liga (mismo objeto).
+    Las probabilidades de los que hay que recalcular salen de una sola pasada.
+    """
+    entradas = await asyncio.gather(*[_entradas_analisis(p) for p in partidos])
+
+    registros = [None] * len(partidos)
+    nuevos = []
+    for i, (p, (firma, reg)) in enumerate(zip(partidos, entradas)):
+        modelo = modelo_liga(p["liga_id"])
+        cached = cache_get("analysis", p["fixture_id"])
+        if (cached is not None and cached["firma"] == firma and cached["odds"] is reg
+                and cached["modelo_liga"] is modelo):
+            registros[i] = cached
+        else:
+            nuevos.append((i, p, firma, reg, modelo))
+    if not nuevos:
+        return registros
+
+    probs = probabilidades_modelo([n[1] for n in nuevos], [n[3].totales if n[3] else None for n in nuevos])
+    recos = [recomendar_over_under_modelo(n[3].totales if n[3] else LineBook(), prob)
+             for n, prob in zip(nuevos, probs)]
+    picks = await valor_partidos(probs, [n[3] for n in nuevos], recos)
+    # última cuota pre-partido vista, para backtest.py
+    fixture_store.archivar_odds([(n[1]["fixture_id"], kickoff_ts(n[1]), n[3]) for n in nuevos])
+    for (i, p, firma, reg, modelo), prob, reco, valor in zip(nuevos, probs, recos, picks):
+        promL_home, _, nL = await promedios_temporada_por_equipo(p["local_id"], SEASON_HIST)
+        _, promV_away, nV = await promedios_temporada_por_equipo(p["visitante_id"], SEASON_HIST)
+        limitado = promL_home is None or promV_away is None
+        total_est = None if (limitado or not nL or not nV) else round(promL_home + promV_away, 2)
+        totales = reg.totales if reg else LineBook()
+        rec = {
+            "firma": firma,
+            "odds": reg,
+            "modelo_liga": modelo,
+            "promL_home": promL_home,
+            "promV_away": promV_away,
+            "nL": nL,
+            "nV": nV,
+            "limitado": limitado,
+            "tendencia": None if limitado else _tendencia(promL_home, promV_away, nL, nV),
+            "total_estimado": total_est,
+            "modelo": prob,
+            # sin modelo para el partido se cae a la suma de promedios home/away
+            "reco": reco or recomendar_over_under(totales, total_est),
+            "valor": valor,
+            "x12": reg.x12 if reg else {"home": None, "draw": None, "away": None},
+        }
+        if not limitado:  # con límite de API no se guarda: se reintenta en el próximo comando
+            cache_set("analysis", p["fixture_id"], rec)
+        registros[i] = rec
+    return registros
+
+async def analisis_fixture(p):
+    """Registro de un solo partido (ver analisis_partidos)."""
+    return (await analisis_partidos([p]))[0]
+
+_TEXTO_TENDENCIA = {
+    "local": "🔮 Tendencia: **ligera ventaja del local**.",
+    "visitante": "🔮 Tendencia: **ligera ventaja del visitante**.",
+    "parejo": "🔮 Tendencia: **partido parejo**.",
+}
+
+def _pct(x):
+    return f"{100 * x:.0f}%"
+
+def _lineas_reco(reco, etiqueta_linea="Línea O/U usada", etiqueta_reco="Recomendación O/U"):
+    if reco.get("fuente") == "modelo":
+        total = f"🔢 Total esperado (modelo): **{reco['total_estimado']}**"
+        prob = f", prob. {_pct(reco['prob'])}"
+    else:
+        total = f"🔢 Total estimado (home/away): **{reco['total_estimado']}**"
+        prob = ""
+    lineas = [
+        f"🎚️ {etiqueta_linea}: **{reco['linea']}**",
+        total,
+        f"🎯 {etiqueta_reco}: **{reco['lado']}** (mejor cuota {reco['cuota']}{_en_casa(reco.get('casa'))}{prob})",
+    ]
+    if reco.get("confianza"):
+        lineas.append(reco["confianza"])
+    return lineas
+
+def _linea_1x2(o):
+    return f"💰 1X2: 1={o.get('home') or '-'}  X={o.get('draw') or '-'}  2={o.get('away') or '-'}"
+
+def _lineas_valor(picks):
+    return [f"💎 Valor: {texto_pick(pk)}" for pk in picks]
+
+def _mejores_valores(partidos, analisis, top=5):
+    """Bloque con los mejores EV del día entre todos los partidos (o None si no hay)."""
+    todos = sorted(
+        ((pk, p) for p, a in zip(partidos, analisis) for pk in (a.get("valor") or [])),
+        key=lambda x: -x[0]["ev"],
+    )[:top]
+    if not todos:
+        return None
+    lineas = ["🏅 Mejores valores del día (EV del modelo contra la mejor cuota):"]
+    for pk, p in todos:
+        lineas.append(f"  - {p['local_name']} vs {p['visitante_name']}: {texto_pick(pk)}")
+    return "\n".join(lineas)
+
+def _linea_modelo(m):
+    x = m["x12"]
+    return (f"📐 Modelo: 1={_pct(x['home'])}  X={_pct(x['draw'])}  2={_pct(x['away'])} · "
+            f"Ambos marcan {_pct(m['btts'])} · Goles esperados {m['lam_h']}–{m['lam_a']}")
+
 # =======================
 # Comandos del Bot
 # =======================
 MAX_FIXTURES_LIST = 40
 
+@PROFILE.timed()
 async def hoy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     fecha = datetime.now(BOGOTA_TZ).strftime('%Y-%m-%d')
     partidos = await fixtures_por_fecha(fecha)
@@ -466,6 +669,7 @@ async def hoy(update: Update, context: ContextTypes.DEFAULT_TYPE):
         bloques.append(f"🏆 {p['liga']}\n{p['local_name']} vs {p['visitante_name']}  ⏰ {hora_local}")
     await send_blocks(update, bloques)
 
+@PROFILE.timed()
 async def pronostico(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Muestra:
@@ -480,16 +684,9 @@ async def pronostico(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("📭 No hay partidos para hoy en las ligas permitidas.")
         return
 
+    partidos = partidos[:MAX_FIXTURES_LIST]
     mensajes = []
-    for p in partidos[:MAX_FIXTURES_LIST]:
-        promL_home, _, nL = await promedios_temporada_por_equipo(p["local_id"], SEASON_HIST)
-        _, promV_away, nV = await promedios_temporada_por_equipo(p["visitante_id"], SEASON_HIST)
-
-        # Over/Under con cuotas
-        reco = await elegir_over_under_recomendado(p["fixture_id"], p["local_id"], p["visitante_id"])
-        # Cuotas 1X2
-        o = await odds_1x2_fixture(p["fixture_id"])
-
+    for p, a in zip(partidos, await analisis_partidos(partidos)):
         hora_local = iso_to_bogota_str(p["fecha_iso"])
         msg = [
             f"📅 {fecha} ⏰ {hora_local} - 🏆 {p['liga']}",
@@ -497,41 +694,32 @@ async def pronostico(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"📈 Últimos {LAST_N} (Temp {SEASON_HIST}, todas las competiciones):",
         ]
 
-        if promL_home is None or promV_away is None:
+        if a["limitado"]:
             msg.append("⛔ Límite de API/historial (intenta en 1–2 min).")
         else:
-            msg.append(f"  - {p['local_name']} (en casa): {promL_home} GF/partido")
-            msg.append(f"  - {p['visitante_name']} (de visita): {promV_away} GF/partido")
-
-            if nL and nV:
-                if promL_home > promV_away:
-                    msg.append("🔮 Tendencia: **ligera ventaja del local**.")
-                elif promL_home < promV_away:
-                    msg.append("🔮 Tendencia: **ligera ventaja del visitante**.")
-                else:
-                    msg.append("🔮 Tendencia: **partido parejo**.")
-            else:
-                msg.append(f"🔮 Tendencia: datos insuficientes (Temp {SEASON_HIST}).")
+            msg.append(f"  - {p['local_name']} (en casa): {a['promL_home']} GF/partido")
+            msg.append(f"  - {p['visitante_name']} (de visita): {a['promV_away']} GF/partido")
+            msg.append(_TEXTO_TENDENCIA.get(a["tendencia"], f"🔮 Tendencia: datos insuficientes (Temp {SEASON_HIST})."))
+        if a["modelo"]:
+            msg.append(_linea_modelo(a["modelo"]))
 
         # Bloque Over/Under (con cuotas)
+        reco = a["reco"]
         if reco and (reco.get("cuota") is not None):
-            msg.append(f"🎚️ Línea O/U usada: **{reco['linea']}**")
-            msg.append(f"🔢 Total estimado (home/away): **{reco['total_estimado']}**")
-            msg.append(f"🎯 Recomendación O/U: **{reco['lado']}** (mejor cuota {reco['cuota']})")
-            if reco.get("confianza"):
-                msg.append(reco["confianza"])
+            msg.extend(_lineas_reco(reco))
         else:
             # Si no hay cuotas o datos, avisamos sin duplicar el bloque global
             msg.append("ℹ️ O/U: sin cuotas disponibles o datos insuficientes.")
+        msg.extend(_lineas_valor(a.get("valor") or []))
 
         # Bloque 1X2
-        msg.append(f"💰 1X2: 1={o.get('home') or '-'}  X={o.get('draw') or '-'}  2={o.get('away') or '-'}")
+        msg.append(_linea_1x2(a["x12"]))
 
         mensajes.append("\n".join(msg))
-        await asyncio.sleep(0.2)  # micro pausa para evitar 429
 
     await send_blocks(update, mensajes)
 
+@PROFILE.timed()
 async def overunder(update: Update, context: ContextTypes.DEFAULT_TYPE):
     args = context.args
     if args:
@@ -544,9 +732,11 @@ async def overunder(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"📭 No hay partidos programados para {fecha} en las ligas permitidas.")
         return
 
+    partidos = partidos[:12]
+    analisis = await analisis_partidos(partidos)
     mensajes = []
-    for p in partidos[:12]:
-        reco = await elegir_over_under_recomendado(p["fixture_id"], p["local_id"], p["visitante_id"])
+    for p, a in zip(partidos, analisis):
+        reco = a["reco"]
         hora_local = iso_to_bogota_str(p["fecha_iso"])
 
         base = [
@@ -555,24 +745,31 @@ async def overunder(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
 
         if reco and (reco.get("cuota") is not None):
-            base.append(f"🎚️ Línea usada: **{reco['linea']}**")
-            base.append(f"🔢 Total estimado (home/away): **{reco['total_estimado']}**")
-            base.append(f"🎯 Recomendación: **{reco['lado']}** (mejor cuota {reco['cuota']})")
-            if reco.get("confianza"):
-                base.append(reco["confianza"])
+            base.extend(_lineas_reco(reco, "Línea usada", "Recomendación"))
         else:
-            total_est = await estimar_total_esperado_homeaway(p["local_id"], p["visitante_id"])
-            if total_est is not None:
+            total_est = a["total_estimado"]
+            if a["modelo"]:
+                m = a["modelo"]
+                p_over, p_under, _ = m["ou"][2.5]
+                lado_sugerido = "Over 2.5" if p_over >= p_under else "Under 2.5"
+                base.append(f"🔢 Total esperado (modelo): **{m['total']}**")
+                base.append(f"💡 Sugerencia del modelo: **{lado_sugerido}** "
+                            f"({_pct(max(p_over, p_under))}, sin cuotas disponibles)")
+            elif total_est is not None:
                 lado_sugerido = "Over 2.5" if total_est >= 2.5 else "Under 2.5"
                 base.append(f"🔢 Total estimado (home/away): **{total_est}**")
                 base.append(f"💡 Sugerencia por stats: **{lado_sugerido}** (sin cuotas disponibles)")
             else:
                 base.append("ℹ️ Sin datos suficientes / límite de API.")
+        base.extend(_lineas_valor(a.get("valor") or []))
         mensajes.append("\n".join(base))
-        await asyncio.sleep(0.2)
 
+    top = _mejores_valores(partidos, analisis)
+    if top:
+        mensajes.insert(0, top)
     await send_blocks(update, mensajes)
 
+@PROFILE.timed()
 async def unoxtwo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     fecha = datetime.now(BOGOTA_TZ).strftime('%Y-%m-%d')
     partidos = await fixtures_por_fecha(fecha)
@@ -580,19 +777,21 @@ async def unoxtwo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("📭 No hay partidos para hoy en las ligas permitidas.")
         return
 
+    partidos = partidos[:12]
     mensajes = []
-    for p in partidos[:12]:
-        o = await odds_1x2_fixture(p["fixture_id"])
+    for p, a in zip(partidos, await analisis_partidos(partidos)):
         hora_local = iso_to_bogota_str(p["fecha_iso"])
         base = [
             f"📅 {fecha} ⏰ {hora_local} - 🏆 {p['liga']}",
             f"⚽ {p['local_name']} vs {p['visitante_name']}",
-            f"💰 1X2: 1={o['home'] or '-'}  X={o['draw'] or '-'}  2={o['away'] or '-'}",
+            _linea_1x2(a["x12"]),
         ]
+        if a["modelo"]:
+            base.append(_linea_modelo(a["modelo"]))
         mensajes.append("\n".join(base))
-        await asyncio.sleep(0.15)
     await send_blocks(update, mensajes)
 
+@PROFILE.timed()
 async def debugteam(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         await update.message.reply_text("Uso: /debugteam <team_id>")
@@ -603,29 +802,142 @@ async def debugteam(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("El team_id debe ser numérico.")
         return
 
-    rows, limited = await _fetch_team_fixtures_season(team_id, SEASON_HIST)
-    last10 = _last10_overall_from_year_end(rows, team_id, SEASON_HIST, LAST_N)
+    hist, limited = await historial_equipo(team_id, SEASON_HIST)
+    last10 = hist.ultimos(LAST_N)
     lines = [
-        f"📊 Team {team_id} (Temp {SEASON_HIST}): {'LIMITADO' if (limited and not rows) else f'{len(last10)} partidos usados'}",
+        f"📊 Team {team_id} (Temp {SEASON_HIST}): {'LIMITADO' if (limited and not len(hist)) else f'{len(last10)} partidos usados'}",
     ]
-    for ts, is_home, gf in last10:
+    for ts, is_home, gf in zip(last10.ts.tolist(), last10.is_home.tolist(), last10.gf.tolist()):
         dt = datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(BOGOTA_TZ).strftime("%Y-%m-%d")
         cond = "LOCAL" if is_home else "VISITA"
         lines.append(f" - {dt}: {cond} → GF={gf}")
-    if not last10:
+    if not len(last10):
         lines.append("Sin partidos elegibles en la ventana o límite de API.")
     await send_blocks(update, lines, sep="\n")
 
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Resumen del perfil (API, funciones, caches) y volcado JSON en BOT_PROFILE_PATH.
+    Solo para ADMIN_CHAT_ID: el perfil expone uso de la API y parámetros de las llamadas.
+    """
+    chat = update.effective_chat
+    if not ADMIN_CHAT_ID or chat is None or str(chat.id) != ADMIN_CHAT_ID.strip():
+        print(f"⚠️ /stats rechazado para chat {chat.id if chat else '?'}")
+        return
+    PROFILE.write_json(BOT_PROFILE_PATH)
+    await send_blocks(update, PROFILE.resumen().split("\n"), sep="\n")
+
+# =======================
+# Precalentamiento en segundo plano (JobQueue)
+# =======================
+# Pasada diaria (hora Bogotá): fixtures del día, historial de ambos equipos y odds por liga;
+# otra pasada por partido PREFETCH_BEFORE_KICKOFF_MIN antes del inicio, y odds cada PREFETCH_ODDS_EVERY s.
+PREFETCH_DAILY_AT = os.getenv("PREFETCH_DAILY_AT", "00:05")
+PREFETCH_BEFORE_KICKOFF_MIN = int(os.getenv("PREFETCH_BEFORE_KICKOFF_MIN", "45"))
+PREFETCH_ODDS_EVERY = int(os.getenv("PREFETCH_ODDS_EVERY", "900"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+
+async def _acotado(sem: asyncio.Semaphore, coro):
+    async with sem:
+        return await coro
+
+def _hoy_bogota() -> str:
+    return datetime.now(BOGOTA_TZ).strftime('%Y-%m-%d')
+
+def _metas_odds(partidos) -> set:
+    """(league_id, season, fecha) de los índices de odds que cubren esos partidos."""
+    return {m for m in (cache_get("meta", p["fixture_id"]) for p in partidos) if m is not None}
+
+@PROFILE.timed()
+async def precalentar(fecha: str):
+    """
+    Deja en cache los fixtures de la fecha, el historial (por liga y, para los
+    equipos que juegan una competición no cargada, por equipo), las odds por
+    liga y el modelo de goles de cada liga. Las cargas por liga van solo acá:
+    los comandos leen lo que quedó en el store.
+    """
+    partidos = await fixtures_por_fecha(fecha)
+    sem = asyncio.Semaphore(PREFETCH_WORKERS)
+    cubiertos = await cubrir_ligas(get_json, fixture_store,
+                                   [(p["liga_id"], p["local_id"], p["visitante_id"]) for p in partidos],
+                                   SEASON_HIST, PREFETCH_WORKERS)
+    _CUBIERTOS.clear()
+    _CUBIERTOS.update(cubiertos)
+    equipos = {t for p in partidos for t in (p["local_id"], p["visitante_id"])}
+    await asyncio.gather(*[_acotado(sem, historial_equipo(t, SEASON_HIST)) for t in equipos])
+    await asyncio.gather(*[_acotado(sem, odds_indice_liga(*m)) for m in _metas_odds(partidos)])
+    for liga in {p["liga_id"] for p in partidos}:
+        modelo_liga(liga)
+    return partidos
+
+async def _job_diario(context: ContextTypes.DEFAULT_TYPE):
+    partidos = await precalentar(_hoy_bogota())
+    ahora = datetime.now(timezone.utc)
+    for p in partidos:
+        kickoff = datetime.fromisoformat(p["fecha_iso"].replace('Z', '+00:00'))
+        cuando = kickoff - timedelta(minutes=PREFETCH_BEFORE_KICKOFF_MIN)
+        nombre = f"previo-{p['fixture_id']}"
+        if cuando > ahora and not context.job_queue.get_jobs_by_name(nombre):
+            context.job_queue.run_once(_job_previo, when=cuando, data=p, name=nombre)
+
+async def _job_previo(context: ContextTypes.DEFAULT_TYPE):
+    """Antes del kickoff: historial de ambos equipos y odds frescas de su liga."""
+    p = context.job.data
+    await asyncio.gather(historial_equipo(p["local_id"], SEASON_HIST), historial_equipo(p["visitante_id"], SEASON_HIST))
+    meta = cache_get("meta", p["fixture_id"])
+    if meta is not None:
+        await refrescar_odds_liga(*meta)
+
+async def _job_odds(context: ContextTypes.DEFAULT_TYPE):
+    partidos = await fixtures_por_fecha(_hoy_bogota())
+    sem = asyncio.Semaphore(PREFETCH_WORKERS)
+    await asyncio.gather(*[_acotado(sem, refrescar_odds_liga(*m)) for m in _metas_odds(partidos)])
+    # de paso, al archivo de cuotas (sale del cache recién refrescado, sin llamadas extra)
+    regs = await asyncio.gather(*[_odds_de_fixture(p["fixture_id"]) for p in partidos])
+    fixture_store.archivar_odds([(p["fixture_id"], kickoff_ts(p), reg) for p, reg in zip(partidos, regs)])
+
+def programar_precalentamiento(job_queue):
+    h, m = (int(x) for x in PREFETCH_DAILY_AT.split(":"))
+    # tzinfo con offset fijo de Bogotá (un pytz sin localize daría LMT)
+    a_las = BOGOTA_TZ.localize(datetime.combine(datetime.now(BOGOTA_TZ).date(), dtime(h, m))).timetz()
+    job_queue.run_daily(_job_diario, time=a_las, name="precalentar-diario")
+    job_queue.run_once(_job_diario, when=5, name="precalentar-arranque")
+    job_queue.run_repeating(_job_odds, interval=PREFETCH_ODDS_EVERY, first=PREFETCH_ODDS_EVERY, name="refrescar-odds")
+
+PROFILE.add_source("cache", cache_stats)
+PROFILE.add_source("rate_limiter", lambda: {
+    "capacity_per_min": RATE_LIMITER.capacity, "daily_remaining": RATE_LIMITER.daily_remaining,
+    "waited_s": round(RATE_LIMITER.waited_s, 3), "throttled": RATE_LIMITER.throttled,
+})
+PROFILE.add_source("api_singleflight", lambda: {
+    "calls": _API_FLIGHT.calls, "shared": _API_FLIGHT.shared, "memo_hits": _API_FLIGHT.memo_hits,
+})
+
 # =======================
 # Main
 # =======================
+async def _post_init(app):
+    # barrido periódico del cache para que la memoria no crezca con los días
+    app.bot_data["cache_sweeper"] = asyncio.create_task(_cache.sweeper(CACHE_SWEEP_SECONDS))
+    if app.job_queue is not None:
+        programar_precalentamiento(app.job_queue)
+    else:
+        print("⚠️ Sin JobQueue (instala python-telegram-bot[job-queue]): no hay precalentamiento.")
+
+async def _post_shutdown(app):
+    task = app.bot_data.get("cache_sweeper")
+    if task:
+        task.cancel()
+    PROFILE.write_json(BOT_PROFILE_PATH)
+
 if __name__ == '__main__':
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = ApplicationBuilder().token(BOT_TOKEN).post_init(_post_init).post_shutdown(_post_shutdown).build()
     app.add_handler(CommandHandler("hoy", hoy))
     app.add_handler(CommandHandler("pronostico", pronostico))
     app.add_handler(CommandHandler("overunder", overunder))
     app.add_handler(CommandHandler("1x2", unoxtwo))
     app.add_handler(CommandHandler("debugteam", debugteam))
+    app.add_handler(CommandHandler("stats", stats))
     print("🤖 Bot corriendo... Esperando comandos en Telegram.")
     try:
         app.run_polling()
@@ -634,3 +946,4 @@ if __name__ == '__main__':
             asyncio.get_event_loop().run_until_complete(async_client.aclose())
         except Exception:
             pass
+        fixture_store.close()
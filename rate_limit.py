@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Limitador adaptativo para API-Football.
+
+Token bucket por minuto cuya capacidad y tokens se corrigen con los headers de
+cada respuesta, más un registro de los envíos de los últimos 60 s para no pasar
+nunca de la capacidad dentro de una misma ventana:
+  - x-ratelimit-limit / x-ratelimit-remaining                   (por minuto)
+  - x-ratelimit-requests-limit / x-ratelimit-requests-remaining (por día)
+Ante un 429 se bloquea el bucket hasta Retry-After / x-ratelimit-reset.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Mapping, Optional
+
+# Supuesto inicial hasta que la primera respuesta traiga los headers reales
+API_RATE_PER_MIN = int(os.getenv("API_RATE_PER_MIN", "10"))
+# Peticiones diarias que dejamos sin usar (para correr a mano /debugteam, etc.)
+API_DAILY_RESERVE = int(os.getenv("API_DAILY_RESERVE", "0"))
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class QuotaLimiter:
+    def __init__(self, per_minute: int = API_RATE_PER_MIN, daily_reserve: int = API_DAILY_RESERVE):
+        self.capacity = max(1, per_minute)
+        self.tokens = float(self.capacity)
+        self.daily_remaining: Optional[int] = None
+        self.daily_reserve = daily_reserve
+        self.blocked_until = 0.0  # time.monotonic()
+        self.inflight = 0
+        self._sent = deque()  # instantes de envío en la ventana de 60 s
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited_s = 0.0
+        self.throttled = 0  # 429 recibidos
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def _refill(self, now: float):
+        self.tokens = min(float(self.capacity), self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def daily_exhausted(self) -> bool:
+        return self.daily_remaining is not None and self.daily_remaining <= self.daily_reserve
+
+    async def acquire(self) -> bool:
+        """
+        Espera hasta tener un token. Devuelve False (sin esperar) si el cupo
+        diario está agotado: reintentar no serviría de nada hasta mañana.
+        """
+        async with self._lock:
+            while True:
+                if self.daily_exhausted():
+                    return False
+                now = time.monotonic()
+                self._refill(now)
+                while self._sent and now - self._sent[0] >= 60.0:
+                    self._sent.popleft()
+                if self.blocked_until > now:
+                    wait_s = self.blocked_until - now
+                elif len(self._sent) >= self.capacity:
+                    wait_s = 60.0 - (now - self._sent[0])
+                elif self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    self.inflight += 1
+                    self._sent.append(now)
+                    if self.daily_remaining is not None:
+                        self.daily_remaining -= 1
+                    return True
+                else:
+                    wait_s = (1.0 - self.tokens) / self.rate
+                self.waited_s += wait_s
+                await asyncio.sleep(wait_s)
+
+    def release(self):
+        """Para una petición adquirida que terminó sin respuesta (error de red)."""
+        self.inflight = max(0, self.inflight - 1)
+
+    def observe(self, status_code: int, headers: Mapping[str, str]):
+        """Ajusta el bucket con los headers de una respuesta (cualquier status)."""
+        self.release()
+        now = time.monotonic()
+        self._refill(now)
+
+        limit = _as_int(headers.get("x-ratelimit-limit"))
+        if limit and limit > 0:
+            self.capacity = limit
+        remaining = _as_int(headers.get("x-ratelimit-remaining"))
+        if remaining is not None:
+            # el servidor manda; descontamos lo que sigue en vuelo y él aún no contó
+            self.tokens = min(float(self.capacity), float(max(0, remaining - self.inflight)))
+        day_remaining = _as_int(headers.get("x-ratelimit-requests-remaining"))
+        if day_remaining is not None:
+            self.daily_remaining = day_remaining
+
+        if status_code == 429:
+            self.throttled += 1
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, now + self._retry_after(headers))
+
+    def _retry_after(self, headers: Mapping[str, str]) -> float:
+        for name in ("retry-after", "x-ratelimit-reset"):
+            value = headers.get(name)
+            if value is None:
+                continue
+            try:
+                v = float(value)
+            except ValueError:
+                continue
+            if v > 1e9:  # epoch
+                v = v - time.time()
+            return max(0.0, v) + 0.25
+        # sin pista: esperar a que se recargue un token completo
+        return 1.0 / self.rate + 0.25
@@ -1,12 +1,30 @@
 # -*- coding: utf-8 -*-
 import os
+import json
+import time
 import random
+import hashlib
 import asyncio
 import httpx
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 import pytz
 from typing import Tuple, List, Dict, Any
 
+from blob_cache import BlobCache
+from fixture_store import FixtureStore
+from fixture_stream import decode_fixtures
+from team_history import TeamHistory
+from team_stats import agregar, bloque_de_equipo, extraer_metricas
+from rate_limit import QuotaLimiter
+from singleflight import SingleFlight, request_key
+from telegram_out import TelegramSender
+from instrumentation import Profiler
+from league_history import cubrir_ligas
+from odds_parser import FixtureOdds, finalize_index, parse_odds
+from goal_model import fit_league, probs_1x2, score_matrices, total_goals
+from value_bets import evaluar, texto_pick
+from subscriptions import agrupar_por_filtro, cargar_suscripciones, incluye, ligas_pedidas
+
 # =======================
 # Configuración
 # =======================
@@ -16,9 +34,11 @@ CHAT_ID = os.getenv("CHAT_ID")
 if not BOT_TOKEN or not API_FOOTBALL_KEY or not CHAT_ID:
     raise SystemExit("❌ Faltan BOT_TOKEN y/o API_FOOTBALL_KEY y/o CHAT_ID.")
 
-BASE_URL = "https://v3.football.api-sports.io"
+BASE_URL = os.getenv("API_FOOTBALL_BASE_URL", "https://v3.football.api-sports.io")
 BOGOTA_TZ = pytz.timezone("America/Bogota")
-TELEGRAM_API = f"https://api.telegram.org/bot{BOT_TOKEN}"
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+# CHAT_ID admite varios chats separados por coma (mismo reporte a todos)
+CHAT_IDS = [c.strip() for c in CHAT_ID.split(",") if c.strip()]
 
 SEASON_HIST = int(os.getenv("SEASON_HIST", "2025"))
 LAST_N = 10
@@ -29,6 +49,20 @@ HALF_LIFE = 5  # reservado
 SKIP_PAST_TODAY = os.getenv("SKIP_PAST_TODAY", "1") == "1"
 PAST_BUFFER_MIN = int(os.getenv("PAST_BUFFER_MIN", "0"))
 
+# full: reporte completo; delta: solo partidos nuevos o cuyas entradas cambiaron
+# desde el último envío (huellas guardadas en blob_cache)
+RUN_MODE = os.getenv("RUN_MODE", "full")
+REPORT_SNAPSHOT_TTL = int(os.getenv("REPORT_SNAPSHOT_TTL", str(3 * 86400)))
+
+# Picks de valor (modelo de goles contra cuotas, ver value_bets.py): 0 = no pedir /odds
+VALUE_BETS = os.getenv("VALUE_BETS", "1") == "1"
+VALUE_PICKS_POR_PARTIDO = int(os.getenv("VALUE_PICKS_POR_PARTIDO", "2"))
+VALUE_TOP = int(os.getenv("VALUE_TOP", "5"))
+
+# Partidos/equipos procesados a la vez en build_and_send (el límite real de la API
+# lo pone safe_get_async)
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+
 # =======================
 # Ligas permitidas (IDs API-FOOTBALL)
 # =======================
@@ -53,12 +87,45 @@ def es_liga_permitida(league_id: int) -> bool:
 # =======================
 # Estado global (HTTP y rate limit)
 # =======================
-RATE_SEM = asyncio.Semaphore(2)
+# Concurrencia máxima en vuelo; el ritmo lo marca el limitador según los headers de cupo
+RATE_CONCURRENCY = int(os.getenv("RATE_CONCURRENCY", "4"))
+RATE_SEM = asyncio.Semaphore(RATE_CONCURRENCY)
+RATE_LIMITER = QuotaLimiter()
 async_client: httpx.AsyncClient | None = None
 
+# GETs idénticos comparten llamada y cuerpo JSON (ver singleflight.py);
+# el memo dura lo que una corrida normal.
+API_MEMO_TTL = float(os.getenv("API_MEMO_TTL", "900"))
+_API_FLIGHT = SingleFlight(ttl=API_MEMO_TTL)
+
+# Fixtures terminados persistidos en disco (ver fixture_store.py)
+fixture_store = FixtureStore()
+
+# Estadísticas (inmutables) y predicciones (con TTL) por fixture en disco (ver blob_cache.py)
+blob_cache = BlobCache()
+telegram = TelegramSender(BOT_TOKEN, TELEGRAM_API_BASE)
+# Más largo que el hueco entre las dos corridas del día: la delta reutiliza lo de la completa
+PRED_TTL = int(os.getenv("PRED_TTL", "43200"))
+PRED_FRESH_WINDOW = int(os.getenv("PRED_FRESH_WINDOW", "86400"))
+# Partido terminado sin estadísticas: el proveedor rara vez las completa después,
+# así que la respuesta vacía también se guarda (con vencimiento largo)
+STATS_EMPTY_TTL = int(os.getenv("STATS_EMPTY_TTL", str(7 * 86400)))
+# Odds por fixture en blob_cache: en modo delta una liga/fecha solo se vuelve a
+# pedir si tiene partidos sin cuotas guardadas o a menos de ODDS_FRESH_WINDOW del kickoff
+ODDS_TTL = int(os.getenv("ODDS_TTL", "43200"))
+ODDS_FRESH_WINDOW = int(os.getenv("ODDS_FRESH_WINDOW", "10800"))
+# Solo estos estados pueden traer predicciones u odds nuevas (no aplazados, cancelados, en juego)
+_POR_JUGAR = {"NS", "TBD"}
+
+# Perfil de la corrida (ver instrumentation.py); se escribe en RUN_PROFILE_PATH al terminar
+RUN_PROFILE_PATH = os.getenv("RUN_PROFILE_PATH", os.path.join(".cache", "run_profile.json"))
+PROFILE = Profiler()
+
 # Caches simples
 _STATS_CACHE: Dict[int, Any] = {}
 _PRED_CACHE: Dict[int, Any] = {}
+# Agregados de estadísticas por (equipo, temporada, últimos fixtures)
+_TEAM_STATS = SingleFlight(ttl=API_MEMO_TTL)
 
 async def safe_get_async(path: str, params=None, max_retries=5):
     if async_client is None:
@@ -66,18 +133,49 @@ async def safe_get_async(path: str, params=None, max_retries=5):
     params = params or {}
     async with RATE_SEM:
         for attempt in range(1, max_retries + 1):
+            if not await RATE_LIMITER.acquire():
+                return None  # cupo diario agotado
+            t = time.perf_counter()
             try:
                 r = await async_client.get(path, params=params)
+                PROFILE.http(path, params, r.status_code, time.perf_counter() - t, len(r.content), attempt)
+                RATE_LIMITER.observe(r.status_code, r.headers)
                 if 200 <= r.status_code < 300:
                     return r
-                if r.status_code in (429, 500, 502, 503):
+                if r.status_code == 429:
+                    continue  # el limitador ya quedó bloqueado hasta el reset
+                if r.status_code in (500, 502, 503):
                     await asyncio.sleep(1.5 * attempt + random.random())
                     continue
                 return r
             except httpx.RequestError:
+                PROFILE.http(path, params, None, time.perf_counter() - t, 0, attempt)
+                RATE_LIMITER.release()
                 await asyncio.sleep(1.0 * attempt)
         return None
 
+async def get_json(path: str, params=None, decode=None) -> Dict[str, Any] | None:
+    """
+    GET coalescido sobre safe_get_async: devuelve el cuerpo JSON decodificado
+    (compartido entre llamadores, no mutar) o None si falló o la API reportó errores.
+    decode(texto) reemplaza a r.json() (p. ej. fixture_stream.decode_fixtures).
+    """
+    async def _load():
+        r = await safe_get_async(path, params=params)
+        if not r or not (200 <= r.status_code < 300):
+            return None
+        try:
+            body = (decode(r.text) if decode else r.json()) or {}
+        except Exception:
+            return None
+        if body.get("errors"):
+            return None
+        return body
+    key = request_key(path, params)
+    if decode is not None:  # cuerpo con otra forma: no compartirlo con r.json()
+        key = key + (decode.__name__,)
+    return await _API_FLIGHT.do(key, _load)
+
 # =======================
 # Utilidades
 # =======================
@@ -88,23 +186,6 @@ def iso_to_bogota_dt(iso_str: str) -> datetime:
 def iso_to_bogota_str(iso_str: str) -> str:
     return iso_to_bogota_dt(iso_str).strftime("%H:%M")
 
-async def tg_send_text(text: str):
-    max_len = 3800
-    blocks, cur = [], ""
-    for line in text.split("\n"):
-        if len(cur) + len(line) + 1 > max_len:
-            blocks.append(cur)
-            cur = line
-        else:
-            cur = (cur + "\n" + line) if cur else line
-    if cur:
-        blocks.append(cur)
-
-    async with httpx.AsyncClient(timeout=15.0) as c:
-        for b in blocks:
-            await c.post(f"{TELEGRAM_API}/sendMessage", data={"chat_id": CHAT_ID, "text": b})
-            await asyncio.sleep(0.3)
-
 def fechas_consulta() -> List[str]:
     """
     Devuelve siempre las fechas de HOY y MAÑANA en hora de Bogotá (YYYY-MM-DD).
@@ -117,10 +198,10 @@ def fechas_consulta() -> List[str]:
 # Datos de fixtures (día)
 # =======================
 async def fixtures_por_fecha(fecha_iso_yyyy_mm_dd: str):
-    r = await safe_get_async("/fixtures", params={"date": fecha_iso_yyyy_mm_dd, "timezone": "America/Bogota"})
+    body = await get_json("/fixtures", params={"date": fecha_iso_yyyy_mm_dd, "timezone": "America/Bogota"})
     salida = []
-    if r:
-        for fx in (r.json() or {}).get("response", []):
+    if body:
+        for fx in body.get("response", []):
             league = fx.get("league", {})
             league_id = league.get("id")
             if not es_liga_permitida(league_id):
@@ -128,6 +209,9 @@ async def fixtures_por_fecha(fecha_iso_yyyy_mm_dd: str):
             salida.append({
                 "fixture_id": fx["fixture"]["id"],
                 "fecha_iso": fx["fixture"]["date"],
+                "status": ((fx["fixture"].get("status") or {}).get("short") or "NS"),
+                "league_id": league_id,
+                "season": league.get("season"),
                 "liga": ALLOWED_LEAGUE_IDS.get(league_id, league.get("name", "Liga")),
                 "local_name": fx["teams"]["home"]["name"],
                 "visitante_name": fx["teams"]["away"]["name"],
@@ -139,184 +223,123 @@ async def fixtures_por_fecha(fecha_iso_yyyy_mm_dd: str):
 # =======================
 # Historial y promedios (goles y forma)
 # =======================
-_FINISHED_STATES = {"FT", "AET", "PEN"}
-
-async def _fetch_team_fixtures_season(team_id: int, season: int):
-    r = await safe_get_async("/fixtures", params={"team": team_id, "season": season})
-    if not r:
-        return []
-    try:
-        return (r.json() or {}).get("response", [])
-    except Exception:
-        return []
-
-def _extract_goals_from_fixture(fx):
-    goals = fx.get("goals") or {}
-    gh, ga = goals.get("home"), goals.get("away")
-    if isinstance(gh, int) and isinstance(ga, int):
-        return gh, ga
-    return None, None
-
-def _last_from_year_end(rows, team_id: int, season: int, max_j=LAST_N):
-    end_ts = int(datetime(season, 12, 31, 23, 59, 59, tzinfo=timezone.utc).timestamp())
-    eligibles = []
-    for f in rows:
-        status = ((f.get("fixture") or {}).get("status") or {}).get("short")
-        if status not in _FINISHED_STATES:
-            continue
-        ts = ((f.get("fixture") or {}).get("timestamp")) or 0
-        if not ts or ts > end_ts:
-            continue
-        gh, ga = _extract_goals_from_fixture(f)
-        if gh is None or ga is None:
-            continue
-        home_id = ((f.get("teams") or {}).get("home") or {}).get("id")
-        away_id = ((f.get("teams") or {}).get("away") or {}).get("id")
-        if home_id != team_id and away_id != team_id:
-            continue
-        is_home = (home_id == team_id)
-        gf = gh if is_home else ga
-        gc = ga if is_home else gh
-        if gf > gc:
-            res = "W"
-        elif gf == gc:
-            res = "D"
-        else:
-            res = "L"
-        fx_id = ((f.get("fixture") or {}).get("id"))
-        eligibles.append((ts, fx_id, is_home, gf, gc, res))
-    eligibles.sort(key=lambda x: x[0], reverse=True)
-    return eligibles[:max_j]
-
-async def _recent_subset(team_id: int, season: int, want_home: bool) -> List[tuple]:
-    rows = await _fetch_team_fixtures_season(team_id, season)
-    latest = _last_from_year_end(rows, team_id, season, LAST_N * 2)
-    subset = [e for e in latest if e[2] == want_home][:LAST_N]
-    return subset
-
+# Equipos cuyo historial sale de las cargas por liga (ver league_history.cubrir_ligas)
+_CUBIERTOS: set = set()
+
+async def _sync_team_season(team_id: int, season: int):
+    """Trae a fixture_store solo lo posterior al último terminado guardado."""
+    if team_id in _CUBIERTOS:
+        return
+    if fixture_store.necesita_sync(team_id, season):
+        body = await get_json("/fixtures", params=fixture_store.params_sync(team_id, season),
+                              decode=decode_fixtures)
+        if body is not None:
+            fixture_store.registrar_sync(team_id, season, body.get("response", []) or [])
+
+@PROFILE.timed()
+async def historial_equipo(team_id: int, season: int) -> TeamHistory:
+    """Historial columnar del equipo (ver team_history.py), decodificado una vez por corrida."""
+    await _sync_team_season(team_id, season)
+    return fixture_store.historial(team_id, season)
+
+@PROFILE.timed()
 async def promedio_global(team_id: int, season: int) -> Tuple[float, int]:
-    rows = await _fetch_team_fixtures_season(team_id, season)
-    last10 = _last_from_year_end(rows, team_id, season, LAST_N)
-    if not last10:
+    last10 = (await historial_equipo(team_id, season)).ultimos(LAST_N)
+    n = len(last10)
+    if n == 0:
         return 0.0, 0
-    goles = [gf for (_, _, _, gf, _, _) in last10]
-    return round(sum(goles)/len(goles), 2), len(goles)
+    return round(last10.media_gf(), 2), n
 
+@PROFILE.timed()
 async def forma_condicional(team_id: int, season: int, want_home: bool) -> Tuple[int,int,int,float,float,float,int]:
-    subset = await _recent_subset(team_id, season, want_home)
+    latest = (await historial_equipo(team_id, season)).ultimos(LAST_N * 2)
+    subset = latest.condicion(want_home).ultimos(LAST_N)
     n = len(subset)
     if n == 0:
         return 0, 0, 0, 0.0, 0.0, 0.0, 0
-    w = sum(1 for e in subset if e[5] == "W")
-    d = sum(1 for e in subset if e[5] == "D")
-    l = sum(1 for e in subset if e[5] == "L")
-    gf_avg = round(sum(e[3] for e in subset)/n, 2)
-    gc_avg = round(sum(e[4] for e in subset)/n, 2)
+    w, d, l = subset.wdl()
+    gf_avg = round(subset.media_gf(), 2)
+    gc_avg = round(subset.media_gc(), 2)
     win_pct = round(100.0 * w / n, 1)
     return w, d, l, win_pct, gf_avg, gc_avg, n
 
 # =======================
-# Estadísticas por fixture (tarjetas y corners)
+# Estadísticas por fixture (tarjetas, corners, remates, posesión, faltas)
 # =======================
-def _extract_cards_from_statistics_block(block: Dict[str, Any]) -> Tuple[int, int]:
-    yellow = 0
-    red = 0
-    for item in block.get("statistics", []):
-        t = item.get("type")
-        v = item.get("value")
-        if v is None or isinstance(v, str):
-            continue
-        if t == "Yellow Cards":
-            yellow = int(v)
-        elif t == "Red Cards":
-            red = int(v)
-    return yellow, red
-
-def _extract_corners_from_statistics_block(block: Dict[str, Any]) -> int:
-    for item in block.get("statistics", []):
-        t = item.get("type")
-        v = item.get("value")
-        if t == "Corner Kicks" and v is not None and not isinstance(v, str):
-            return int(v)
-    return 0
-
 async def _fetch_fixture_statistics(fixture_id: int):
     if fixture_id in _STATS_CACHE:
+        PROFILE.cache("statistics", True)
         return _STATS_CACHE[fixture_id]
-    r = await safe_get_async("/fixtures/statistics", params={"fixture": fixture_id})
-    data = (r.json() or {}).get("response", []) if r else []
+    data = blob_cache.get("statistics", fixture_id)
+    PROFILE.cache("statistics", data is not None)
+    if data is None:
+        body = await get_json("/fixtures/statistics", params={"fixture": fixture_id})
+        data = (body or {}).get("response", [])
+        if body is not None:
+            # solo se piden para partidos terminados: no cambian más
+            blob_cache.put("statistics", fixture_id, data, ttl=None if data else STATS_EMPTY_TTL)
     _STATS_CACHE[fixture_id] = data
     return data
 
+async def estadisticas_equipo(team_id: int, season: int) -> Dict[str, Any]:
+    """
+    Agregados del equipo sobre sus últimos LAST_N (ver team_stats.py): cada
+    /fixtures/statistics se pide una vez y se recorre una vez para todas las
+    métricas. Llamadas concurrentes para el mismo equipo comparten el cálculo.
+    """
+    fx_ids = (await historial_equipo(team_id, season)).ultimos(LAST_N).fixture_id.tolist()
+
+    async def _calcular():
+        stats_list = await asyncio.gather(*[_fetch_fixture_statistics(fid) for fid in fx_ids])
+        bloques = [bloque_de_equipo(stats, team_id) for stats in stats_list]
+        return agregar([extraer_metricas(b) for b in bloques if b])
+
+    return await _TEAM_STATS.do((team_id, season, tuple(fx_ids)), _calcular)
+
 # =======================
 # Promedios de tarjetas
 # =======================
+@PROFILE.timed()
 async def promedio_tarjetas(team_id: int, season: int) -> Tuple[float, float, float, int]:
-    rows = await _fetch_team_fixtures_season(team_id, season)
-    fx_list = _last_from_year_end(rows, team_id, season, LAST_N)
-    fx_ids = [e[1] for e in fx_list]
-    if not fx_ids:
+    agg = await estadisticas_equipo(team_id, season)
+    if agg["n"] == 0:
         return 0.0, 0.0, 0.0, 0
-    total_y = total_r = count = 0
-    stats_list = await asyncio.gather(*[_fetch_fixture_statistics(fid) for fid in fx_ids])
-    for stats in stats_list:
-        block = None
-        for b in stats or []:
-            team = b.get("team") or {}
-            if team.get("id") == team_id:
-                block = b
-                break
-        if not block:
-            continue
-        y, r = _extract_cards_from_statistics_block(block)
-        total_y += y
-        total_r += r
-        count += 1
-    if count == 0:
-        return 0.0, 0.0, 0.0, 0
-    prom_y = round(total_y / count, 2)
-    prom_r = round(total_r / count, 2)
-    prom_t = round((total_y + total_r) / count, 2)
-    return prom_y, prom_r, prom_t, count
+    return round(agg["yellow"], 2), round(agg["red"], 2), round(agg["cards"], 2), agg["n"]
 
 # =======================
 # Promedios de corners
 # =======================
+@PROFILE.timed()
 async def promedio_corners(team_id: int, season: int) -> Tuple[float, int]:
-    rows = await _fetch_team_fixtures_season(team_id, season)
-    fx_list = _last_from_year_end(rows, team_id, season, LAST_N)
-    fx_ids = [e[1] for e in fx_list]
-    if not fx_ids:
+    agg = await estadisticas_equipo(team_id, season)
+    if agg["n"] == 0:
         return 0.0, 0
-    total_c = count = 0
-    stats_list = await asyncio.gather(*[_fetch_fixture_statistics(fid) for fid in fx_ids])
-    for stats in stats_list:
-        block = None
-        for b in stats or []:
-            team = b.get("team") or {}
-            if team.get("id") == team_id:
-                block = b
-                break
-        if not block:
-            continue
-        total_c += _extract_corners_from_statistics_block(block)
-        count += 1
-    if count == 0:
-        return 0.0, 0
-    return round(total_c / count, 2), count
+    return round(agg["corners"], 2), agg["n"]
 
 # =======================
 # Predicciones API-Football
 # =======================
-async def fetch_predictions(fixture_id: int) -> Dict[str, Any]:
+@PROFILE.timed()
+async def fetch_predictions(fixture_id: int, kickoff_ts: int | None = None, status: str = "NS") -> Dict[str, Any]:
+    """
+    Predicción de la API para el fixture. En disco vale PRED_TTL, o más si el
+    partido todavía está lejos (no se refresca hasta entrar a PRED_FRESH_WINDOW del kickoff).
+    Un partido que ya no está por jugarse (status) no se vuelve a pedir.
+    """
     if fixture_id in _PRED_CACHE:
+        PROFILE.cache("predictions", True)
         return _PRED_CACHE[fixture_id]
-    r = await safe_get_async("/predictions", params={"fixture": fixture_id})
+    data = blob_cache.get("predictions", fixture_id)
+    PROFILE.cache("predictions", data is not None)
+    if data is not None:
+        _PRED_CACHE[fixture_id] = data
+        return data
+    body = await get_json("/predictions", params={"fixture": fixture_id}) if status in _POR_JUGAR else None
     perc_home = perc_draw = perc_away = None
     advice = None
     winner_name = None
-    if r:
-        resp = (r.json() or {}).get("response", [])
+    if body:
+        resp = body.get("response", [])
         if resp:
             item = resp[0]
             percent = None
@@ -340,95 +363,344 @@ async def fetch_predictions(fixture_id: int) -> Dict[str, Any]:
         "home": perc_home, "draw": perc_draw, "away": perc_away,
         "advice": advice, "winner_name": winner_name
     }
+    if body is not None:
+        ttl = PRED_TTL
+        if kickoff_ts:
+            ttl = max(PRED_TTL, kickoff_ts - PRED_FRESH_WINDOW - time.time())
+        blob_cache.put("predictions", fixture_id, data, ttl=ttl)
     _PRED_CACHE[fixture_id] = data
     return data
 
+# =======================
+# Cuotas, modelo de goles y valor
+# =======================
+async def odds_indice_liga(league_id: int, season: int, fecha: str) -> Dict[int, Any]:
+    """Índice {fixture_id: odds} de una liga en una fecha (/odds paginado, ver odds_parser.py)."""
+    params = {"league": league_id, "season": season, "date": fecha, "timezone": "America/Bogota"}
+    indice: Dict[int, Any] = {}
+    page, total = 1, 1
+    while page <= total:
+        body = await get_json("/odds", params={**params, "page": page} if page > 1 else params)
+        if body is None:
+            break
+        parse_odds(body, indice)
+        total = int((body.get("paging") or {}).get("total") or 1)
+        page += 1
+    return finalize_index(indice)
+
+async def indices_odds(metas, partidos) -> Tuple[Dict[tuple, Dict[int, Any]], List[tuple]]:
+    """
+    Índice de odds por (liga, temporada, fecha). En modo delta una liga/fecha
+    sale de blob_cache si todos sus partidos por jugar tienen cuotas guardadas
+    y ninguno está a menos de ODDS_FRESH_WINDOW del kickoff; si no, /odds.
+    Devuelve (índices, metas pedidas a la API).
+    """
+    por_meta: Dict[tuple, List[Dict[str, Any]]] = {}
+    for f, p in partidos:
+        por_meta.setdefault((p["league_id"], p.get("season"), f), []).append(p)
+    ahora = time.time()
+    indices: Dict[tuple, Dict[int, Any]] = {}
+    pedir = []
+    for m in metas:
+        if RUN_MODE == "delta":
+            vivos = [p for p in por_meta.get(m, ()) if p.get("status", "NS") in _POR_JUGAR]
+            guardadas = [blob_cache.get("odds", p["fixture_id"]) for p in vivos]
+            if all(g is not None for g in guardadas) and all(_kickoff_ts(p) - ahora > ODDS_FRESH_WINDOW for p in vivos):
+                PROFILE.cache("odds", True)
+                # {} = la liga no tenía cuotas para ese partido
+                indices[m] = {p["fixture_id"]: FixtureOdds.from_dict(g) for p, g in zip(vivos, guardadas) if g}
+                continue
+            PROFILE.cache("odds", False)
+        pedir.append(m)
+    for m, indice in zip(pedir, await asyncio.gather(*[odds_indice_liga(*m) for m in pedir])):
+        indices[m] = indice
+        for p in por_meta.get(m, ()):
+            reg = indice.get(p["fixture_id"])
+            blob_cache.put("odds", p["fixture_id"], reg.as_dict() if reg else {}, ttl=ODDS_TTL)
+    return indices, pedir
+
+# league_id -> (filas del store con las que se ajustó, LeagueModel | None)
+_MODELOS: Dict[int, Any] = {}
+
+def modelo_liga(league_id: int):
+    """Modelo de goles de la liga (goal_model.py) con sus terminados en fixture_store."""
+    filas = fixture_store.partidos_liga(league_id, SEASON_HIST)
+    memo = _MODELOS.get(league_id)
+    if memo is not None and memo[0] is filas:
+        return memo[1]
+    modelo = fit_league(*zip(*filas)) if filas else None
+    _MODELOS[league_id] = (filas, modelo)
+    return modelo
+
+@PROFILE.timed()
+async def valor_partidos(fechas, por_fecha) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Mejores picks de valor por fixture_id: un índice de odds por liga y fecha
+    (que además queda en el archivo de cuotas), las matrices de marcador de todos los partidos con modelo en una llamada
+    y EV / Kelly de todas sus cuotas en otra (value_bets.evaluar).
+    """
+    metas = sorted({(p["league_id"], p["season"], f) for f in fechas for p in por_fecha[f] if p.get("season")})
+    indices, pedidas = await indices_odds(metas, [(f, p) for f in fechas for p in por_fecha[f]])
+    # última cuota pre-partido de cada fixture (solo las recién pedidas), para backtest.py
+    pedidas = set(pedidas)
+    fixture_store.archivar_odds([
+        (p["fixture_id"], _kickoff_ts(p), indices[(p["league_id"], p.get("season"), f)].get(p["fixture_id"]))
+        for f in fechas for p in por_fecha[f]
+        if (p["league_id"], p.get("season"), f) in pedidas
+    ])
+    partidos, regs, lam_h, lam_a, rhos = [], [], [], [], []
+    vistos = set()
+    for f in fechas:
+        for p in por_fecha[f]:
+            if p["fixture_id"] in vistos:
+                continue
+            reg = indices.get((p["league_id"], p.get("season"), f), {}).get(p["fixture_id"])
+            m = modelo_liga(p["league_id"])
+            if reg is None or m is None or not (m.conoce(p["local_id"]) and m.conoce(p["visitante_id"])):
+                continue
+            vistos.add(p["fixture_id"])
+            lh, la = m.lambdas([p["local_id"]], [p["visitante_id"]])
+            partidos.append(p)
+            regs.append(reg)
+            lam_h.append(lh[0])
+            lam_a.append(la[0])
+            rhos.append(m.rho)
+    picks: Dict[int, List[Dict[str, Any]]] = {}
+    if not partidos:
+        return picks
+    mats = score_matrices(lam_h, lam_a, rhos)
+    valor = evaluar(total_goals(mats), probs_1x2(mats), [r.totales for r in regs], [r.x12 for r in regs])
+    for pick in valor.ranking(por_partido=VALUE_PICKS_POR_PARTIDO):
+        picks.setdefault(partidos[pick["fixture"]]["fixture_id"], []).append(pick)
+    return picks
+
 # =======================
 # Main: construir y enviar mensaje(s)
 # =======================
-async def build_and_send():
-    fechas = fechas_consulta()
-    bloques_totales = []
+async def _acotado(sem: asyncio.Semaphore, coro):
+    async with sem:
+        return await coro
 
-    now_bo = datetime.now(BOGOTA_TZ)
-    cutoff = now_bo + timedelta(minutes=PAST_BUFFER_MIN)
-    hoy_str = now_bo.date().strftime("%Y-%m-%d")
+@PROFILE.timed()
+async def bloque_partido(p: Dict[str, Any], picks=()) -> str:
+    """
+    Calcula el bloque de texto de un partido. Todas las consultas de ambos
+    equipos salen a la vez; safe_get_async/get_json se encargan del límite de la API.
+    """
+    (
+        (promL_gf, nL_gf), (promV_gf, nV_gf),
+        (wL, dL, lL, winL, gfL, gcL, nL_form), (wV, dV, lV, winV, gfV, gcV, nV_form),
+        (promL_y, promL_r, promL_t, nL_cards), (promV_y, promV_r, promV_t, nV_cards),
+        (promL_c, nL_c), (promV_c, nV_c),
+        pred,
+    ) = await asyncio.gather(
+        promedio_global(p["local_id"], SEASON_HIST),
+        promedio_global(p["visitante_id"], SEASON_HIST),
+        forma_condicional(p["local_id"], SEASON_HIST, want_home=True),
+        forma_condicional(p["visitante_id"], SEASON_HIST, want_home=False),
+        promedio_tarjetas(p["local_id"], SEASON_HIST),
+        promedio_tarjetas(p["visitante_id"], SEASON_HIST),
+        promedio_corners(p["local_id"], SEASON_HIST),
+        promedio_corners(p["visitante_id"], SEASON_HIST),
+        fetch_predictions(p["fixture_id"], _kickoff_ts(p), p.get("status", "NS")),
+    )
+    total_estimado = round(promL_gf + promV_gf, 2) if nL_gf and nV_gf else None
+    hora_local = iso_to_bogota_str(p["fecha_iso"])
+
+    msg = [
+        f"⏰ {hora_local} — 🏆 {p['liga']}",
+        f"⚽ {p['local_name']} vs {p['visitante_name']}",
+        f"📊 Goles últimos {LAST_N} (Temp {SEASON_HIST}):",
+        f"  - {p['local_name']}: {promL_gf} GF/partido",
+        f"  - {p['visitante_name']}: {promV_gf} GF/partido",
+        f"📈 Forma condicional últimos {LAST_N}:",
+        f"  - 🏠 {p['local_name']}: {wL}-{dL}-{lL} ({winL}%) | GF {gfL} • GC {gcL}  (n={nL_form})",
+        f"  - 🧳 {p['visitante_name']}: {wV}-{dV}-{lV} ({winV}%) | GF {gfV} • GC {gcV}  (n={nV_form})",
+        f"🟨🟥 Tarjetas (últ {LAST_N}):",
+        f"  - {p['local_name']}: {promL_y} 🟨 | {promL_r} 🟥 | {promL_t} tot.  (n={nL_cards})",
+        f"  - {p['visitante_name']}: {promV_y} 🟨 | {promV_r} 🟥 | {promV_t} tot.  (n={nV_cards})",
+        f"🚩 Corners (últ {LAST_N}):",
+        f"  - {p['local_name']}: {promL_c} (n={nL_c})",
+        f"  - {p['visitante_name']}: {promV_c} (n={nV_c})",
+    ]
+    if total_estimado is not None:
+        lado = "Over 2.5" if total_estimado >= 2.5 else "Under 2.5"
+        msg.append(f"🔢 Total estimado (goles): **{total_estimado}**")
+        msg.append(f"💡 Sugerencia: **{lado}**")
+    for pick in picks:
+        msg.append(f"💎 Valor: {texto_pick(pick)}")
+
+    if any(pred.get(k) for k in ("home","draw","away","advice","winner_name")):
+        line_pct = []
+        if pred.get("home"): line_pct.append(f"Local {pred['home']}")
+        if pred.get("draw"): line_pct.append(f"Empate {pred['draw']}")
+        if pred.get("away"): line_pct.append(f"Visitante {pred['away']}")
+        if line_pct:
+            msg.append("📊 API: " + " | ".join(line_pct))
+        if pred.get("advice"):
+            msg.append(f"🧠 API: {pred['advice']}")
+        elif pred.get("winner_name"):
+            msg.append(f"🧠 Consejo API: Winner → {pred['winner_name']}")
+
+    return "\n".join(msg)
+
+def _kickoff_ts(p: Dict[str, Any]) -> int:
+    return int(iso_to_bogota_dt(p["fecha_iso"]).timestamp())
+
+async def firma_partido(p: Dict[str, Any], picks=()) -> str:
+    """
+    Huella de todo lo que entra al bloque de un partido: kickoff, equipos,
+    historial de ambos (solo cambia si jugaron), predicción de la API y qué
+    picks de valor tiene (solo la selección: un cambio de precio no es novedad).
+    Las estadísticas salen del historial, así que quedan cubiertas por él.
+    """
+    hL, hV, pred = await asyncio.gather(
+        historial_equipo(p["local_id"], SEASON_HIST),
+        historial_equipo(p["visitante_id"], SEASON_HIST),
+        fetch_predictions(p["fixture_id"], _kickoff_ts(p), p.get("status", "NS")),
+    )
+    raw = json.dumps(
+        [p["fecha_iso"], p["liga"], p["local_name"], p["visitante_name"], LAST_N, SEASON_HIST,
+         hL.firma(), hV.firma(), pred, [pk["seleccion"] for pk in picks]],
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _mejores_valores(fechas, por_fecha, picks_por_id, filtro) -> str | None:
+    """Los VALUE_TOP picks de mayor EV entre los partidos del filtro."""
+    partidos = {p["fixture_id"]: p for f in fechas for p in por_fecha[f] if incluye(filtro, p["league_id"])}
+    todos = sorted(
+        ((pk, p) for fid, p in partidos.items() for pk in picks_por_id.get(fid, ())),
+        key=lambda x: -x[0]["ev"],
+    )[:VALUE_TOP]
+    if not todos:
+        return None
+    lineas = ["🏅 Mejores valores (EV del modelo contra la mejor cuota):"]
+    for pk, p in todos:
+        lineas.append(f"  - {p['local_name']} vs {p['visitante_name']}: {texto_pick(pk)}")
+    return "\n".join(lineas)
 
+def componer_reporte(fechas, por_fecha, bloques_por_id, filtro, hoy_str, picks_por_id=None) -> str:
+    """Reporte completo para un filtro de ligas, armado con bloques ya renderizados."""
+    bloques_totales = []
+    top = _mejores_valores(fechas, por_fecha, picks_por_id or {}, filtro)
+    if top:
+        bloques_totales.append(top)
     for fecha in fechas:
-        partidos = await fixtures_por_fecha(fecha)
-
-        # Si es HOY y queremos saltarnos los que ya pasaron (o que están a punto de empezar)
-        if fecha == hoy_str and SKIP_PAST_TODAY:
-            partidos = [p for p in partidos if iso_to_bogota_dt(p["fecha_iso"]) >= cutoff]
-
+        partidos = [p for p in por_fecha[fecha] if incluye(filtro, p["league_id"])]
         if not partidos:
             if fecha == hoy_str and SKIP_PAST_TODAY:
                 bloques_totales.append(f"📭 Para **{fecha}** no quedan partidos por jugar (o entran en {PAST_BUFFER_MIN} min).")
             else:
                 bloques_totales.append(f"📭 No hay partidos para **{fecha}** en las ligas permitidas.")
             continue
-
-        bloques = []
-        for p in partidos:
-            promL_gf, nL_gf = await promedio_global(p["local_id"], SEASON_HIST)
-            promV_gf, nV_gf = await promedio_global(p["visitante_id"], SEASON_HIST)
-            total_estimado = round(promL_gf + promV_gf, 2) if nL_gf and nV_gf else None
-
-            wL, dL, lL, winL, gfL, gcL, nL_form = await forma_condicional(p["local_id"], SEASON_HIST, want_home=True)
-            wV, dV, lV, winV, gfV, gcV, nV_form = await forma_condicional(p["visitante_id"], SEASON_HIST, want_home=False)
-
-            promL_y, promL_r, promL_t, nL_cards = await promedio_tarjetas(p["local_id"], SEASON_HIST)
-            promV_y, promV_r, promV_t, nV_cards = await promedio_tarjetas(p["visitante_id"], SEASON_HIST)
-            promL_c, nL_c = await promedio_corners(p["local_id"], SEASON_HIST)
-            promV_c, nV_c = await promedio_corners(p["visitante_id"], SEASON_HIST)
-
-            pred = await fetch_predictions(p["fixture_id"])
-            hora_local = iso_to_bogota_str(p["fecha_iso"])
-
-            msg = [
-                f"⏰ {hora_local} — 🏆 {p['liga']}",
-                f"⚽ {p['local_name']} vs {p['visitante_name']}",
-                f"📊 Goles últimos {LAST_N} (Temp {SEASON_HIST}):",
-                f"  - {p['local_name']}: {promL_gf} GF/partido",
-                f"  - {p['visitante_name']}: {promV_gf} GF/partido",
-                f"📈 Forma condicional últimos {LAST_N}:",
-                f"  - 🏠 {p['local_name']}: {wL}-{dL}-{lL} ({winL}%) | GF {gfL} • GC {gcL}  (n={nL_form})",
-                f"  - 🧳 {p['visitante_name']}: {wV}-{dV}-{lV} ({winV}%) | GF {gfV} • GC {gcV}  (n={nV_form})",
-                f"🟨🟥 Tarjetas (últ {LAST_N}):",
-                f"  - {p['local_name']}: {promL_y} 🟨 | {promL_r} 🟥 | {promL_t} tot.  (n={nL_cards})",
-                f"  - {p['visitante_name']}: {promV_y} 🟨 | {promV_r} 🟥 | {promV_t} tot.  (n={nV_cards})",
-                f"🚩 Corners (últ {LAST_N}):",
-                f"  - {p['local_name']}: {promL_c} (n={nL_c})",
-                f"  - {p['visitante_name']}: {promV_c} (n={nV_c})",
-            ]
-            if total_estimado is not None:
-                lado = "Over 2.5" if total_estimado >= 2.5 else "Under 2.5"
-                msg.append(f"🔢 Total estimado (goles): **{total_estimado}**")
-                msg.append(f"💡 Sugerencia: **{lado}**")
-
-            if any(pred.get(k) for k in ("home","draw","away","advice","winner_name")):
-                line_pct = []
-                if pred.get("home"): line_pct.append(f"Local {pred['home']}")
-                if pred.get("draw"): line_pct.append(f"Empate {pred['draw']}")
-                if pred.get("away"): line_pct.append(f"Visitante {pred['away']}")
-                if line_pct:
-                    msg.append("📊 API: " + " | ".join(line_pct))
-                if pred.get("advice"):
-                    msg.append(f"🧠 API: {pred['advice']}")
-                elif pred.get("winner_name"):
-                    msg.append(f"🧠 Consejo API: Winner → {pred['winner_name']}")
-
-            bloques.append("\n".join(msg))
-            await asyncio.sleep(0.1)
-
+        bloques = [bloques_por_id[p["fixture_id"]] for p in partidos]
         header = f"📅 **{fecha}**"
         bloques_totales.append(header + "\n" + "\n\n".join(bloques))
 
+    ligas = [n for lid, n in ALLOWED_LEAGUE_IDS.items() if incluye(filtro, lid)]
     header_global = (
         f"🤖 Pronósticos automáticos — Fechas: {', '.join(fechas)}\n"
-        f"(Ligas: {', '.join(ALLOWED_LEAGUE_IDS.values())})"
+        f"(Ligas: {', '.join(ligas)})"
     )
-    await tg_send_text(header_global + "\n\n" + "\n\n".join(bloques_totales))
+    return header_global + "\n\n" + "\n\n".join(bloques_totales)
+
+def componer_actualizacion(fechas, por_fecha, bloques_por_id, filtro, ids_cambiados) -> str | None:
+    """Solo los partidos nuevos o con cambios del filtro; None si no hay ninguno."""
+    bloques_totales, n = [], 0
+    for fecha in fechas:
+        partidos = [p for p in por_fecha[fecha] if p["fixture_id"] in ids_cambiados and incluye(filtro, p["league_id"])]
+        if partidos:
+            n += len(partidos)
+            bloques_totales.append(f"📅 **{fecha}**\n" + "\n\n".join(bloques_por_id[p["fixture_id"]] for p in partidos))
+    if not n:
+        return None
+    return f"🔄 Actualización — {n} partido(s) nuevos o con cambios\n\n" + "\n\n".join(bloques_totales)
+
+async def build_and_send():
+    fechas = fechas_consulta()
+    subs = cargar_suscripciones(CHAT_IDS)
+    grupos = agrupar_por_filtro(subs)
+    pedidas = ligas_pedidas(subs)
+
+    now_bo = datetime.now(BOGOTA_TZ)
+    cutoff = now_bo + timedelta(minutes=PAST_BUFFER_MIN)
+    hoy_str = now_bo.date().strftime("%Y-%m-%d")
+
+    # 1) Fixtures de todas las fechas a la vez (solo ligas que algún chat recibe)
+    por_fecha = dict(zip(fechas, await asyncio.gather(*[fixtures_por_fecha(f) for f in fechas])))
+    for fecha in fechas:
+        partidos = [p for p in por_fecha[fecha] if incluye(pedidas, p["league_id"])]
+        # Si es HOY y queremos saltarnos los que ya pasaron (o que están a punto de empezar)
+        if fecha == hoy_str and SKIP_PAST_TODAY:
+            partidos = [p for p in partidos if iso_to_bogota_dt(p["fecha_iso"]) >= cutoff]
+        por_fecha[fecha] = sorted(partidos, key=lambda p: iso_to_bogota_dt(p["fecha_iso"]))
+
+    # 2) Historial: una /fixtures por liga cubre a sus equipos; por equipo solo los que
+    #    juegan una competición no cargada
+    sem = asyncio.Semaphore(PIPELINE_WORKERS)
+    _CUBIERTOS.update(await cubrir_ligas(
+        get_json, fixture_store,
+        [(p["league_id"], p["local_id"], p["visitante_id"]) for ps in por_fecha.values() for p in ps],
+        SEASON_HIST, PIPELINE_WORKERS,
+    ))
+    equipos = {t for ps in por_fecha.values() for p in ps for t in (p["local_id"], p["visitante_id"])}
+    await asyncio.gather(*[_acotado(sem, historial_equipo(t, SEASON_HIST)) for t in equipos])
+
+    # 3) Cuotas contra el modelo de goles: picks de valor de todos los partidos en una pasada
+    picks_por_id = await valor_partidos(fechas, por_fecha) if VALUE_BETS else {}
+
+    # 4) Huella de entradas por partido; en modo delta solo se recalcula lo que cambió
+    todos = [p for fecha in fechas for p in por_fecha[fecha]]
+    firmas = await asyncio.gather(*[
+        _acotado(sem, firma_partido(p, picks_por_id.get(p["fixture_id"], ()))) for p in todos
+    ])
+    previos = {p["fixture_id"]: blob_cache.get("report", p["fixture_id"]) for p in todos}
+    for snap in previos.values():
+        PROFILE.cache("report", snap is not None)
+    cambiados = [
+        p for p, f in zip(todos, firmas)
+        if not (previos[p["fixture_id"]] and previos[p["fixture_id"]]["firma"] == f)
+    ]
+    a_calcular = cambiados if RUN_MODE == "delta" else todos
+
+    # 5) Cada bloque se calcula una sola vez (acotado); gather conserva el orden por hora
+    textos = await asyncio.gather(*[
+        _acotado(sem, bloque_partido(p, picks_por_id.get(p["fixture_id"], ()))) for p in a_calcular
+    ])
+    bloques_por_id = {fid: snap["bloque"] for fid, snap in previos.items() if snap}
+    bloques_por_id.update({p["fixture_id"]: t for p, t in zip(a_calcular, textos)})
+
+    # 6) Un mensaje por filtro de ligas, enviado a todos sus chats (en paralelo entre chats)
+    envios = []
+    ids_cambiados = {p["fixture_id"] for p in cambiados}
+    for filtro, chats in grupos.items():
+        if RUN_MODE == "delta":
+            texto = componer_actualizacion(fechas, por_fecha, bloques_por_id, filtro, ids_cambiados)
+        else:
+            texto = componer_reporte(fechas, por_fecha, bloques_por_id, filtro, hoy_str, picks_por_id)
+        if texto is not None:
+            envios.append(telegram.broadcast(chats, texto))
+    if not envios:
+        print("Sin cambios desde el último envío; no se manda nada.")
+    await asyncio.gather(*envios)
+    _guardar_snapshots(todos, firmas, bloques_por_id)
+
+def _guardar_snapshots(partidos, firmas, bloques_por_id):
+    for p, f in zip(partidos, firmas):
+        blob_cache.put("report", p["fixture_id"], {"firma": f, "bloque": bloques_por_id[p["fixture_id"]]},
+                       ttl=REPORT_SNAPSHOT_TTL)
+
+PROFILE.add_source("rate_limiter", lambda: {
+    "capacity_per_min": RATE_LIMITER.capacity, "daily_remaining": RATE_LIMITER.daily_remaining,
+    "waited_s": round(RATE_LIMITER.waited_s, 3), "throttled": RATE_LIMITER.throttled,
+})
+PROFILE.add_source("api_singleflight", lambda: {
+    "calls": _API_FLIGHT.calls, "shared": _API_FLIGHT.shared, "memo_hits": _API_FLIGHT.memo_hits,
+})
+PROFILE.add_source("blob_cache", lambda: {"hits": blob_cache.hits, "misses": blob_cache.misses,
+                                          "purged": blob_cache.purged})
+PROFILE.add_source("telegram", telegram.stats)
 
 # =======================
 # Entry point
@@ -441,7 +713,15 @@ async def main():
         timeout=15.0,
     ) as client:
         async_client = client
-        await build_and_send()
+        # .cache viaja entre corridas (actions/cache): que no arrastre lo vencido
+        blob_cache.purge_expired()
+        try:
+            await build_and_send()
+        finally:
+            await telegram.close()
+            PROFILE.write_json(RUN_PROFILE_PATH)
+            fixture_store.close()
+            blob_cache.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Coalescencia de peticiones ("single-flight") + memo de resultados de vida corta.
+
+Peticiones idénticas (mismo path y params) que estén en vuelo comparten una
+sola llamada HTTP y un solo cuerpo JSON decodificado; las repeticiones dentro
+de la ventana de memo se sirven sin tocar la red. El cuerpo compartido NO se
+debe mutar.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def request_key(path: str, params: Optional[Dict[str, Any]] = None) -> Tuple:
+    return (path, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())))
+
+
+class SingleFlight:
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._memo: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.calls = 0       # llamadas reales al loader
+        self.shared = 0      # esperas que se colgaron de una llamada en vuelo
+        self.memo_hits = 0
+
+    def _purge(self, now: float):
+        # TTL fijo => el orden de inserción es también el orden de vencimiento
+        while self._memo:
+            key, (_, ts) = next(iter(self._memo.items()))
+            if now - ts <= self.ttl:
+                break
+            self._memo.popitem(last=False)
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]], memo: Callable[[Any], bool] = None) -> Any:
+        """
+        Ejecuta loader() una sola vez por key en vuelo. Si memo(resultado) es True
+        (por defecto: resultado no None) se guarda durante self.ttl segundos.
+        """
+        now = time.time()
+        self._purge(now)
+        hit = self._memo.get(key)
+        if hit is not None:
+            self.memo_hits += 1
+            return hit[0]
+
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.shared += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        self.calls += 1
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # marcar como recuperada si nadie más esperaba
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        if (memo(result) if memo else result is not None) and self.ttl > 0:
+            self._memo[key] = (result, time.time())
+        fut.set_result(result)
+        return result
+
+    def clear(self):
+        self._memo.clear()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Suscripciones del reporte diario: qué ligas recibe cada chat.
+
+Archivo JSON (SUBSCRIPTIONS_PATH) con chat_id -> lista de IDs de liga, o null
+para todas las ligas permitidas:
+
+    {"5428115279": null, "-1001234567890": [239, 241], "987654": [39, 140, 2]}
+
+Si el archivo no existe, cada chat de CHAT_ID recibe todas las ligas.
+Los chats con el mismo filtro se agrupan: su mensaje se arma una sola vez.
+"""
+import json
+import os
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+SUBSCRIPTIONS_PATH = os.getenv("SUBSCRIPTIONS_PATH", "subscriptions.json")
+
+# None = todas las ligas permitidas
+Filtro = Optional[FrozenSet[int]]
+
+
+def cargar_suscripciones(chat_ids_por_defecto: Iterable[str], path: str = SUBSCRIPTIONS_PATH) -> Dict[str, Filtro]:
+    if not os.path.exists(path):
+        return {str(c): None for c in chat_ids_por_defecto}
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    subs: Dict[str, Filtro] = {}
+    for chat_id, ligas in raw.items():
+        subs[str(chat_id)] = None if ligas is None else frozenset(int(l) for l in ligas)
+    return subs
+
+
+def agrupar_por_filtro(subs: Dict[str, Filtro]) -> Dict[Filtro, List[str]]:
+    grupos: Dict[Filtro, List[str]] = {}
+    for chat_id, filtro in subs.items():
+        grupos.setdefault(filtro, []).append(chat_id)
+    return grupos
+
+
+def ligas_pedidas(subs: Dict[str, Filtro]) -> Filtro:
+    """Unión de los filtros (None si algún chat quiere todas)."""
+    union = set()
+    for filtro in subs.values():
+        if filtro is None:
+            return None
+        union |= filtro
+    return frozenset(union)
+
+
+def incluye(filtro: Filtro, league_id: int) -> bool:
+    return filtro is None or league_id in filtro
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Historial de un equipo en una temporada en forma columnar (arrays NumPy).
+
+Se decodifica una sola vez desde las filas de fixture_store y todas las
+agregaciones (últimos N, W/D/L, promedios GF/GC, medias ponderadas por
+recencia) se hacen vectorizadas sobre las columnas. Los pesos por recencia
+salen de tablas precalculadas (RecencyWeights).
+"""
+import math
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Núcleos de decaimiento; en los tres el peso vale la mitad a 'half_life' partidos de distancia
+KERNELS = ("exponential", "linear", "step")
+
+
+def _kernel(kernel: str, n: int, half_life) -> np.ndarray:
+    i = np.arange(n, dtype=np.float64)  # i=0: más reciente
+    if not half_life:
+        w = np.ones(n)
+    elif kernel == "exponential":
+        w = np.exp(-(math.log(2) / half_life) * i)
+    elif kernel == "linear":
+        w = np.clip(1.0 - i / (2.0 * half_life), 0.0, None)
+    elif kernel == "step":
+        w = np.where(i < half_life, 1.0, 0.5)
+    else:
+        raise ValueError(f"Núcleo de recencia desconocido: {kernel!r} (usa uno de {KERNELS})")
+    total = w.sum()
+    return w / total if total else w
+
+
+class RecencyWeights:
+    """
+    Tabla de pesos normalizados por (n, half_life), armada una vez al arrancar
+    para n = 0..max_n. Pedir un par fuera de la tabla lo calcula y lo agrega.
+    """
+
+    def __init__(self, max_n: int, half_lives: Sequence, kernel: str = "exponential"):
+        if kernel not in KERNELS:
+            raise ValueError(f"Núcleo de recencia desconocido: {kernel!r} (usa uno de {KERNELS})")
+        self.kernel = kernel
+        self._tabla: Dict[Tuple[int, object], np.ndarray] = {}
+        for h in half_lives:
+            for n in range(max_n + 1):
+                self._put(n, h)
+
+    def _put(self, n: int, half_life) -> np.ndarray:
+        w = _kernel(self.kernel, n, half_life)
+        w.setflags(write=False)
+        self._tabla[(n, half_life)] = w
+        return w
+
+    def __call__(self, n: int, half_life) -> np.ndarray:
+        w = self._tabla.get((n, half_life))
+        return w if w is not None else self._put(n, half_life)
+
+
+def fin_de_temporada_ts(season: int) -> int:
+    """31/12/<season> 23:59:59 UTC: ventana 'desde fin de año hacia atrás'."""
+    return int(datetime(season, 12, 31, 23, 59, 59, tzinfo=timezone.utc).timestamp())
+
+
+class TeamHistory:
+    """
+    Partidos terminados de un equipo, ordenados del más reciente al más viejo.
+    Columnas: ts, fixture_id, is_home, gf, gc.
+    """
+    __slots__ = ("team_id", "season", "ts", "fixture_id", "is_home", "gf", "gc")
+
+    def __init__(self, team_id: int, season: int, ts, fixture_id, is_home, gf, gc):
+        self.team_id = team_id
+        self.season = season
+        self.ts = ts
+        self.fixture_id = fixture_id
+        self.is_home = is_home
+        self.gf = gf
+        self.gc = gc
+
+    @classmethod
+    def from_rows(cls, team_id: int, season: int, rows: Iterable[Tuple]) -> "TeamHistory":
+        """
+        rows: (fixture_id, ts, home_id, away_id, goals_home, goals_away) de partidos
+        terminados en los que jugó team_id.
+        """
+        data = np.array(list(rows), dtype=np.int64).reshape(-1, 6)
+        data = data[np.argsort(-data[:, 1], kind="stable")]
+        is_home = data[:, 2] == team_id
+        gh, ga = data[:, 4], data[:, 5]
+        return cls(
+            team_id, season,
+            ts=data[:, 1].copy(),
+            fixture_id=data[:, 0].copy(),
+            is_home=is_home,
+            gf=np.where(is_home, gh, ga).astype(np.int16),
+            gc=np.where(is_home, ga, gh).astype(np.int16),
+        )
+
+    def __len__(self) -> int:
+        return int(self.ts.shape[0])
+
+    def firma(self) -> Tuple[int, int]:
+        """(partidos, ts del más reciente): cambia solo si entró un partido nuevo."""
+        return len(self), int(self.ts[0]) if len(self) else 0
+
+    def _take(self, idx) -> "TeamHistory":
+        return TeamHistory(self.team_id, self.season, self.ts[idx], self.fixture_id[idx],
+                           self.is_home[idx], self.gf[idx], self.gc[idx])
+
+    # ---- selección ----
+    def hasta(self, end_ts: int) -> "TeamHistory":
+        """Solo partidos con ts <= end_ts (las columnas están en orden descendente)."""
+        start = int(np.searchsorted(-self.ts, -end_ts, side="left"))
+        return self._take(slice(start, None))
+
+    def ultimos(self, n: int, end_ts: Optional[int] = None) -> "TeamHistory":
+        """Últimos n terminados hasta end_ts (por defecto, 31/12 de la temporada)."""
+        h = self.hasta(fin_de_temporada_ts(self.season) if end_ts is None else end_ts)
+        return h._take(slice(0, n))
+
+    def condicion(self, home: bool) -> "TeamHistory":
+        """Solo partidos de local (home=True) o de visita (home=False)."""
+        return self._take(self.is_home == home)
+
+    # ---- agregados ----
+    def wdl(self) -> Tuple[int, int, int]:
+        diff = self.gf.astype(np.int32) - self.gc
+        return int((diff > 0).sum()), int((diff == 0).sum()), int((diff < 0).sum())
+
+    def media_gf(self) -> float:
+        return float(self.gf.mean()) if len(self) else 0.0
+
+    def media_gc(self) -> float:
+        return float(self.gc.mean()) if len(self) else 0.0
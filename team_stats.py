@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Agregados por equipo a partir de los bloques de /fixtures/statistics.
+
+Cada bloque se recorre una sola vez y de ahí salen todas las métricas
+(tarjetas, corners, remates, posesión, faltas); los agregados de un equipo
+sobre sus últimos N partidos se arman con esas extracciones.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+# tipo de la API -> métrica
+_METRICAS = {
+    "Yellow Cards": "yellow",
+    "Red Cards": "red",
+    "Corner Kicks": "corners",
+    "Total Shots": "shots",
+    "Shots on Goal": "shots_on",
+    "Ball Possession": "possession",
+    "Fouls": "fouls",
+}
+# ausentes cuentan como 0 (la API omite/anula tarjetas y corners cuando no hubo)
+_CERO_SI_FALTA = ("yellow", "red", "corners")
+
+
+def _numero(v) -> Optional[float]:
+    if v is None:
+        return None
+    if isinstance(v, str):
+        v = v.strip().rstrip("%")
+        try:
+            return float(v)
+        except ValueError:
+            return None
+    return float(v)
+
+
+def extraer_metricas(block: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Una pasada por block['statistics'] -> {métrica: valor o None}."""
+    out: Dict[str, Optional[float]] = {m: None for m in _METRICAS.values()}
+    for item in block.get("statistics", []):
+        m = _METRICAS.get(item.get("type"))
+        if m is None:
+            continue
+        v = item.get("value")
+        # posesión viene como "55%"; el resto, si viene como texto, se ignora (igual que antes)
+        if isinstance(v, str) and m != "possession":
+            continue
+        out[m] = _numero(v)
+    for m in _CERO_SI_FALTA:
+        if out[m] is None:
+            out[m] = 0.0
+    return out
+
+
+def bloque_de_equipo(stats: Iterable[Dict[str, Any]], team_id: int) -> Optional[Dict[str, Any]]:
+    for b in stats or []:
+        if (b.get("team") or {}).get("id") == team_id:
+            return b
+    return None
+
+
+def agregar(por_partido: List[Dict[str, Optional[float]]]) -> Dict[str, Any]:
+    """
+    Promedios por métrica sobre los partidos con bloque del equipo.
+    'n' = partidos usados; 'cards' = amarillas + rojas.
+    """
+    n = len(por_partido)
+    out: Dict[str, Any] = {"n": n}
+    for m in _METRICAS.values():
+        vals = [p[m] for p in por_partido if p[m] is not None]
+        out[m] = (sum(vals) / len(vals)) if vals else None
+    out["cards"] = (out["yellow"] + out["red"]) if n else None
+    return out
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Salida a Telegram (Bot API) con un cliente HTTP persistente.
+
+  - Un worker y una cola por chat: los mensajes de un chat salen en orden y
+    espaciados TELEGRAM_CHAT_INTERVAL; chats distintos salen en paralelo.
+  - Tope global de envíos por segundo (TELEGRAM_GLOBAL_RATE) compartido por todos.
+  - 429 (flood control): se espera parameters.retry_after y se reintenta;
+    mientras tanto ese chat queda frenado sin bloquear a los demás.
+  - pack_text() arma mensajes lo más cerca posible de 4096 unidades UTF-16
+    (lo que mide Telegram: cada emoji fuera del BMP cuenta doble).
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+TELEGRAM_MAX_LEN = 4096
+# Telegram: ~1 mensaje/s por chat y ~30 mensajes/s en total por bot
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+
+
+def _u16(s: str) -> int:
+    """Largo como lo cuenta Telegram: unidades UTF-16 (un emoji fuera del BMP vale 2)."""
+    return len(s.encode("utf-16-le")) // 2
+
+
+def _cortar(line: str, max_len: int) -> int:
+    """Cuántos caracteres de line caben en max_len unidades UTF-16 (sin partir un emoji)."""
+    usado = 0
+    for i, ch in enumerate(line):
+        usado += 2 if ord(ch) > 0xFFFF else 1
+        if usado > max_len:
+            return i
+    return len(line)
+
+
+def pack_text(text: str, max_len: int = TELEGRAM_MAX_LEN) -> List[str]:
+    """
+    Parte un texto en mensajes de hasta max_len unidades UTF-16 cortando por líneas
+    (llenando cada mensaje al máximo); una línea más larga que max_len se corta a la fuerza.
+    """
+    chunks: List[str] = []
+    cur = ""
+    for line in text.split("\n"):
+        while _u16(line) > max_len:
+            if cur:
+                chunks.append(cur)
+                cur = ""
+            n = _cortar(line, max_len)
+            chunks.append(line[:n])
+            line = line[n:]
+        if not cur:
+            cur = line
+        elif _u16(cur) + 1 + _u16(line) <= max_len:
+            cur = cur + "\n" + line
+        else:
+            chunks.append(cur)
+            cur = line
+    if cur.strip():
+        chunks.append(cur)
+    return chunks
+
+
+class TelegramSender:
+    def __init__(self, token: str, api_base: str = "https://api.telegram.org",
+                 chat_interval: float = TELEGRAM_CHAT_INTERVAL,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 max_retries: int = TELEGRAM_MAX_RETRIES):
+        self.url = f"{api_base.rstrip('/')}/bot{token}/sendMessage"
+        self.chat_interval = chat_interval
+        self.global_interval = 1.0 / global_rate if global_rate > 0 else 0.0
+        self.max_retries = max_retries
+        self._client: Optional[httpx.AsyncClient] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._global_lock = asyncio.Lock()
+        self._next_global = 0.0  # time.monotonic() del próximo envío permitido
+        self.sent = self.retried = self.failed = 0
+        self.flood_wait_s = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=15.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def __aenter__(self) -> "TelegramSender":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Espera a que se vacíen las colas y cierra el cliente."""
+        await self.flush()
+        for t in self._workers.values():
+            t.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def flush(self):
+        await asyncio.gather(*(q.join() for q in self._queues.values()))
+
+    # ---- envío ----
+    def _cola(self, chat_id: str) -> asyncio.Queue:
+        q = self._queues.get(chat_id)
+        if q is None:
+            q = self._queues[chat_id] = asyncio.Queue()
+            self._workers[chat_id] = asyncio.create_task(self._worker(chat_id, q))
+        return q
+
+    async def send(self, chat_id, text: str, **extra) -> List[Optional[Dict[str, Any]]]:
+        """
+        Encola el texto (empaquetado) para un chat y espera a que salga.
+        Devuelve el 'result' de Telegram por mensaje (None si falló).
+        """
+        loop = asyncio.get_running_loop()
+        q = self._cola(str(chat_id))
+        futs = []
+        for chunk in pack_text(text):
+            fut = loop.create_future()
+            q.put_nowait((chunk, extra, fut))
+            futs.append(fut)
+        return list(await asyncio.gather(*futs))
+
+    async def broadcast(self, chat_ids: Iterable, text: str, **extra) -> Dict[str, List[Optional[Dict[str, Any]]]]:
+        """Mismo texto a varios chats en paralelo (un worker por chat)."""
+        ids = [str(c) for c in chat_ids]
+        res = await asyncio.gather(*(self.send(c, text, **extra) for c in ids))
+        return dict(zip(ids, res))
+
+    async def _esperar_turno_global(self):
+        if not self.global_interval:
+            return
+        async with self._global_lock:
+            now = time.monotonic()
+            if self._next_global > now:
+                await asyncio.sleep(self._next_global - now)
+                now = self._next_global
+            self._next_global = now + self.global_interval
+
+    async def _worker(self, chat_id: str, q: asyncio.Queue):
+        next_chat = 0.0
+        while True:
+            chunk, extra, fut = await q.get()
+            try:
+                espera = next_chat - time.monotonic()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                res = await self._post(chat_id, chunk, extra)
+                next_chat = time.monotonic() + self.chat_interval
+                if not fut.done():
+                    fut.set_result(res)
+            except Exception as e:  # no tumbar el worker por un mensaje
+                if not fut.done():
+                    fut.set_exception(e)
+            finally:
+                q.task_done()
+
+    async def _post(self, chat_id: str, text: str, extra: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        data = {"chat_id": chat_id, "text": text, **extra}
+        for attempt in range(1, self.max_retries + 1):
+            await self._esperar_turno_global()
+            try:
+                r = await self.client.post(self.url, data=data)
+            except httpx.RequestError:
+                self.retried += 1
+                await asyncio.sleep(1.0 * attempt)
+                continue
+            if r.status_code == 200:
+                self.sent += 1
+                return (r.json() or {}).get("result")
+            if r.status_code == 429:
+                try:
+                    retry_after = float(((r.json() or {}).get("parameters") or {}).get("retry_after") or 1)
+                except ValueError:
+                    retry_after = float(r.headers.get("Retry-After") or 1)
+                self.retried += 1
+                self.flood_wait_s += retry_after
+                await asyncio.sleep(retry_after)
+                continue
+            if r.status_code >= 500:
+                self.retried += 1
+                await asyncio.sleep(1.5 * attempt + random.random())
+                continue
+            # 400/403 (chat inexistente, bot bloqueado, texto inválido): reintentar no sirve
+            print(f"⚠️ Telegram {r.status_code} para chat {chat_id}: {r.text[:200]}")
+            break
+        self.failed += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sent": self.sent, "retried": self.retried, "failed": self.failed,
+                "flood_wait_s": round(self.flood_wait_s, 2), "chats": len(self._queues)}
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Respuesta de /odds sin filtro bet= (como la que trae la llamada por liga y
+fecha): solo "Goals Over/Under" y "Match Winner" deben llegar a la etapa de valor.
+
+Más abajo, cuentas a mano de evaluar sobre distribuciones chicas: EV, Kelly
+con devolución, líneas de cuarto, margen con lados faltantes y ranking.
+"""
+import numpy as np
+import pytest
+
+from goal_model import probs_1x2, score_matrices, total_goals
+from odds_parser import finalize_index, parse_odds
+from value_bets import OU, VALUE_KELLY_FRACTION, VALUE_MAX_STAKE, X12, evaluar
+
+FIXTURE_ID = 4242
+
+
+def _bet(bet_id, name, values):
+    return {"id": bet_id, "name": name, "values": [{"value": v, "odd": o} for v, o in values]}
+
+
+def _payload():
+    casa_a = [
+        _bet(1, "Match Winner", [("Home", "2.10"), ("Draw", "3.30"), ("Away", "3.60")]),
+        _bet(5, "Goals Over/Under", [("Over 2.5", "1.95"), ("Under 2.5", "1.90"),
+                                     ("Over 3.5", "3.10"), ("Under 3.5", "1.36")]),
+        _bet(6, "Goals Over/Under First Half", [("Over 2.5", "8.00"), ("Under 2.5", "1.05"),
+                                                ("Over 0.5", "1.40"), ("Under 0.5", "2.90")]),
+        _bet(26, "Goals Over/Under - Second Half", [("Over 2.5", "6.50"), ("Under 2.5", "1.10")]),
+        _bet(45, "Cards Over/Under", [("Over 4.5", "1.85"), ("Under 4.5", "1.95")]),
+        _bet(13, "First Half Winner", [("Home", "2.90"), ("Draw", "2.05"), ("Away", "4.50")]),
+    ]
+    casa_b = [
+        _bet(1, "Match Winner", [("Home", "2.05"), ("Draw", "3.40"), ("Away", "3.70")]),
+        _bet(5, "Goals Over/Under", [("Over 2.5", "2.00"), ("Under 2.5", "1.85")]),
+        _bet(6, "Goals Over/Under First Half", [("Over 2.5", "7.50"), ("Under 2.5", "1.07")]),
+    ]
+    return {"response": [{
+        "fixture": {"id": FIXTURE_ID},
+        "bookmakers": [{"id": 1, "name": "Casa A", "bets": casa_a},
+                       {"id": 2, "name": "Casa B", "bets": casa_b}],
+    }]}
+
+
+def test_parse_odds_ignora_otros_mercados():
+    reg = finalize_index(parse_odds(_payload()))[FIXTURE_ID]
+    assert [r["line"] for r in reg.totales] == [2.5, 3.5]
+    linea = reg.totales.get(2.5)
+    assert (linea["over"], linea["over_book"]) == (2.0, "Casa B")
+    assert (linea["under"], linea["under_book"]) == (1.9, "Casa A")
+    assert reg.totales.get(0.5) is None and reg.totales.get(4.5) is None
+    assert (reg.x12["home"], reg.x12["draw"], reg.x12["away"]) == (2.1, 3.4, 3.7)
+
+
+def test_evaluar_sin_cuotas_de_otros_mercados():
+    reg = finalize_index(parse_odds(_payload()))[FIXTURE_ID]
+    m = score_matrices([1.45], [1.15], -0.05)
+    valor = evaluar(total_goals(m), probs_1x2(m), [reg.totales], [reg.x12])
+
+    ou = valor.mercado == OU
+    assert sorted(set(valor.linea[ou].tolist())) == [2.5, 3.5]
+    assert valor.cuota[ou].max() < 4.0
+    # mercado de goles completo: margen razonable y EV lejos del 8.00 de primer tiempo
+    assert np.all((valor.overround[ou] > 0.95) & (valor.overround[ou] < 1.1))
+    assert valor.ev.max() < 0.3
+    over_25 = valor.buscar(0, OU, 0, 2.5)
+    assert over_25["cuota"] == 2.0 and over_25["casa"] == "Casa B"
+
+
+# P(total = 0, 1, 2, 3) y P(local, empate, visita) de un partido de juguete
+TOTALES = np.array([[0.1, 0.2, 0.3, 0.4]])
+X12_PROBS = np.array([[0.5, 0.3, 0.2]])
+
+
+def _linea(line, over=None, under=None):
+    return {"line": line, "over": over, "under": under, "over_book": "A", "under_book": "B"}
+
+
+def _kelly(cuota, gana, push):
+    b, pierde = cuota - 1.0, 1.0 - gana - push
+    return min(max((b * gana - pierde) / (b * (gana + pierde)), 0.0) * VALUE_KELLY_FRACTION, VALUE_MAX_STAKE)
+
+
+def test_evaluar_ev_y_kelly_1x2():
+    cuotas = {"home": 2.2, "draw": 3.0, "away": 6.0}
+    valor = evaluar(TOTALES, X12_PROBS, [None], [cuotas])
+
+    local, empate, visita = (valor.buscar(0, X12, k) for k in range(3))
+    assert local["ev"] == pytest.approx(0.1)
+    assert empate["ev"] == pytest.approx(-0.1) and empate["kelly"] == 0.0
+    assert visita["ev"] == pytest.approx(0.2)
+    assert local["kelly"] == pytest.approx(_kelly(2.2, 0.5, 0.0), abs=1e-4)
+    assert visita["kelly"] == pytest.approx(_kelly(6.0, 0.2, 0.0), abs=1e-4)
+    margen = 1 / 2.2 + 1 / 3.0 + 1 / 6.0
+    assert valor.overround[0] == pytest.approx(margen)
+    assert local["cuota_justa"] == pytest.approx(round(2.2 * margen, 2))
+
+
+def test_evaluar_kelly_con_push_en_linea_entera():
+    valor = evaluar(TOTALES, X12_PROBS, [[_linea(2.0, over=2.0, under=2.5)]], [None])
+
+    # Over 2: gana con 3 goles (0.4), devuelve con 2 (0.3), pierde con 0-1 (0.3)
+    i = valor.buscar(0, OU, 0, 2.0)
+    assert (valor.prob[0], valor.push[0]) == pytest.approx((0.4, 0.3))
+    assert i["ev"] == pytest.approx(0.4 * 2.0 + 0.3 - 1.0)
+    assert i["kelly"] == pytest.approx(_kelly(2.0, 0.4, 0.3), abs=1e-4)
+    # contando el push como pérdida el stake sería negativo: 1·0.4 - 0.6 < 0
+    assert i["kelly"] > 0
+
+
+@pytest.mark.parametrize("line, lado, gana, push", [
+    (2.25, 0, 0.4, 0.15),   # Over 2.25: 2.0 (0.4 / 0.3 push) y 2.5 (0.4)
+    (2.25, 1, 0.45, 0.15),  # Under 2.25: 2.0 (0.3 / 0.3 push) y 2.5 (0.6)
+    (2.75, 0, 0.2, 0.2),    # Over 2.75: 2.5 (0.4) y 3.0 (0 / 0.4 push)
+    (2.75, 1, 0.6, 0.2),    # Under 2.75: 2.5 (0.6) y 3.0 (0.6 / 0.4 push)
+])
+def test_evaluar_linea_de_cuarto_mitad_y_mitad(line, lado, gana, push):
+    valor = evaluar(TOTALES, X12_PROBS, [[_linea(line, over=2.0, under=2.0)]], [None])
+
+    i = np.flatnonzero(valor.lado == lado)[0]
+    assert (valor.prob[i], valor.push[i]) == pytest.approx((gana, push))
+    assert valor.ev[i] == pytest.approx(gana * 2.0 + push - 1.0)
+    assert valor.kelly[i] == pytest.approx(_kelly(2.0, gana, push))
+
+
+def test_evaluar_margen_solo_con_el_mercado_completo():
+    libro = [_linea(2.5, over=1.9, under=2.0), _linea(3.5, over=3.0)]
+    valor = evaluar(TOTALES, X12_PROBS, [libro], [{"home": 2.2, "draw": 3.0}])
+
+    completa = valor.buscar(0, OU, 0, 2.5)
+    assert valor.overround[0] == pytest.approx(1 / 1.9 + 1 / 2.0)
+    assert completa["cuota_justa"] == pytest.approx(round(1.9 * (1 / 1.9 + 1 / 2.0), 2))
+    # un solo lado de 3.5 y 1X2 sin visitante: sin margen ni cuota justa, pero con EV
+    for pick in (valor.buscar(0, OU, 0, 3.5), valor.buscar(0, X12, 0), valor.buscar(0, X12, 1)):
+        assert pick["cuota_justa"] is None
+    assert np.isnan(valor.overround[valor.linea == 3.5]).all()
+    assert np.isnan(valor.overround[valor.mercado == X12]).all()
+    assert valor.buscar(0, OU, 0, 3.5)["ev"] == pytest.approx(-1.0)
+    assert valor.buscar(0, X12, 2) is None
+
+
+def test_ranking_por_partido():
+    totales = np.repeat(TOTALES, 2, axis=0)
+    x12 = np.array([[0.45, 0.3, 0.25], [0.25, 0.3, 0.45]])
+    cuotas = [{"home": 2.5, "draw": 3.6, "away": 4.4},   # EV 0.125, 0.08, 0.10
+              {"home": 4.4, "draw": 3.5, "away": 2.4}]   # EV 0.10, 0.05, 0.08
+    valor = evaluar(totales, x12, [None, None], cuotas)
+
+    todos = valor.ranking()
+    assert [p["ev"] for p in todos] == sorted((p["ev"] for p in todos), reverse=True)
+    assert len(todos) == 6
+    assert len(valor.ranking(min_ev=0.09)) == 3
+
+    mejores = valor.ranking(por_partido=1)
+    assert [(p["fixture"], p["seleccion"]) for p in mejores] == [(0, "Local"), (1, "Local")]
+    dos = valor.ranking(por_partido=2)
+    assert sorted(p["fixture"] for p in dos) == [0, 0, 1, 1]
+    assert {p["seleccion"] for p in dos if p["fixture"] == 0} == {"Local", "Visitante"}
+    assert {p["seleccion"] for p in dos if p["fixture"] == 1} == {"Local", "Visitante"}
+    assert valor.ranking(por_partido=2, top=3) == dos[:3]
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Cache en memoria acotado para el bot: un LRU por namespace (fixtures, odds,
+history, ...) con TTL propio, tope de entradas, barrido periódico de vencidos
+y contadores de hits/misses/evictions.
+
+Los namespaces con 'stale' > 0 admiten stale-while-revalidate (get_swr): pasado
+el TTL el valor viejo se sigue sirviendo mientras una tarea de fondo lo refresca,
+hasta un máximo de ttl + stale segundos de antigüedad.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Namespace:
+    __slots__ = ("ttl", "max_entries", "stale", "data", "hits", "misses", "evictions", "expired",
+                 "stale_hits", "refreshes")
+
+    def __init__(self, ttl: float, max_entries: int, stale: float = 0.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale = stale
+        self.data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.hits = self.misses = self.evictions = self.expired = 0
+        self.stale_hits = self.refreshes = 0
+
+    @property
+    def max_age(self) -> float:
+        return self.ttl + self.stale
+
+
+class NamespacedCache:
+    def __init__(self, namespaces: Dict[str, Tuple], default: Tuple = (60.0, 256)):
+        """namespaces: {nombre: (ttl_segundos, max_entradas[, stale_segundos])}"""
+        self._default = default
+        self._ns: Dict[str, _Namespace] = {n: _Namespace(*cfg) for n, cfg in namespaces.items()}
+        self._refreshing: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+
+    def _space(self, ns: str) -> _Namespace:
+        space = self._ns.get(ns)
+        if space is None:
+            space = self._ns[ns] = _Namespace(*self._default)
+        return space
+
+    def get(self, ns: str, key: Hashable, ttl: Optional[float] = None) -> Any:
+        """Valor vigente o None. ttl permite ser más estricto que el del namespace."""
+        space = self._space(ns)
+        item = space.data.get(key)
+        if item is None:
+            space.misses += 1
+            return None
+        value, ts = item
+        limit = space.ttl if ttl is None else min(ttl, space.ttl)
+        if time.time() - ts > limit:
+            if time.time() - ts > space.max_age:
+                del space.data[key]
+                space.expired += 1
+            space.misses += 1
+            return None
+        space.data.move_to_end(key)
+        space.hits += 1
+        return value
+
+    def set(self, ns: str, key: Hashable, value: Any):
+        space = self._space(ns)
+        space.data[key] = (value, time.time())
+        space.data.move_to_end(key)
+        while len(space.data) > space.max_entries:
+            space.data.popitem(last=False)
+            space.evictions += 1
+
+    async def get_swr(self, ns: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Stale-while-revalidate: fresco -> se devuelve; vencido pero dentro de
+        ttl + stale -> se devuelve ya y se refresca en segundo plano; ausente o
+        demasiado viejo -> se espera a loader(). Si loader() devuelve None (fallo)
+        no se pisa lo que haya en cache.
+        """
+        space = self._space(ns)
+        item = space.data.get(key)
+        if item is not None:
+            value, ts = item
+            age = time.time() - ts
+            if age <= space.ttl:
+                space.data.move_to_end(key)
+                space.hits += 1
+                return value
+            if age <= space.max_age:
+                space.data.move_to_end(key)
+                space.stale_hits += 1
+                self._refresh_in_background(ns, key, loader)
+                return value
+            del space.data[key]
+            space.expired += 1
+        space.misses += 1
+        value = await loader()
+        if value is not None:
+            self.set(ns, key, value)
+        return value
+
+    def _refresh_in_background(self, ns: str, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        if (ns, key) in self._refreshing:
+            return
+
+        async def _run():
+            try:
+                value = await loader()
+                if value is not None:
+                    self.set(ns, key, value)
+                    self._space(ns).refreshes += 1
+            except Exception:
+                pass  # nos quedamos con el valor viejo
+            finally:
+                self._refreshing.pop((ns, key), None)
+
+        self._refreshing[(ns, key)] = asyncio.create_task(_run())
+
+    def pop(self, ns: str, key: Hashable):
+        self._space(ns).data.pop(key, None)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        n = 0
+        for space in self._ns.values():
+            for key in [k for k, (_, ts) in space.data.items() if now - ts > space.max_age]:
+                del space.data[key]
+                space.expired += 1
+                n += 1
+        return n
+
+    async def sweeper(self, interval: float = 60.0):
+        """Tarea de fondo: barre vencidos cada 'interval' segundos hasta ser cancelada."""
+        while True:
+            await asyncio.sleep(interval)
+            self.purge_expired()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for name, s in self._ns.items():
+            total = s.hits + s.misses
+            out[name] = {
+                "size": len(s.data), "max": s.max_entries, "ttl": s.ttl,
+                "hits": s.hits, "misses": s.misses, "evictions": s.evictions, "expired": s.expired,
+                "stale_hits": s.stale_hits, "refreshes": s.refreshes,
+                "hit_ratio": round(s.hits / total, 3) if total else None,
+            }
+        return out
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Etapa de valor: probabilidades del modelo (goal_model) contra todas las cuotas
+parseadas (odds_parser), para todos los partidos y líneas de una vez.
+
+evaluar() aplana cada selección (partido × mercado × línea × lado) en arreglos
+columnares y calcula en una pasada de NumPy:
+  - probabilidad implícita 1/cuota y margen (overround) de cada mercado,
+  - probabilidad y cuota "justas" (sin margen, normalizando el mercado),
+  - probabilidad del modelo de ganar / devolver (push) / perder,
+  - EV por unidad apostada y stake Kelly (fraccional y acotado).
+Las líneas de cuarto (2.25, 2.75...) se liquidan mitad y mitad en las dos
+líneas vecinas, como en las casas.
+
+Las cuotas son la mejor de cada lado entre todas las casas (lo que guarda
+LineBook), así que el margen es el del "mejor mercado" y puede quedar < 1.
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# EV mínimo (por unidad) para que una selección cuente como pick
+VALUE_MIN_EV = float(os.getenv("VALUE_MIN_EV", "0.03"))
+# Fracción de Kelly y tope del stake (fracción del bankroll)
+VALUE_KELLY_FRACTION = float(os.getenv("VALUE_KELLY_FRACTION", "0.25"))
+VALUE_MAX_STAKE = float(os.getenv("VALUE_MAX_STAKE", "0.05"))
+# Cuotas más largas que esto no se recomiendan (el modelo sobreestima los batacazos)
+VALUE_MAX_ODD = float(os.getenv("VALUE_MAX_ODD", "5.0"))
+
+OU, X12 = 0, 1
+_LADOS = {OU: ("Over", "Under"), X12: ("Local", "Empate", "Visitante")}
+_CLAVES_1X2 = ("home", "draw", "away")
+
+
+def _probs_ou(cdf0: np.ndarray, fila: np.ndarray, linea: np.ndarray, over: np.ndarray):
+    """
+    (ganar, push) de Over/Under en una línea entera o .5, por selección.
+    cdf0[:, k + 1] = P(total <= k), con la columna 0 = P(total <= -1) = 0.
+    """
+    top = cdf0.shape[1] - 1
+    piso = np.clip(np.floor(linea).astype(np.int64) + 1, 0, top)       # P(T <= floor(L))
+    techo = np.clip(np.ceil(linea).astype(np.int64), 0, top)           # P(T <= ceil(L) - 1)
+    p_over = 1.0 - cdf0[fila, piso]
+    p_under = cdf0[fila, techo]
+    push = np.clip(1.0 - p_over - p_under, 0.0, None)
+    return np.where(over, p_over, p_under), push
+
+
+class Valor:
+    """Selecciones evaluadas, en arreglos paralelos (una fila por selección)."""
+
+    def __init__(self, fixture, mercado, lado, linea, cuota, casas, overround,
+                 prob, push, prob_justa, ev, kelly):
+        self.fixture = fixture          # índice del partido en la entrada
+        self.mercado = mercado          # OU | X12
+        self.lado = lado                # OU: 0 over, 1 under; X12: 0 local, 1 empate, 2 visitante
+        self.linea = linea              # NaN en 1X2
+        self.cuota = cuota
+        self.casas = casas
+        self.overround = overround      # NaN si al mercado le falta algún lado
+        self.prob = prob                # P(ganar) según el modelo
+        self.push = push                # P(devolución)
+        self.prob_justa = prob_justa    # probabilidad implícita sin margen
+        self.ev = ev                    # ganancia esperada por unidad
+        self.kelly = kelly              # stake sugerido (fracción del bankroll)
+        self._pos: Optional[Dict[tuple, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.cuota)
+
+    @property
+    def cuota_justa(self) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return 1.0 / self.prob_justa
+
+    @property
+    def edge(self) -> np.ndarray:
+        """Probabilidad del modelo menos la del mercado sin margen."""
+        return self.prob - self.prob_justa
+
+    def pick(self, i: int) -> Dict[str, Any]:
+        mercado = int(self.mercado[i])
+        nombre = _LADOS[mercado][int(self.lado[i])]
+        linea = None if mercado == X12 else float(self.linea[i])
+        justa = float(self.cuota_justa[i])
+        return {
+            "fixture": int(self.fixture[i]),
+            "mercado": "O/U" if mercado == OU else "1X2",
+            "seleccion": nombre if linea is None else f"{nombre} {linea:g}",
+            "linea": linea,
+            "cuota": float(self.cuota[i]),
+            "casa": self.casas[i],
+            "prob": round(float(self.prob[i]), 4),
+            "cuota_justa": None if np.isnan(justa) else round(justa, 2),
+            "ev": round(float(self.ev[i]), 4),
+            "kelly": round(float(self.kelly[i]), 4),
+        }
+
+    def buscar(self, fixture: int, mercado: int, lado: int, linea: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """La selección puntual (p. ej. la recomendación O/U ya elegida), o None si no tiene cuota."""
+        if self._pos is None:
+            lineas = np.where(np.isnan(self.linea), -1.0, self.linea)
+            self._pos = {(int(f), int(m), int(l), round(float(x), 2)): i for i, (f, m, l, x) in
+                         enumerate(zip(self.fixture, self.mercado, self.lado, lineas))}
+        i = self._pos.get((fixture, mercado, lado, -1.0 if linea is None else round(float(linea), 2)))
+        return None if i is None else self.pick(i)
+
+    def ranking(self, min_ev: float = VALUE_MIN_EV, top: Optional[int] = None,
+                por_partido: Optional[int] = None, mercado: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Picks con EV >= min_ev y stake > 0, de mayor a menor EV. por_partido
+        limita cuántos por partido (1 = solo el mejor de cada uno).
+        """
+        ok = (self.ev >= min_ev) & (self.kelly > 0) & (self.cuota <= VALUE_MAX_ODD)
+        if mercado is not None:
+            ok &= self.mercado == mercado
+        idx = np.flatnonzero(ok)
+        idx = idx[np.argsort(-self.ev[idx], kind="stable")]
+        if por_partido is not None and len(idx):
+            # posición de cada pick dentro de su partido (idx ya viene por EV descendente)
+            orden = np.argsort(self.fixture[idx], kind="stable")
+            f = self.fixture[idx][orden]
+            inicio = np.r_[0, np.flatnonzero(np.diff(f)) + 1]
+            rango = np.arange(len(f)) - np.repeat(inicio, np.diff(np.r_[inicio, len(f)]))
+            rango_idx = np.empty_like(rango)
+            rango_idx[orden] = rango
+            idx = idx[rango_idx < por_partido]
+        if top is not None:
+            idx = idx[:top]
+        return [self.pick(i) for i in idx]
+
+
+def evaluar(totales: np.ndarray, x12: np.ndarray, libros: Sequence[Any],
+            cuotas_1x2: Sequence[Optional[Dict[str, Any]]]) -> Valor:
+    """
+    totales: (F, K) P(total de goles = k) por partido (goal_model.total_goals).
+    x12: (F, 3) P(local, empate, visita) (goal_model.probs_1x2).
+    libros / cuotas_1x2: LineBook y dict 1X2 de odds_parser por partido (o None).
+    """
+    fix, merc, lado, linea, cuota, casas, grupo = [], [], [], [], [], [], []
+    g = 0
+    # único bucle en Python: aplanar las cuotas (los cálculos van vectorizados abajo)
+    for f, (libro, o) in enumerate(zip(libros, cuotas_1x2)):
+        for r in (libro or ()):
+            for s, lado_ou in enumerate(("over", "under")):
+                if r.get(lado_ou):
+                    fix.append(f); merc.append(OU); lado.append(s); linea.append(r["line"])
+                    cuota.append(r[lado_ou]); casas.append(r.get(lado_ou + "_book")); grupo.append(g)
+            g += 1
+        if o:
+            for s, k in enumerate(_CLAVES_1X2):
+                if o.get(k):
+                    fix.append(f); merc.append(X12); lado.append(s); linea.append(np.nan)
+                    cuota.append(o[k]); casas.append(o.get(k + "_book")); grupo.append(g)
+            g += 1
+
+    fix = np.asarray(fix, dtype=np.int64)
+    merc = np.asarray(merc, dtype=np.int8)
+    lado = np.asarray(lado, dtype=np.int8)
+    linea = np.asarray(linea, dtype=np.float64)
+    cuota = np.asarray(cuota, dtype=np.float64)
+    grupo = np.asarray(grupo, dtype=np.int64)
+
+    # mercado: margen y probabilidad justa (solo con todos sus lados cotizados)
+    implicita = 1.0 / cuota
+    overround = np.bincount(grupo, implicita, g)[grupo] if len(grupo) else implicita
+    lados_ok = np.where(merc == OU, 2, 3)
+    completo = np.bincount(grupo, minlength=g)[grupo] == lados_ok if len(grupo) else lados_ok == 0
+    overround = np.where(completo, overround, np.nan)
+    prob_justa = implicita / overround
+
+    # modelo: ganar / push por selección
+    prob = np.zeros(len(cuota))
+    push = np.zeros(len(cuota))
+    es_ou = merc == OU
+    if es_ou.any():
+        cdf0 = np.concatenate([np.zeros((len(totales), 1)), np.cumsum(totales, axis=1)], axis=1)
+        f, l, over = fix[es_ou], linea[es_ou], lado[es_ou] == 0
+        cuarto = np.isclose(np.mod(l * 4, 2), 1)  # .25 / .75: mitad en cada línea vecina
+        d = np.where(cuarto, 0.25, 0.0)
+        w1, p1 = _probs_ou(cdf0, f, l - d, over)
+        w2, p2 = _probs_ou(cdf0, f, l + d, over)
+        prob[es_ou] = (w1 + w2) / 2
+        push[es_ou] = (p1 + p2) / 2
+    es_1x2 = ~es_ou
+    if es_1x2.any():
+        prob[es_1x2] = x12[fix[es_1x2], lado[es_1x2]]
+
+    # EV por unidad y Kelly con devolución: f* = (b·p - q) / (b·(p + q))
+    pierde = np.clip(1.0 - prob - push, 0.0, None)
+    b = cuota - 1.0
+    ev = prob * cuota + push - 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kelly = (b * prob - pierde) / (b * (prob + pierde))
+    kelly = np.clip(np.nan_to_num(kelly * VALUE_KELLY_FRACTION, nan=0.0), 0.0, VALUE_MAX_STAKE)
+
+    return Valor(fix, merc, lado, linea, cuota, casas, overround, prob, push, prob_justa, ev, kelly)
+
+
+def etiqueta_valor(ev: Optional[float]) -> str:
+    """Confianza a partir del EV (reemplaza los umbrales sobre total - línea)."""
+    if ev is None:
+        return ""
+    if ev >= 0.08:
+        return "🟢 Valor alto"
+    if ev >= VALUE_MIN_EV:
+        return "🟡 Valor"
+    if ev > 0:
+        return "🟠 Valor marginal"
+    return "⚠️ Sin valor (mejor pasar)"
+
+
+def texto_pick(pick: Dict[str, Any]) -> str:
+    casa = f" en {pick['casa']}" if pick.get("casa") else ""
+    return (f"{pick['mercado']} **{pick['seleccion']}** @ {pick['cuota']}{casa} · "
+            f"EV {100 * pick['ev']:+.1f}% · stake {100 * pick['kelly']:.1f}%")